@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+AGGREGATION_METHODS = ("mean", "median", "trimmed_mean")
+
 
 class Settings:
     """Application configuration settings."""
@@ -25,9 +27,55 @@ class Settings:
         self.MAX_DATA_AGE_SECONDS = int(os.getenv("MAX_DATA_AGE_SECONDS", "3600"))
         self.TEMPERATURE_PHENOMENON = os.getenv("TEMPERATURE_PHENOMENON", "Temperatur")
 
+        self.AGGREGATION_METHOD = os.getenv("AGGREGATION_METHOD", "mean")
+        if self.AGGREGATION_METHOD not in AGGREGATION_METHODS:
+            raise ValueError(
+                f"AGGREGATION_METHOD must be one of {', '.join(AGGREGATION_METHODS)}, "
+                f"got {self.AGGREGATION_METHOD!r}"
+            )
+        self.OUTLIER_REJECTION = os.getenv("OUTLIER_REJECTION", "false").lower() == "true"
+        self.OUTLIER_MAD_THRESHOLD = float(os.getenv("OUTLIER_MAD_THRESHOLD", "3.5"))
+        self.TRIM_PROPORTION = float(os.getenv("TRIM_PROPORTION", "0.1"))
+        self.ANOMALY_DETECTION = os.getenv("ANOMALY_DETECTION", "true").lower() == "true"
+        self.ANOMALY_EXCLUDE = os.getenv("ANOMALY_EXCLUDE", "false").lower() == "true"
+        self.ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", "0.1"))
+        self.ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4"))
+        self.ANOMALY_MIN_STD = float(os.getenv("ANOMALY_MIN_STD", "0.5"))
+        self.ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", "10"))
+        self.ANOMALY_RESET_AFTER = int(os.getenv("ANOMALY_RESET_AFTER", "6"))
+
         self.VALKEY_HOST = os.getenv("VALKEY_HOST", "localhost")
         self.VALKEY_PORT = int(os.getenv("VALKEY_PORT", "6379"))
         self.CACHE_TTL = int(os.getenv("CACHE_TTL", "300"))
+        self.VALKEY_MAX_CONNECTIONS = int(os.getenv("VALKEY_MAX_CONNECTIONS", "50"))
+        self.VALKEY_POOL_TIMEOUT = float(os.getenv("VALKEY_POOL_TIMEOUT", "2"))
+        self.VALKEY_SOCKET_TIMEOUT = float(os.getenv("VALKEY_SOCKET_TIMEOUT", "2"))
+        self.BOX_CACHE_BUCKETS = int(os.getenv("BOX_CACHE_BUCKETS", "64"))
+        self.HISTORY_RETENTION_SECONDS = int(
+            os.getenv("HISTORY_RETENTION_SECONDS", "86400")
+        )
+        self.HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "1440"))
+        self.HISTORY_AGGREGATE_INTERVAL = int(os.getenv("HISTORY_AGGREGATE_INTERVAL", "60"))
+
+        self.STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", "1000"))
+        self.STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+        self.POLL_INTERVAL = int(os.getenv("POLL_INTERVAL", "60"))
+        self.UPSTREAM_RATE = float(os.getenv("UPSTREAM_RATE", "5"))
+        self.UPSTREAM_BURST = float(os.getenv("UPSTREAM_BURST", "20"))
+        self.UPSTREAM_REPLICAS = int(os.getenv("UPSTREAM_REPLICAS", "1"))
+        self.MIN_POLL_INTERVAL = int(os.getenv("MIN_POLL_INTERVAL", "30"))
+        self.MAX_POLL_INTERVAL = int(os.getenv("MAX_POLL_INTERVAL", "3600"))
+        self.POLL_GRACE_SECONDS = int(os.getenv("POLL_GRACE_SECONDS", "10"))
+        self.INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(8 * 1024 * 1024)))
+        self.INGEST_TOKEN = os.getenv("INGEST_TOKEN", "")
+
+        self.TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+        self.TRACE_FILE = os.getenv("TRACE_FILE", "/tmp/hivebox-traces.jsonl")
+        self.TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+        self.DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+        self.ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+        self.PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+        self.PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
 
         self.MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
         self.MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
@@ -36,6 +84,33 @@ class Settings:
         self.MINIO_SECURE = os.getenv("MINIO_SECURE", "false").lower() == "true"
 
         self.STORAGE_INTERVAL = int(os.getenv("STORAGE_INTERVAL", "300"))
+        self.SPOOL_DIR = os.getenv("SPOOL_DIR", "/tmp/hivebox-spool")
+        self.SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.SPOOL_FSYNC_INTERVAL = float(os.getenv("SPOOL_FSYNC_INTERVAL", "1"))
+        self.SPOOL_REPLAY_INTERVAL = int(os.getenv("SPOOL_REPLAY_INTERVAL", "30"))
+        self.STORAGE_WRITE_TIMEOUT = float(os.getenv("STORAGE_WRITE_TIMEOUT", "2"))
+        self.STORE_MIN_INTERVAL = int(os.getenv("STORE_MIN_INTERVAL", "60"))
+        self.ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+        self.ARCHIVE_GRACE_SECONDS = int(os.getenv("ARCHIVE_GRACE_SECONDS", "3600"))
+        self.ARCHIVE_LOCK_TTL = int(os.getenv("ARCHIVE_LOCK_TTL", "300"))
+        self.HISTORY_QUERY_MAX_DAYS = int(os.getenv("HISTORY_QUERY_MAX_DAYS", "366"))
+        self.HISTORY_QUERY_CACHE_TTL = int(os.getenv("HISTORY_QUERY_CACHE_TTL", "60"))
+        self.HISTORY_QUERY_CACHE_MAX_BYTES = int(
+            os.getenv("HISTORY_QUERY_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+        )
+        self.SEGMENT_CACHE_DIR = os.getenv("SEGMENT_CACHE_DIR", "/tmp/hivebox-segments")
+        self.SEGMENT_CACHE_MAX_BYTES = int(
+            os.getenv("SEGMENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+        )
+        self.SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "/tmp/hivebox-state.npz")
+        self.SNAPSHOT_OBJECT = os.getenv("SNAPSHOT_OBJECT", "snapshots/state.npz")
+        self.SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "60"))
+        self.SNAPSHOT_SAVE_TIMEOUT = float(os.getenv("SNAPSHOT_SAVE_TIMEOUT", "5"))
+        self.SERVER_PROFILE = os.getenv("SERVER_PROFILE", "app.server:PRODUCTION")
+        self.SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))
+        # Slot of this server worker, set by app.server; 0 runs the singletons.
+        self.WORKER_SLOT = 0
+        self.STARTUP_RETRY_MAX_DELAY = float(os.getenv("STARTUP_RETRY_MAX_DELAY", "30"))
 
 
 settings = Settings()
@@ -1,86 +1,299 @@
 import asyncio
 from contextlib import asynccontextmanager
 import logging
+import time
 
 from minio import Minio
-import redis.asyncio as redis
 from fastapi import FastAPI
 
 from app.config.settings import settings
-from app.routers import metrics, storage, version, temperature, readyz
-from app.services.minio_storage import set_minio_client, store_temperature_data
-from app.routers.temperature import set_valkey_client
-from app.services.opensensemap import (
-    fetch_temperature_data,
-    calculate_average_temperature,
+from app.routers import (
+    admin,
+    boxes,
+    debug,
+    ingest,
+    metrics,
+    readyz,
+    storage,
+    temperature,
+    version,
+)
+from app.routers.metrics import mark_process_dead, scheduled_boxes, startup_phase_duration
+from app.services.aggregate_state import aggregate_state
+from app.services import archive, history_cache, snapshot
+from app.services.box_cache import set_box_cache_client
+from app.services.cache import create_valkey_client
+from app.services.history import set_history_client
+from app.services.profiler import RequestProfilerMiddleware
+from app.services.rate_limit import set_rate_limit_client
+from app.services.registry import box_registry, set_registry_client
+from app.services.tracing import TracingMiddleware, start_span
+from app.services.opensensemap import calculate_state_average, fetch_boxes
+from app.services.scheduler import box_scheduler
+from app.services.minio_storage import (
+    get_minio_client,
+    replay_spool,
+    set_minio_client,
+    store_temperature_data,
+)
+from app.routers.temperature import (
+    cached_temperature,
+    publish_temperature,
+    refresh_temperature,
+    set_valkey_client,
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-logger.info("=== Initializing clients ===")
-logger.info(f"MINIO_ENDPOINT: {settings.MINIO_ENDPOINT}")
-logger.info(f"VALKEY_HOST: {settings.VALKEY_HOST}:{settings.VALKEY_PORT}")
+_process_start = time.perf_counter()
+startup_timings: dict[str, float] = {}
 
-try:
-    minio_client = Minio(
-        settings.MINIO_ENDPOINT,
-        access_key=settings.MINIO_ACCESS_KEY,
-        secret_key=settings.MINIO_SECRET_KEY,
-        secure=settings.MINIO_SECURE,
-    )
-    set_minio_client(minio_client)
-
-    if not minio_client.bucket_exists(settings.MINIO_BUCKET):
-        minio_client.make_bucket(settings.MINIO_BUCKET)
-        logger.info(f"✓ MinIO bucket created: {settings.MINIO_BUCKET}")
-    else:
-        logger.info(f"✓ MinIO bucket exists: {settings.MINIO_BUCKET}")
-except Exception as e:
-    logger.exception("✗ MinIO setup failed")
-
-try:
-    valkey_client = redis.Redis(
-        host=settings.VALKEY_HOST, port=settings.VALKEY_PORT, decode_responses=True
+
+def record_startup_phase(phase: str, started: float) -> float:
+    """Record how long a startup phase took, in seconds"""
+    elapsed = time.perf_counter() - started
+    startup_timings[phase] = round(elapsed, 3)
+    startup_phase_duration.labels(phase=phase).set(elapsed)
+    return elapsed
+
+
+def init_clients() -> None:
+    """Create MinIO and Valkey clients; neither constructor touches the network"""
+    logger.info("=== Initializing clients ===")
+    logger.info(f"MINIO_ENDPOINT: {settings.MINIO_ENDPOINT}")
+    logger.info(f"VALKEY_HOST: {settings.VALKEY_HOST}:{settings.VALKEY_PORT}")
+
+    try:
+        minio_client = Minio(
+            settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY,
+            secret_key=settings.MINIO_SECRET_KEY,
+            secure=settings.MINIO_SECURE,
+        )
+        set_minio_client(minio_client)
+    except Exception:
+        logger.exception("✗ MinIO setup failed")
+
+    try:
+        valkey_client = create_valkey_client()
+        set_valkey_client(valkey_client)
+        set_history_client(valkey_client)
+        history_cache.set_history_cache_client(valkey_client)
+        archive.set_archive_lock_client(valkey_client)
+        set_rate_limit_client(valkey_client)
+        set_registry_client(valkey_client)
+        set_box_cache_client(create_valkey_client(decode_responses=False))
+        logger.info(
+            f"✓ Valkey initialized: {settings.VALKEY_HOST}:{settings.VALKEY_PORT}"
+        )
+    except Exception:
+        logger.exception("✗ Valkey setup failed")
+
+
+async def setup_minio_bucket():
+    """Ensure the bucket exists, retrying with backoff until MinIO answers"""
+    started = time.perf_counter()
+    delay = 1.0
+    while True:
+        try:
+            client = get_minio_client()
+            if client is None:
+                return
+            exists = await asyncio.to_thread(client.bucket_exists, settings.MINIO_BUCKET)
+            if not exists:
+                await asyncio.to_thread(client.make_bucket, settings.MINIO_BUCKET)
+                logger.info(f"✓ MinIO bucket created: {settings.MINIO_BUCKET}")
+            else:
+                logger.info(f"✓ MinIO bucket exists: {settings.MINIO_BUCKET}")
+            record_startup_phase("minio_bucket", started)
+            return
+        except Exception as e:
+            logger.warning(f"✗ MinIO bucket setup failed, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.STARTUP_RETRY_MAX_DELAY)
+
+
+async def restore_state(shared: bool = False) -> bool:
+    """
+    Restore a state snapshot so the first requests are served at once.
+
+    The local snapshot is read in place; the shared one in MinIO is fetched
+    off the event loop and dropped if a refresh has completed meanwhile. If
+    no replica has cached a result yet, the restored aggregate is published
+    with its age; warm_cache() refreshes it in the background.
+
+    Returns:
+        bool: True if a snapshot was restored
+    """
+    started = time.perf_counter()
+    try:
+        if shared:
+            payload = await asyncio.to_thread(snapshot.read_remote, get_minio_client())
+        else:
+            payload = snapshot.read_local()
+        if payload is None or aggregate_state.refreshed_at is not None:
+            return False
+        restored = snapshot.restore_snapshot(payload)
+    except Exception as e:
+        logger.warning(f"✗ State snapshot not restored: {e}")
+        return False
+
+    logger.info(
+        f"✓ Restored {restored['readings']} readings, {restored['schedules']} schedules "
+        f"({restored['age']:.0f}s old)"
     )
-    set_valkey_client(valkey_client)
-    logger.info(f"✓ Valkey initialized: {settings.VALKEY_HOST}:{settings.VALKEY_PORT}")
-except Exception as e:
-    logger.exception("✗ Valkey setup failed")
+    if len(aggregate_state) and await cached_temperature() is None:
+        await publish_temperature(
+            calculate_state_average(), len(aggregate_state), age=restored["age"]
+        )
+    record_startup_phase("snapshot_restore", started)
+    return True
+
+
+async def save_state():
+    """Capture the state on the event loop, then encode and write it off it"""
+    columns = snapshot.capture()
+    size = await asyncio.to_thread(snapshot.save, columns, get_minio_client())
+    logger.debug(f"State snapshot written ({size} bytes)")
+
+
+async def periodic_snapshot():
+    """Snapshot the per-box state for warm restarts"""
+    while True:
+        await asyncio.sleep(settings.SNAPSHOT_INTERVAL)
+        try:
+            await save_state()
+        except Exception as e:
+            logger.warning(f"State snapshot error: {e}")
+
+
+async def warm_cache():
+    """Warm the cache and aggregate state without delaying startup"""
+    started = time.perf_counter()
+    try:
+        logger.info("Cache warm-up...")
+        result = await refresh_temperature(use_state=False)
+        record_startup_phase("cache_warmup", started)
+        logger.info(f"✓ Cache warmed: {result['average_temperature']}°C")
+    except Exception as e:
+        logger.warning(f"✗ Cache warm-up failed: {e}")
 
 
 async def periodic_storage():
     await asyncio.sleep(60)
     while True:
         try:
-            temp_data = await fetch_temperature_data()
-            avg_temp = calculate_average_temperature(temp_data)
-            await store_temperature_data(
-                {
-                    "average_temperature": avg_temp,
-                    "samples": len(temp_data),
-                }
-            )
-            logger.info(f"✓ Stored: {avg_temp}°C")
+            with start_span("periodic_storage"):
+                result = await refresh_temperature()
+                await store_temperature_data(
+                    {
+                        "average_temperature": result["average_temperature"],
+                        "samples": result["samples"],
+                    }
+                )
+            logger.info(f"✓ Stored: {result['average_temperature']}°C")
         except Exception as e:
             logger.warning(f"Periodic storage error: {e}")
         await asyncio.sleep(settings.STORAGE_INTERVAL)
 
 
+async def spool_replayer():
+    """Upload archive writes spooled during MinIO outages once it recovers"""
+    while True:
+        await asyncio.sleep(settings.SPOOL_REPLAY_INTERVAL)
+        try:
+            with start_span("spool_replay"):
+                await replay_spool()
+        except Exception as e:
+            logger.warning(f"Spool replay stopped, will retry: {e}")
+
+
+async def periodic_compaction():
+    """Merge closed days of archived samples into daily columnar files"""
+    while True:
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL)
+        client = get_minio_client()
+        if client is None:
+            continue
+        try:
+            with start_span("archive_compaction"):
+                compacted = await archive.compact(client)
+            if compacted:
+                logger.info(f"✓ Compacted archive days: {sorted(map(str, compacted))}")
+                await history_cache.invalidate(compacted)
+        except Exception as e:
+            logger.warning(f"Archive compaction error: {e}")
+
+
+async def poll_due_boxes() -> int:
+    """
+    Fetch only the boxes whose next measurement is expected by now.
+
+    Returns:
+        int: Number of boxes fetched
+    """
+    box_scheduler.sync(box_registry.ids())
+    scheduled_boxes.set(len(box_scheduler))
+    due = box_scheduler.pop_due()
+    if due:
+        try:
+            await fetch_boxes(due)
+        finally:
+            box_scheduler.release(due)
+    # Boxes that are not due have nothing new, so the state is current even
+    # when nothing was fetched.
+    aggregate_state.mark_refreshed()
+    if not due:
+        return 0
+    if len(aggregate_state):
+        await publish_temperature(calculate_state_average(), len(aggregate_state))
+    return len(due)
+
+
+async def temperature_poller():
+    """Poll each box when its next measurement is due and broadcast changes"""
+    while True:
+        delay = min(max(box_scheduler.seconds_until_due(), 1.0), settings.POLL_INTERVAL)
+        await asyncio.sleep(delay)
+        try:
+            with start_span("poll_due_boxes"):
+                await poll_due_boxes()
+        except Exception as e:
+            logger.warning(f"Temperature poll error: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    try:
-        logger.info("Cache warm-up...")
-        from app.routers.temperature import get_temperature
+    started = time.perf_counter()
+    init_clients()
+    record_startup_phase("clients", started)
+    restored = await restore_state()
 
-        result = await get_temperature()
-        logger.info(f"✓ Cache warmed: {result['average_temperature']}°C")
-    except Exception as e:
-        logger.warning(f"✗ Cache warm-up failed: {e}")
-
-    task = asyncio.create_task(periodic_storage())
+    tasks = [
+        asyncio.create_task(setup_minio_bucket()),
+        asyncio.create_task(warm_cache()),
+        asyncio.create_task(temperature_poller()),
+        asyncio.create_task(spool_replayer()),
+        asyncio.create_task(box_registry.listen()),
+        asyncio.create_task(periodic_snapshot()),
+    ]
+    if settings.WORKER_SLOT == 0:
+        # One archive writer per container; every worker samples the same boxes.
+        tasks.append(asyncio.create_task(periodic_storage()))
+        tasks.append(asyncio.create_task(periodic_compaction()))
+    if not restored:
+        tasks.append(asyncio.create_task(restore_state(shared=True)))
+    record_startup_phase("accepting_traffic", _process_start)
+    logger.info(f"Startup timings (s): {startup_timings}")
     yield
-    task.cancel()
+    for task in tasks:
+        task.cancel()
+    try:
+        await asyncio.wait_for(save_state(), settings.SNAPSHOT_SAVE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Final state snapshot failed: {e}")
+    mark_process_dead()
 
 
 app = FastAPI(
@@ -95,6 +308,12 @@ app.include_router(temperature.router)
 app.include_router(metrics.router)
 app.include_router(readyz.router)
 app.include_router(storage.router)
+app.include_router(ingest.router)
+app.include_router(boxes.router)
+app.include_router(debug.router)
+app.include_router(admin.router)
+app.add_middleware(RequestProfilerMiddleware, paths=("/temperature", "/readyz"))
+app.add_middleware(TracingMiddleware)
 
 
 @app.get("/")
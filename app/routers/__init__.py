@@ -1,5 +1,3 @@
 """API routers module."""
 
-from . import version, temperature, metrics
-
 __all__ = ["version", "temperature", "metrics"]
@@ -0,0 +1,66 @@
+import logging
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+import redis.asyncio as redis
+
+from app.services.auth import require_bearer
+from app.services.box_cache import forget_box
+from app.services.registry import box_registry, is_valid_box_id
+
+logger = logging.getLogger(__name__)
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_bearer("ADMIN_TOKEN"))],
+)
+
+
+class BoxRequest(BaseModel):
+    box_id: str
+
+
+def _validate(box_id: str) -> str:
+    if not is_valid_box_id(box_id):
+        raise HTTPException(status_code=422, detail="box_id must be 24 hex characters")
+    return box_id
+
+
+@router.get("/boxes")
+async def list_boxes():
+    """senseBoxes tracked by this replica"""
+    return {"boxes": box_registry.ids(), "count": len(box_registry)}
+
+
+@router.post("/boxes", status_code=201)
+async def add_box(body: BoxRequest):
+    """
+    Start tracking a senseBox on every replica
+
+    - The box is polled on its next scheduler tick; no restart needed
+    - Adding a tracked box is a no-op (`added: false`)
+    """
+    box_id = _validate(body.box_id)
+    try:
+        added = await box_registry.add(box_id)
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail="Box registry unavailable") from e
+    return {"box_id": box_id, "added": added}
+
+
+@router.delete("/boxes/{box_id}")
+async def remove_box(box_id: str):
+    """
+    Stop tracking a senseBox on every replica
+
+    - Its schedule, aggregate contribution and cached reading are dropped
+    """
+    _validate(box_id)
+    try:
+        removed = await box_registry.remove(box_id)
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail="Box registry unavailable") from e
+    if not removed:
+        raise HTTPException(status_code=404, detail="Box not tracked")
+    await forget_box(box_id)
+    return {"box_id": box_id, "removed": True}
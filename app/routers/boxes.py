@@ -0,0 +1,125 @@
+import base64
+import binascii
+import json
+import logging
+import time
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import redis.asyncio as redis
+
+from app.services.box_cache import get_box_cache_client, scan_readings
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["boxes"])
+
+
+def encode_cursor(position: tuple[int, int] | None) -> str | None:
+    """Encode a scan position as an opaque cursor token"""
+    if position is None:
+        return None
+    raw = f"{position[0]}:{position[1]}".encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> tuple[int, int]:
+    """
+    Decode a cursor token produced by encode_cursor.
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        bucket, cursor = raw.decode("ascii").split(":")
+        position = int(bucket), int(cursor)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if position[0] < 0 or position[1] < 0:
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def _matches(reading: dict, now: float, max_age: int | None, status: str | None) -> bool:
+    if status is not None and reading["status"] != status:
+        return False
+    return max_age is None or now - reading["measured_at"] <= max_age
+
+
+def _format(box_id: str, reading: dict, now: float) -> dict:
+    return {
+        "box_id": box_id,
+        "value": round(reading["value"], 2),
+        "measured_at": reading["measured_at"],
+        "fetched_at": reading["fetched_at"],
+        "age": round(now - reading["measured_at"], 1),
+        "status": reading["status"],
+    }
+
+
+async def _ndjson_lines(max_age: int | None, status: str | None):
+    now = time.time()
+    try:
+        async for _, readings in scan_readings(now=now):
+            lines = [
+                json.dumps(_format(box_id, reading, now))
+                for box_id, reading in readings.items()
+                if _matches(reading, now, max_age, status)
+            ]
+            if lines:
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+    except redis.RedisError as e:
+        logger.warning(f"Box readings stream aborted: {e}")
+
+
+@router.get("/boxes/readings")
+async def get_box_readings(
+    fmt: Literal["json", "ndjson"] = Query("json", alias="format"),
+    limit: int = Query(500, gt=0, le=5000, description="Readings per JSON page"),
+    cursor: str | None = Query(None, description="Token from next_cursor"),
+    max_age: int | None = Query(
+        None, gt=0, description="Only readings measured within this many seconds"
+    ),
+    status: Literal["ok", "error", "anomaly"] | None = Query(None),
+):
+    """
+    Latest reading of every box, read from the per-box cache
+
+    - `format=ndjson` streams every matching reading, one JSON object per
+      line, holding a single scan batch in memory at a time
+    - `format=json` returns a page of at least `limit` readings (pages end
+      on a scan-batch boundary, so they may be slightly larger) and a
+      `next_cursor` token; null when the walk is complete
+    - `max_age` and `status` filter on freshness and fetch status;
+      `anomaly` marks readings flagged by the per-box anomaly detector
+    """
+    if get_box_cache_client() is None:
+        raise HTTPException(status_code=503, detail="Box cache unavailable")
+
+    if fmt == "ndjson":
+        return StreamingResponse(
+            _ndjson_lines(max_age, status), media_type="application/x-ndjson"
+        )
+
+    try:
+        bucket, scan_cursor = decode_cursor(cursor) if cursor else (0, 0)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    now = time.time()
+    items: list[dict] = []
+    position = None
+    try:
+        async for position, readings in scan_readings(bucket, scan_cursor, now=now):
+            items.extend(
+                _format(box_id, reading, now)
+                for box_id, reading in readings.items()
+                if _matches(reading, now, max_age, status)
+            )
+            if len(items) >= limit:
+                break
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail="Box cache unavailable") from e
+
+    return {"readings": items, "next_cursor": encode_cursor(position)}
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.config import settings
+from app.services.auth import require_bearer
+from app.services.profiler import Sampler, request_profiles
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+_profile_lock = asyncio.Lock()
+
+
+require_debug_token = require_bearer("DEBUG_TOKEN")
+
+
+def _render(sampler: Sampler, fmt: str, name: str):
+    if fmt == "speedscope":
+        return JSONResponse(
+            sampler.speedscope(name),
+            headers={"Content-Disposition": f'attachment; filename="{name}.speedscope.json"'},
+        )
+    return PlainTextResponse(sampler.collapsed())
+
+
+@router.get("/profile", dependencies=[Depends(require_debug_token)])
+async def profile(
+    seconds: float = Query(5.0, gt=0),
+    fmt: Literal["collapsed", "speedscope"] = Query("collapsed", alias="format"),
+):
+    """
+    Sample the live event loop for `seconds` and return the profile
+
+    - `collapsed`: one `frame;frame;frame count` line per stack, for
+      flamegraph.pl, speedscope or inferno
+    - `speedscope`: speedscope JSON file
+    - One profile at a time; 409 while another is running
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"seconds exceeds PROFILE_MAX_SECONDS ({settings.PROFILE_MAX_SECONDS})",
+        )
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    async with _profile_lock:
+        sampler = Sampler(interval=settings.PROFILE_INTERVAL).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+    return _render(sampler, fmt, "event-loop")
+
+
+@router.get("/profile/requests/{profile_id}", dependencies=[Depends(require_debug_token)])
+async def request_profile(
+    profile_id: str,
+    fmt: Literal["collapsed", "speedscope"] = Query("collapsed", alias="format"),
+):
+    """Profile of a request sent with the `X-Profile` header"""
+    sampler = request_profiles.get(profile_id)
+    if sampler is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _render(sampler, fmt, f"request-{profile_id}")
@@ -0,0 +1,71 @@
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+from app.config import settings
+from app.routers.metrics import ingest_accepted, ingest_rejected
+from app.routers.temperature import publish_temperature
+from app.services.aggregate_state import aggregate_state
+from app.services import history
+from app.services.auth import require_bearer
+from app.services.box_cache import store_readings
+from app.services.ingest import IngestError, UnsupportedContentType, ingest_payload
+from app.services.opensensemap import calculate_state_average
+
+logger = logging.getLogger(__name__)
+router = APIRouter(tags=["ingest"])
+
+
+async def read_capped_body(request: Request, limit: int) -> bytes:
+    """
+    Read the request body, never buffering more than `limit` bytes.
+
+    Raises:
+        HTTPException: 413 if the declared or actual length exceeds `limit`
+    """
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail="Payload too large")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise HTTPException(status_code=413, detail="Payload too large")
+    return bytes(body)
+
+
+@router.post("/ingest", dependencies=[Depends(require_bearer("INGEST_TOKEN"))])
+async def ingest(request: Request):
+    """
+    Accept batched readings pushed directly by local sensors
+
+    - Requires `Authorization: Bearer $INGEST_TOKEN`; 404 while it is unset
+    - `application/x-ndjson`: one {"box_id", "value", "timestamp"} per line
+    - `application/x-hivebox-readings`: packed 36-byte binary records
+    - Only boxes in the box registry are accepted
+    - Readings are validated in bulk and merged into the running aggregate,
+      which is then cached and broadcast like a regular refresh
+    """
+    body = await read_capped_body(request, settings.INGEST_MAX_BYTES)
+
+    content_type = request.headers.get("content-type", "")
+    readings: list[dict] = []
+    try:
+        accepted, rejected = ingest_payload(body, content_type, sink=readings)
+    except UnsupportedContentType as e:
+        raise HTTPException(status_code=415, detail=str(e)) from e
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    ingest_accepted.inc(accepted)
+    ingest_rejected.inc(rejected)
+    logger.info(f"Ingested {accepted} readings ({rejected} rejected)")
+
+    response = {"accepted": accepted, "rejected": rejected}
+    if accepted:
+        await store_readings(readings)
+        await history.record(readings=readings)
+        result = await publish_temperature(
+            calculate_state_average(), len(aggregate_state)
+        )
+        response["average_temperature"] = result["average_temperature"]
+    return response
@@ -1,11 +1,16 @@
+import os
+import re
+
 from fastapi import APIRouter, Response
 from prometheus_client import (
+    CollectorRegistry,
     Counter,
     Histogram,
     generate_latest,
     CONTENT_TYPE_LATEST,
     REGISTRY,
     Gauge,
+    multiprocess,
 )
 
 router = APIRouter(tags=["metrics"])
@@ -28,27 +33,33 @@ storage_operations = Counter(
     registry=REGISTRY,
 )
 
+# With several server workers each gauge is merged across processes by its
+# multiprocess_mode; the live* modes ignore workers marked dead.
 valkey_connection_status = Gauge(
     "hivebox_valkey_connected",
     "Valkey connection status (1 for connected, 0 for disconnected)",
+    multiprocess_mode="livemin",
     registry=REGISTRY,
 )
 
 minio_connection_status = Gauge(
     "hivebox_minio_connected",
     "MinIO connection status (1 for connected, 0 for disconnected)",
+    multiprocess_mode="livemin",
     registry=REGISTRY,
 )
 
 sensebox_available = Gauge(
     "hivebox_sensebox_available",
     "SenseBox availability status (1 for available, 0 for unavailable)",
+    multiprocess_mode="livemostrecent",
     registry=REGISTRY,
 )
 
 temperature_value = Gauge(
     "hivebox_temperature_celsius",
     "Current temperature in Celsius",
+    multiprocess_mode="livemostrecent",
     registry=REGISTRY,
 )
 
@@ -76,6 +87,161 @@ version_requests_counter = Counter(
     registry=REGISTRY,
 )
 
+stream_subscribers = Gauge(
+    "hivebox_stream_subscribers",
+    "Number of clients connected to the temperature stream",
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+
+stream_broadcasts = Counter(
+    "hivebox_stream_broadcasts_total",
+    "Total number of temperature updates broadcast to stream subscribers",
+    registry=REGISTRY,
+)
+
+ingest_accepted = Counter(
+    "hivebox_ingest_readings_accepted_total",
+    "Total number of pushed readings accepted by /ingest",
+    registry=REGISTRY,
+)
+
+ingest_rejected = Counter(
+    "hivebox_ingest_readings_rejected_total",
+    "Total number of pushed readings rejected by /ingest",
+    registry=REGISTRY,
+)
+
+startup_phase_duration = Gauge(
+    "hivebox_startup_phase_seconds",
+    "Duration of each startup phase in seconds",
+    ["phase"],
+    multiprocess_mode="max",
+    registry=REGISTRY,
+)
+
+valkey_command_duration = Histogram(
+    "hivebox_valkey_command_duration_seconds",
+    "Duration of Valkey commands and pipelines in seconds",
+    ["command"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+    registry=REGISTRY,
+)
+
+upstream_requests = Counter(
+    "hivebox_upstream_requests_total",
+    "Total number of openSenseMap box requests",
+    ["outcome"],
+    registry=REGISTRY,
+)
+
+upstream_rate_limit = Counter(
+    "hivebox_upstream_rate_limit_total",
+    "openSenseMap requests through the rate limiter, by priority and outcome "
+    "(allowed immediately, queued then allowed, denied)",
+    ["priority", "outcome"],
+    registry=REGISTRY,
+)
+
+scheduled_boxes = Gauge(
+    "hivebox_scheduled_boxes",
+    "Number of boxes tracked by the adaptive poll scheduler",
+    multiprocess_mode="livemax",
+    registry=REGISTRY,
+)
+
+spool_pending_bytes = Gauge(
+    "hivebox_spool_pending_bytes",
+    "Bytes of archive writes waiting in the local spool",
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+
+spool_records = Counter(
+    "hivebox_spool_records_total",
+    "Archive writes spooled, replayed to MinIO or dropped because the spool was full",
+    ["event"],
+    registry=REGISTRY,
+)
+
+anomalous_readings = Counter(
+    "hivebox_anomalous_readings_total",
+    "Box readings flagged as anomalous against the box's own rolling statistics",
+    registry=REGISTRY,
+)
+
+anomalous_boxes = Gauge(
+    "hivebox_anomalous_boxes",
+    "Number of boxes whose latest reading is flagged as anomalous",
+    multiprocess_mode="livemax",
+    registry=REGISTRY,
+)
+
+history_query_cache = Counter(
+    "hivebox_history_query_cache_total",
+    "Archive history queries answered from the result cache (hit) or the archive (miss)",
+    ["result"],
+    registry=REGISTRY,
+)
+
+segment_cache_requests = Counter(
+    "hivebox_segment_cache_requests_total",
+    "Archive day segments served from the local disk cache (hit) or fetched from MinIO (miss)",
+    ["result"],
+    registry=REGISTRY,
+)
+
+segment_cache_saved = Counter(
+    "hivebox_segment_cache_saved_bytes_total",
+    "Bytes of archive objects not downloaded thanks to the local segment cache",
+    registry=REGISTRY,
+)
+
+segment_cache_bytes = Gauge(
+    "hivebox_segment_cache_bytes",
+    "Bytes of archive segments held in the local disk cache",
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+
+
+METRICS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+_LIVE_GAUGE_FILE = re.compile(r"^gauge_live\w+?_(\d+)\.db$")
+
+
+def mark_process_dead(pid: int | None = None) -> None:
+    """Drop a worker's live gauges from the shared metrics directory"""
+    if METRICS_DIR_ENV in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def reap_dead_processes() -> list[int]:
+    """
+    Mark workers dead that exited without doing so, e.g. when killed.
+
+    Returns:
+        list: PIDs whose live gauges were dropped
+    """
+    directory = os.environ.get(METRICS_DIR_ENV)
+    if not directory or not os.path.isdir(directory):
+        return []
+    pids = set()
+    for name in os.listdir(directory):
+        match = _LIVE_GAUGE_FILE.match(name)
+        if match:
+            pids.add(int(match.group(1)))
+    dead = []
+    for pid in sorted(pids):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            dead.append(pid)
+        except PermissionError:
+            pass
+    for pid in dead:
+        multiprocess.mark_process_dead(pid, directory)
+    return dead
+
 
 @router.get("/metrics")
 async def get_metrics():
@@ -83,5 +249,10 @@ async def get_metrics():
     Prometheus metrics endpoint
     Returns all default and custom metrics in Prometheus format
     """
-    metrics_output = generate_latest(REGISTRY)
+    registry = REGISTRY
+    if METRICS_DIR_ENV in os.environ:
+        # Several server workers: merge the values every process recorded.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    metrics_output = generate_latest(registry)
     return Response(content=metrics_output, media_type=CONTENT_TYPE_LATEST)
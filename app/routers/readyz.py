@@ -2,6 +2,7 @@ import json
 import logging
 from fastapi import APIRouter, Response
 
+from app.services.cache import get_with_ttl
 from app.services.opensensemap import check_senseboxes_availability
 
 logger = logging.getLogger(__name__)
@@ -58,9 +59,8 @@ async def readyz():
     if valkey_client:
         try:
             valkey_status = "connected"
-            cached_data = await valkey_client.get("temperature_data")
+            cached_data, ttl = await get_with_ttl(valkey_client, "temperature_data")
             if cached_data:
-                ttl = await valkey_client.ttl("temperature_data")
                 if ttl > 0:
                     cache_valid = True
                 else:
@@ -1,28 +1,60 @@
+import asyncio
+import time
 from fastapi import APIRouter, HTTPException
-from app.services.minio_storage import store_temperature_data
-from app.services.opensensemap import (
-    fetch_temperature_data,
-    calculate_average_temperature,
-    get_temperature_status,
-)
+from app.config import settings
+from app.routers.temperature import current_temperature
+from app.services.minio_storage import get_last_stored, store_temperature_data
 
 router = APIRouter(tags=["storage"])
 
+_store_lock = asyncio.Lock()
+
 
 @router.get("/store")
 async def manual_store():
-    """Manually trigger store to MinIO"""
+    """
+    Manually trigger store to MinIO
+
+    - Reuses the cached (or in-flight) aggregate instead of refetching
+    - Concurrent calls are serialized, so they coalesce into one write
+    - At most one write per STORE_MIN_INTERVAL seconds, and none if the
+      aggregate is unchanged; the existing object key is returned instead
+    """
     try:
-        temp_data = await fetch_temperature_data()
-        avg_temp = calculate_average_temperature(temperature_data=temp_data)
-        result = {
-            "average_temperature": avg_temp,
-            "status": get_temperature_status(avg_temp),
-            "samples": len(temp_data),
-        }
-        success = await store_temperature_data(result)
-        if not success:
-            raise HTTPException(status_code=503, detail="Storage failed")
-        return {"message": "Data stored successfully", "data": result}
+        async with _store_lock:
+            last = get_last_stored()
+            if last and time.time() - last["stored_at"] < settings.STORE_MIN_INTERVAL:
+                return _already_stored(last)
+
+            temperature = await current_temperature()
+            result = {
+                "average_temperature": temperature["average_temperature"],
+                "status": temperature["status"],
+                "samples": temperature["samples"],
+            }
+            if last and last["data"] == result:
+                return _already_stored(last)
+
+            success = await store_temperature_data(result)
+            if not success:
+                raise HTTPException(status_code=503, detail="Storage failed")
+            stored = get_last_stored()
+            return {
+                "message": "Data stored successfully",
+                "data": result,
+                "object_name": stored["object_name"] if stored else None,
+                "deduplicated": False,
+            }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _already_stored(last: dict) -> dict:
+    return {
+        "message": "Data already stored",
+        "data": last["data"],
+        "object_name": last["object_name"],
+        "deduplicated": True,
+    }
@@ -1,12 +1,24 @@
+import asyncio
+from datetime import date
 import json
 import logging
 import time
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import redis.asyncio as redis
 from app.config import settings
+from app.services import cache, history, history_cache, segment_cache
+from app.services.aggregate_state import aggregate_state
+from app.services.anomaly import anomaly_detector
+from app.services.broadcast import SubscriberLimitError, temperature_hub
+from app.services.minio_storage import get_minio_client
+from app.services.http_cache import cache_headers, is_not_modified, make_etag
+from app.services.tracing import start_span
+from app.services.registry import box_registry
 from app.services.opensensemap import (
     fetch_temperature_data,
-    calculate_average_temperature,
+    calculate_state_average,
     get_temperature_status,
     OpenSenseMapError,
 )
@@ -21,9 +33,10 @@ from app.routers.metrics import (
 logger = logging.getLogger(__name__)
 router = APIRouter(tags=["temperature"])
 
-router = APIRouter(tags=["temperature"])
+CACHE_KEY = "temperature_data"
 
 _valkey_client: redis.Redis | None = None
+_inflight_refresh: asyncio.Task | None = None
 
 
 def set_valkey_client(client: redis.Redis) -> None:
@@ -32,59 +45,289 @@ def set_valkey_client(client: redis.Redis) -> None:
     _valkey_client = client
 
 
+async def publish_temperature(
+    average_temperature: float, samples: int, age: float | None = None
+) -> dict:
+    """
+    Build the temperature result, cache it and broadcast it.
+
+    Args:
+        average_temperature: Aggregated temperature
+        samples: Number of readings behind the aggregate
+        age: Seconds since the readings were refreshed, for results served
+            from a restored snapshot; included in the result when set
+
+    Returns:
+        dict: Temperature result
+    """
+    result = {
+        "average_temperature": average_temperature,
+        "status": get_temperature_status(average_temperature),
+        "unit": "°C",
+        "samples": samples,
+        "anomalies": anomaly_detector.flagged_count,
+    }
+    if age is not None:
+        result["age"] = round(age)
+
+    if _valkey_client:
+        try:
+            await cache.setex(
+                _valkey_client, CACHE_KEY, settings.CACHE_TTL, json.dumps(result)
+            )
+            logger.info("Temperature data cached successfully")
+        except redis.RedisError as e:
+            logger.warning(f"Cache write error: {e}")
+
+    temperature_value.set(average_temperature)
+    temperature_hub.publish(result)
+    await history.record(aggregate=result)
+    return result
+
+
+async def refresh_temperature(
+    use_state: bool = True, priority: str = "background"
+) -> dict:
+    """
+    Compute the current temperature result, cache it and broadcast it.
+
+    Concurrent refetches share one in-flight upstream fetch, which runs at
+    the priority of the caller that started it.
+
+    Args:
+        use_state: Serve the running aggregate if it is still warm
+        priority: Rate limiter class if boxes have to be refetched
+
+    Returns:
+        dict: Temperature result
+
+    Raises:
+        OpenSenseMapError: If no fresh data could be fetched
+    """
+    global _inflight_refresh
+    if use_state and aggregate_state.is_warm(settings.CACHE_TTL):
+        return await publish_temperature(
+            calculate_state_average(), len(aggregate_state)
+        )
+
+    if _inflight_refresh is None or _inflight_refresh.done():
+        _inflight_refresh = asyncio.create_task(_fetch_and_publish(priority))
+    return await asyncio.shield(_inflight_refresh)
+
+
+async def _fetch_and_publish(priority: str) -> dict:
+    logger.info("Fetching temperature data from OpenSenseMap")
+    await fetch_temperature_data(priority)
+    # The fetch feeds the aggregate state, which also holds pushed readings;
+    # publish from it like the warm-state and ingest paths do.
+    return await publish_temperature(calculate_state_average(), len(aggregate_state))
+
+
+async def cached_temperature() -> dict | None:
+    """The cached temperature result, or None if missing or unreadable"""
+    if _valkey_client:
+        try:
+            cached_data = await cache.get(_valkey_client, CACHE_KEY)
+            if cached_data:
+                return json.loads(cached_data)
+        except redis.RedisError as e:
+            logger.warning(f"Cache read error: {e}")
+    return None
+
+
+async def current_temperature(priority: str = "user") -> dict:
+    """
+    The current temperature result, from cache when possible.
+
+    Falls back to refresh_temperature(), which serves the warm running
+    aggregate or joins an in-flight refetch.
+
+    Returns:
+        dict: Temperature result
+    """
+    cached = await cached_temperature()
+    if cached is not None:
+        return cached
+    return await refresh_temperature(priority=priority)
+
+
+def _conditional_response(
+    request: Request, response: Response, body: str, age: float
+) -> Response | None:
+    """
+    Attach caching headers to `response` for a cached body of the given age.
+
+    Returns:
+        Response | None: A 304 response if the client's copy is current
+    """
+    now = time.time()
+    headers = cache_headers(
+        make_etag(body),
+        last_modified=now - age,
+        max_age=settings.CACHE_TTL - age,
+        stale_while_revalidate=settings.CACHE_TTL,
+    )
+    if is_not_modified(request.headers, headers["ETag"], now - age):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 @router.get("/temperature")
-async def get_temperature():
+async def get_temperature(request: Request, response: Response):
     """
     Get average temperature from configured senseBoxes
 
     - Data must be no older than 1 hour
     - Uses Valkey cache (5 minute TTL)
+    - On a cache miss, serves the in-process running aggregate if it was
+      refreshed within the cache TTL, otherwise refetches all boxes
     - Returns temperature with status based on thresholds
+    - Sends ETag, Last-Modified and Cache-Control matching the cache TTL,
+      and answers conditional requests with 304 Not Modified
     - Increments Prometheus metrics
     """
-    temperature_requests_counter.inc()
-    start_time = time.time()
+    with start_span("get_temperature") as span:
+        temperature_requests_counter.inc()
+        start_time = time.time()
+
+        try:
+            if _valkey_client:
+                try:
+                    cached_data, ttl = await cache.get_with_ttl(_valkey_client, CACHE_KEY)
+                    if cached_data:
+                        temperature_cache_hits.inc()
+                        span.set_attribute("cache", "hit")
+                        cached_result = json.loads(cached_data)
+                        temperature_value.set(cached_result["average_temperature"])
+                        age = settings.CACHE_TTL - ttl if ttl >= 0 else 0
+                        not_modified = _conditional_response(
+                            request, response, cached_data, age
+                        )
+                        if not_modified is not None:
+                            return not_modified
+                        return cached_result
+                except redis.RedisError as e:
+                    logger.warning(f"Cache read error: {e}")
 
-    cache_key = "temperature_data"
+            temperature_cache_misses.inc()
+            span.set_attribute("cache", "miss")
+            result = await refresh_temperature(priority="user")
+            not_modified = _conditional_response(
+                request, response, json.dumps(result), age=0
+            )
+            if not_modified is not None:
+                return not_modified
+            return result
 
+        except OpenSenseMapError as e:
+            raise HTTPException(status_code=503, detail=str(e)) from e
+        finally:
+            temperature_request_duration.observe(time.time() - start_time)
+
+
+@router.get("/temperature/stream")
+async def stream_temperature():
+    """
+    Server-Sent Events stream of temperature updates
+
+    - Sends the latest result on connect, then every new aggregate
+      published by the background poller
+    - Slow clients skip to the newest update instead of queueing
+    - Sends a keepalive comment when idle
+    - Returns 503 at the subscriber limit; the slot is taken before the
+      response starts, so concurrent connects cannot overshoot it
+    """
     try:
-        if _valkey_client:
-            try:
-                cached_data = await _valkey_client.get(cache_key)
-                if cached_data:
-                    temperature_cache_hits.inc()
-                    cached_result = json.loads(cached_data)
-                    temperature_value.set(cached_result["average_temperature"])
-                    return cached_result
-            except redis.RedisError as e:
-                logger.warning(f"Cache read error: {e}")
-
-        temperature_cache_misses.inc()
-        logger.info("Fetching temperature data from OpenSenseMap")
-        temperature_data = await fetch_temperature_data()
-        average_temperature = calculate_average_temperature(temperature_data)
-        status = get_temperature_status(average_temperature)
-
-        result = {
-            "average_temperature": average_temperature,
-            "status": status,
-            "unit": "°C",
-            "samples": len(temperature_data),
-        }
-
-        if _valkey_client:
-            try:
-                await _valkey_client.setex(
-                    cache_key, settings.CACHE_TTL, json.dumps(result)
-                )
-                logger.info("Temperature data cached successfully")
-            except redis.RedisError as e:
-                logger.warning(f"Cache write error: {e}")
-
-        temperature_value.set(average_temperature)
-        return result
-
-    except OpenSenseMapError as e:
+        subscription = temperature_hub.reserve()
+    except SubscriberLimitError as e:
         raise HTTPException(status_code=503, detail=str(e)) from e
-    finally:
-        temperature_request_duration.observe(time.time() - start_time)
+
+    return StreamingResponse(
+        temperature_hub.subscribe(
+            keepalive=settings.STREAM_KEEPALIVE, subscription=subscription
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Frees the slot if the client is gone before the stream ever starts.
+        background=BackgroundTask(temperature_hub.release, subscription),
+    )
+
+
+@router.get("/temperature/recent")
+async def get_recent_temperature(
+    window: int = Query(3600, gt=0, description="Seconds to look back"),
+    box_id: str | None = Query(None, description="Return one box's readings"),
+):
+    """
+    Recent temperature history served from Valkey
+
+    - Aggregates (or a single box's readings) from the last `window` seconds
+    - One round trip; history is capped by HISTORY_MAX_POINTS and
+      HISTORY_RETENTION_SECONDS
+    """
+    if window > settings.HISTORY_RETENTION_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"window exceeds retention of {settings.HISTORY_RETENTION_SECONDS}s",
+        )
+    try:
+        points = await history.recent(window, box_id=box_id)
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail="History unavailable") from e
+    return {"window": window, "box_id": box_id, "points": points}
+
+
+@router.get("/temperature/history")
+async def get_temperature_history(
+    start: date = Query(..., description="First UTC day"),
+    end: date = Query(..., description="Last UTC day, inclusive"),
+    resolution: int = Query(3600, gt=0, description="Seconds per point"),
+):
+    """
+    Archived temperature history for a range of UTC days
+
+    - Read from the daily archive files, through the local segment cache,
+      and averaged into `resolution`-second windows, weighted by samples
+    - Results are cached in Valkey until an archive day in the range is
+      rewritten; ranges reaching today also expire after
+      HISTORY_QUERY_CACHE_TTL
+    """
+    if end < start:
+        raise HTTPException(status_code=400, detail="end is before start")
+    if (end - start).days + 1 > settings.HISTORY_QUERY_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"range exceeds {settings.HISTORY_QUERY_MAX_DAYS} days",
+        )
+    registry_version = box_registry.version()
+    cached = await history_cache.get(start, end, resolution, registry_version)
+    if cached is not None:
+        return cached
+
+    client = get_minio_client()
+    if client is None:
+        raise HTTPException(status_code=503, detail="Archive unavailable")
+    read_generations = await history_cache.generations(start, end)
+    try:
+        columns = await asyncio.to_thread(
+            segment_cache.read_downsampled, client, start, end, resolution, read_generations
+        )
+    except Exception as e:
+        logger.warning(f"Archive read error: {e}")
+        raise HTTPException(status_code=503, detail="Archive unavailable") from e
+    result = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "resolution": resolution,
+        "points": [
+            {"timestamp": timestamp, "average_temperature": value, "samples": samples}
+            for timestamp, value, samples in zip(
+                columns["timestamp"].tolist(),
+                columns["average_temperature"].tolist(),
+                columns["samples"].tolist(),
+            )
+        ],
+    }
+    await history_cache.put(start, end, resolution, registry_version, result, read_generations)
+    return result
@@ -0,0 +1,248 @@
+"""Production server entry point.
+
+Runs uvicorn with:
+
+- the fastest event loop and HTTP parser installed (uvloop and httptools
+  when present, asyncio and h11 otherwise)
+- one worker per CPU the container may actually use: the cgroup CPU quota,
+  capped by the CPU affinity mask, never fewer than one
+- keep-alive, backlog and shutdown timeouts from a configuration profile
+
+A profile is a dict of `uvicorn.Config` arguments, addressed as
+`module:ATTRIBUTE` so deployments can ship their own; SERVER_PROFILE (or
+--profile) selects it, PRODUCTION below is the default.
+
+Workers in one container are like replicas: each keeps its own in-memory
+state and runs the per-process background tasks (polling, registry
+updates, snapshots, spool replay). Each claims a stable slot through a
+file lock; slot 0 keeps the configured local paths and alone runs the
+periodic archive write and compaction, other slots get their own spool,
+snapshot and segment cache, and the local size budgets and rate-limit
+share are divided between workers. Readings pushed to /ingest land in the
+state of the worker that received them, as with replicas.
+
+With several workers, Prometheus metrics are aggregated across processes.
+A worker marks itself dead on shutdown; a replacement worker also reaps
+workers that were killed, so live gauges stop counting them.
+
+Usage:
+    python -m app.server [--workers N] [--profile app.server:PRODUCTION]
+"""
+
+import argparse
+import fcntl
+import importlib
+import importlib.util
+import logging
+import math
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+WORKERS_ENV = "HIVEBOX_WORKERS"
+METRICS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+PRODUCTION = {
+    "host": "0.0.0.0",
+    "port": 8000,
+    # Longer than the ingress controller's upstream keep-alive (60s), so the
+    # proxy, not the app, closes idle connections and never reuses a dead one.
+    "timeout_keep_alive": 75,
+    "backlog": 2048,
+    # Stay inside the pod's 30s termination grace period.
+    "timeout_graceful_shutdown": 20,
+    "proxy_headers": True,
+    "forwarded_allow_ips": "*",
+    # Requests are already counted and traced; per-request log lines are not free.
+    "access_log": False,
+    "server_header": False,
+}
+
+DEVELOPMENT = {
+    "host": "127.0.0.1",
+    "port": 8000,
+    "workers": 1,
+    "reload": True,
+    "log_level": "debug",
+}
+
+_slot_lock = None
+
+
+def cgroup_cpu_limit(root: str = "/sys/fs/cgroup") -> float | None:
+    """
+    CPUs granted by the cgroup CPU quota (v2, then v1).
+
+    Returns:
+        float: Quota divided by period, or None if unlimited or unknown
+    """
+    try:
+        with open(os.path.join(root, "cpu.max"), encoding="ascii") as file:
+            quota, period = file.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us"), encoding="ascii") as file:
+            quota = int(file.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us"), encoding="ascii") as file:
+            period = int(file.read())
+    except (OSError, ValueError):
+        return None
+    return None if quota <= 0 or period <= 0 else quota / period
+
+
+def auto_workers(root: str = "/sys/fs/cgroup") -> int:
+    """
+    Worker count for the CPUs this container can use.
+
+    A fractional quota is rounded down: a worker without a whole CPU is
+    throttled in bursts, which shows up as tail latency.
+    """
+    cpus = len(os.sched_getaffinity(0))
+    limit = cgroup_cpu_limit(root)
+    if limit is not None:
+        cpus = min(cpus, math.floor(limit))
+    return max(1, cpus)
+
+
+def best_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def best_http() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def load_profile(spec: str) -> dict:
+    """
+    Import a profile given as `module:ATTRIBUTE`.
+
+    Raises:
+        ValueError: If the spec is malformed or does not name a dict
+    """
+    module_name, _, attribute = spec.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"Profile must be module:ATTRIBUTE, got {spec!r}")
+    profile = getattr(importlib.import_module(module_name), attribute, None)
+    if not isinstance(profile, dict):
+        raise ValueError(f"Profile {spec!r} is not a dict")
+    return dict(profile)
+
+
+def claim_worker_slot(workers: int, lock_dir: str | None = None) -> int:
+    """
+    Claim the lowest free worker slot, held until the process exits.
+
+    Slots are stable across worker restarts, so a replacement worker picks
+    up the spool and snapshot its predecessor left behind.
+
+    Raises:
+        RuntimeError: If every slot is taken
+    """
+    global _slot_lock
+    lock_dir = lock_dir or tempfile.gettempdir()
+    for slot in range(workers):
+        path = os.path.join(lock_dir, f"hivebox-worker-{slot}.lock")
+        lock = open(path, "w", encoding="ascii")  # pylint: disable=consider-using-with
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            continue
+        _slot_lock = lock
+        return slot
+    raise RuntimeError(f"All {workers} worker slots are taken")
+
+
+def _with_slot(path: str, slot: int) -> str:
+    if not path or slot == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{slot}{ext}"
+
+
+def isolate_worker_state(slot: int, workers: int) -> None:
+    """Give a worker its own local paths and share of local budgets"""
+    settings.WORKER_SLOT = slot
+    settings.SPOOL_DIR = _with_slot(settings.SPOOL_DIR, slot)
+    settings.SNAPSHOT_PATH = _with_slot(settings.SNAPSHOT_PATH, slot)
+    settings.SEGMENT_CACHE_DIR = _with_slot(settings.SEGMENT_CACHE_DIR, slot)
+    settings.SPOOL_MAX_BYTES //= workers
+    settings.SEGMENT_CACHE_MAX_BYTES //= workers
+    settings.UPSTREAM_REPLICAS *= workers
+
+
+def create_app():
+    """App factory run in each worker, before any service reads settings"""
+    workers = int(os.environ.get(WORKERS_ENV, "1"))
+    if workers > 1:
+        slot = claim_worker_slot(workers)
+        isolate_worker_state(slot, workers)
+        logger.info(f"Worker {os.getpid()} claimed slot {slot} of {workers}")
+    from app.routers.metrics import reap_dead_processes  # pylint: disable=import-outside-toplevel
+    from app.main import app  # pylint: disable=import-outside-toplevel
+
+    reap_dead_processes()
+
+    return app
+
+
+def _prepare_metrics_dir(workers: int) -> None:
+    """Start multi-process metrics from an empty directory"""
+    if workers <= 1:
+        os.environ.pop(METRICS_DIR_ENV, None)
+        return
+    directory = os.environ.setdefault(
+        METRICS_DIR_ENV, os.path.join(tempfile.gettempdir(), "hivebox-metrics")
+    )
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def build_config(
+    profile: dict, workers: int | None = None, host: str | None = None, port: int | None = None
+) -> dict:
+    """uvicorn.run() arguments: the profile, then explicit overrides"""
+    config = {"loop": best_loop(), "http": best_http(), **profile}
+    if workers:
+        config["workers"] = workers
+    config.setdefault("workers", auto_workers())
+    if config.get("reload"):
+        config["workers"] = 1
+    if host:
+        config["host"] = host
+    if port:
+        config["port"] = port
+    return config
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the HiveBox API server")
+    parser.add_argument("--profile", default=settings.SERVER_PROFILE)
+    parser.add_argument(
+        "--workers", type=int, default=settings.SERVER_WORKERS, help="0 sizes from CPU quota"
+    )
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    config = build_config(load_profile(args.profile), args.workers, args.host, args.port)
+    os.environ[WORKERS_ENV] = str(config["workers"])
+    _prepare_metrics_dir(config["workers"])
+    logger.info(
+        f"Starting {config['workers']} worker(s) with {config['loop']} loop, "
+        f"{config['http']} parser, profile {args.profile}"
+    )
+    uvicorn.run("app.server:create_app", factory=True, **config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import math
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.reading_store import ReadingStore
+
+
+class AggregateState:
+    """
+    Running aggregate over the latest reading of each senseBox.
+
+    Readings live in a column-oriented ReadingStore. Sum and count are
+    updated in O(1) per reading. Expiry is a no-op until the oldest reading
+    crosses the age limit, then one vectorized pass drops every stale box.
+    Min/max are recomputed over the value column only after a change.
+    """
+
+    def __init__(self, max_age_seconds: int | None = None):
+        self._max_age = max_age_seconds
+        self.clear()
+
+    @property
+    def max_age(self) -> int:
+        if self._max_age is not None:
+            return self._max_age
+        return settings.MAX_DATA_AGE_SECONDS
+
+    def clear(self) -> None:
+        """Drop all readings"""
+        self._readings = ReadingStore()
+        self._sum = 0.0
+        self._oldest = math.inf
+        self._extremes: tuple[float, float] | None = None
+        self.refreshed_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._readings)
+
+    def __contains__(self, box_id: str) -> bool:
+        return box_id in self._readings
+
+    def get(self, box_id: str) -> tuple[float, float] | None:
+        """Return (value, measured_at) for a box, if present"""
+        return self._readings.get(box_id)
+
+    def update(
+        self, box_id: str, value: float, measured_at: float, now: float | None = None
+    ) -> bool:
+        """
+        Record the latest reading of a box.
+
+        Args:
+            box_id: The senseBox ID
+            value: Measured temperature
+            measured_at: Measurement time as epoch seconds
+            now: Current epoch seconds (defaults to time.time())
+
+        Returns:
+            bool: True if the reading was applied; False if it was already
+            expired or older than the box's current reading
+        """
+        now = time.time() if now is None else now
+        if now - measured_at > self.max_age:
+            self.remove(box_id)
+            return False
+
+        previous = self._readings.get(box_id)
+        if previous is not None:
+            if previous[1] > measured_at:
+                return False
+            self._sum -= previous[0]
+
+        self._readings.set(box_id, value, measured_at)
+        self._sum += value
+        self._oldest = min(self._oldest, measured_at)
+        self._extremes = None
+        return True
+
+    def remove(self, box_id: str) -> None:
+        """Remove a box"""
+        previous = self._readings.remove(box_id)
+        if previous is not None:
+            self._sum -= previous[0]
+            self._extremes = None
+        if not self._readings:
+            self._sum = 0.0
+            self._oldest = math.inf
+
+    def expire(self, now: float | None = None) -> int:
+        """
+        Remove readings older than the maximum data age.
+
+        Returns:
+            int: Number of readings removed
+        """
+        now = time.time() if now is None else now
+        cutoff = now - self.max_age
+        if self._oldest >= cutoff:
+            return 0
+        removed = self._readings.remove_older_than(cutoff)
+        if len(removed):
+            self._sum -= float(removed.sum())
+            self._extremes = None
+        if not self._readings:
+            self._sum = 0.0
+        oldest = self._readings.oldest()
+        self._oldest = math.inf if oldest is None else oldest
+        return len(removed)
+
+    def mark_refreshed(self, now: float | None = None) -> None:
+        """Record that a full refresh of all boxes has completed"""
+        self.refreshed_at = time.time() if now is None else now
+
+    def is_warm(self, max_staleness: float, now: float | None = None) -> bool:
+        """True if refreshed within `max_staleness` seconds and non-empty"""
+        now = time.time() if now is None else now
+        self.expire(now)
+        return (
+            self.refreshed_at is not None
+            and now - self.refreshed_at < max_staleness
+            and bool(self._readings)
+        )
+
+    def snapshot(self, now: float | None = None) -> dict:
+        """
+        Current aggregate from the running sum and the value column.
+
+        Returns:
+            dict: count, sum, mean, min, max and refreshed_at
+        """
+        self.expire(now)
+        count = len(self._readings)
+        if self._extremes is None and count:
+            values = self._readings.live_values()
+            self._extremes = (float(values.min()), float(values.max()))
+        low, high = self._extremes if count else (0.0, 0.0)
+        return {
+            "count": count,
+            "sum": self._sum,
+            "mean": self._sum / count if count else 0.0,
+            "min": low,
+            "max": high,
+            "refreshed_at": self.refreshed_at,
+        }
+
+    def columns(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """Box IDs, values and measurement times of all readings"""
+        return self._readings.columns()
+
+    def values(self) -> np.ndarray:
+        """Latest values of all boxes as a contiguous float array"""
+        return self._readings.live_values()
+
+
+aggregate_state = AggregateState()
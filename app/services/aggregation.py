@@ -0,0 +1,112 @@
+import logging
+from typing import List
+
+import numpy as np
+
+from app.config import settings
+from app.config.settings import AGGREGATION_METHODS
+
+logger = logging.getLogger(__name__)
+
+# Scales the MAD so the modified z-score is comparable to a standard z-score
+# for normally distributed data (Iglewicz & Hoaglin).
+MAD_SCALE = 0.6745
+# Fallback scale when more than half the samples are identical and MAD is 0.
+MEAN_AD_SCALE = 0.7979
+
+
+def to_array(temperature_data: List[dict]) -> np.ndarray:
+    """
+    Convert a list of temperature measurements to a contiguous float array.
+
+    Args:
+        temperature_data: List of dicts with a 'value' key
+
+    Returns:
+        np.ndarray: float64 array of values
+    """
+    return np.fromiter(
+        (item["value"] for item in temperature_data),
+        dtype=np.float64,
+        count=len(temperature_data),
+    )
+
+
+def mad_inlier_mask(values: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Flag values whose modified z-score is within the threshold.
+
+    Args:
+        values: Array of samples
+        threshold: Maximum absolute modified z-score for an inlier
+
+    Returns:
+        np.ndarray: Boolean mask, True for inliers
+    """
+    if values.size < 3:
+        return np.ones(values.shape, dtype=bool)
+
+    median = np.median(values)
+    deviations = np.abs(values - median)
+    mad = np.median(deviations)
+
+    if mad > 0:
+        scores = MAD_SCALE * deviations / mad
+    else:
+        mean_ad = deviations.mean()
+        if mean_ad == 0:
+            return np.ones(values.shape, dtype=bool)
+        scores = MEAN_AD_SCALE * deviations / mean_ad
+
+    return scores <= threshold
+
+
+def trimmed_mean(values: np.ndarray, proportion: float) -> float:
+    """
+    Mean after cutting `proportion` of the samples from each end.
+
+    Args:
+        values: Array of samples
+        proportion: Fraction to trim from each tail, in [0, 0.5)
+
+    Returns:
+        float: Trimmed mean, or 0.0 for an empty array
+    """
+    if values.size == 0:
+        return 0.0
+    cut = int(values.size * proportion)
+    if cut == 0 or 2 * cut >= values.size:
+        return float(values.mean())
+    kept = np.partition(values, (cut, values.size - cut - 1))[cut : values.size - cut]
+    return float(kept.mean())
+
+
+def aggregate(values: np.ndarray, method: str | None = None) -> float:
+    """
+    Reduce samples to a single temperature using the configured method.
+
+    Args:
+        values: Array of samples
+        method: One of AGGREGATION_METHODS (defaults to settings)
+
+    Returns:
+        float: Aggregated value, or 0.0 when no samples remain
+
+    Raises:
+        ValueError: If the method is unknown
+    """
+    method = method or settings.AGGREGATION_METHOD
+    if method not in AGGREGATION_METHODS:
+        raise ValueError(f"Unknown aggregation method: {method}")
+
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if settings.OUTLIER_REJECTION:
+        values = values[mad_inlier_mask(values, settings.OUTLIER_MAD_THRESHOLD)]
+
+    if values.size == 0:
+        return 0.0
+    if method == "median":
+        return float(np.median(values))
+    if method == "trimmed_mean":
+        return trimmed_mean(values, settings.TRIM_PROPORTION)
+    return float(values.mean())
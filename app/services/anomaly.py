@@ -0,0 +1,124 @@
+import math
+
+import numpy as np
+
+from app.config import settings
+from app.routers.metrics import anomalous_boxes, anomalous_readings
+from app.services.reading_store import INITIAL_CAPACITY, SlotColumns
+
+
+class AnomalyDetector(SlotColumns):
+    """
+    Per-box rolling statistics that flag implausible readings.
+
+    Each box keeps an exponentially weighted mean and variance, updated in
+    O(1) per new reading in preallocated numpy columns. After
+    ANOMALY_WARMUP readings, a value more than ANOMALY_Z_THRESHOLD standard
+    deviations (at least ANOMALY_MIN_STD) from the box's own mean is
+    flagged. Flagged values do not move the baseline, so a failing sensor
+    cannot drag its statistics along; after ANOMALY_RESET_AFTER consecutive
+    flags the box is assumed to have genuinely changed (moved, recalibrated)
+    and its baseline restarts from the new level.
+    """
+
+    COLUMNS = {
+        "mean": np.float64,
+        "variance": np.float64,
+        "count": np.int64,
+        "streak": np.int32,
+        "flagged": bool,
+        "measured_at": np.float64,
+    }
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        super().__init__(capacity)
+        self._flagged_count = 0
+
+    @property
+    def flagged_count(self) -> int:
+        """Number of boxes whose latest reading was flagged"""
+        return self._flagged_count
+
+    def clear(self) -> None:
+        self.__init__()
+        anomalous_boxes.set(0)
+
+    def is_flagged(self, box_id: str) -> bool:
+        slot = self._index.get(box_id)
+        return slot is not None and bool(self.flagged[slot])
+
+    def _set_flag(self, slot: int, flagged: bool) -> None:
+        if bool(self.flagged[slot]) != flagged:
+            self._flagged_count += 1 if flagged else -1
+            self.flagged[slot] = flagged
+            anomalous_boxes.set(self._flagged_count)
+
+    def observe(self, box_id: str, value: float, measured_at: float) -> bool:
+        """
+        Score a reading of a box and update its statistics.
+
+        A measurement that is not newer than the last one observed for the
+        box only returns its current flag, so polling the same measurement
+        again does not count it twice.
+
+        Returns:
+            bool: True if the reading is anomalous
+        """
+        slot = self._slot(box_id)
+        if measured_at <= self.measured_at[slot]:
+            return bool(self.flagged[slot])
+        self.measured_at[slot] = measured_at
+        count = int(self.count[slot])
+        mean = float(self.mean[slot])
+        variance = float(self.variance[slot])
+        deviation = value - mean
+
+        std = max(math.sqrt(variance), settings.ANOMALY_MIN_STD)
+        is_anomaly = (
+            count >= settings.ANOMALY_WARMUP
+            and abs(deviation) > settings.ANOMALY_Z_THRESHOLD * std
+        )
+        if is_anomaly:
+            streak = int(self.streak[slot]) + 1
+            if streak < settings.ANOMALY_RESET_AFTER:
+                self.streak[slot] = streak
+                self._set_flag(slot, True)
+                anomalous_readings.inc()
+                return True
+            # Persistent shift: accept the new level as the baseline.
+            count, mean, variance, deviation = 0, value, 0.0, 0.0
+
+        alpha = settings.ANOMALY_ALPHA
+        if count == 0:
+            self.mean[slot] = value
+            self.variance[slot] = 0.0
+        else:
+            self.mean[slot] = mean + alpha * deviation
+            self.variance[slot] = (1 - alpha) * (variance + alpha * deviation * deviation)
+        self.count[slot] = count + 1
+        self.streak[slot] = 0
+        self._set_flag(slot, False)
+        return False
+
+    def remove(self, box_id: str) -> None:
+        """Forget a box's statistics"""
+        slot = self._index.get(box_id)
+        if slot is None:
+            return
+        self._set_flag(slot, False)
+        self._release(slot)
+
+
+anomaly_detector = AnomalyDetector()
+
+
+def screen(box_id: str, value: float, measured_at: float) -> bool:
+    """
+    Check a reading against its box's history.
+
+    Returns:
+        bool: True if it is anomalous; always False with ANOMALY_DETECTION off
+    """
+    if not settings.ANOMALY_DETECTION:
+        return False
+    return anomaly_detector.observe(box_id, value, measured_at)
@@ -0,0 +1,452 @@
+"""Compact per-sample `temperature/*.json` objects into daily columnar files.
+
+Each UTC day is merged into `archive/temperature/YYYY-MM-DD.npz`, a
+compressed numpy archive with one array per column, with summary statistics
+in the object metadata. A month of history is then ~30 sequential GETs.
+
+Compaction is idempotent: rows are keyed by their timestamp, an existing
+archive is merged with any objects still present for the day, and originals
+are deleted only after the merged archive has been written. An interrupted
+run therefore never loses samples and a rerun finishes it.
+
+MinIO has no conditional writes, so two writers of one day (replicas
+compacting, a backfill merging) could each overwrite the other's archive.
+Every write of a day's archive is therefore made under that day's lock in
+Valkey; a day whose lock is unavailable is left for a later run.
+
+Usage:
+    python -m app.services.archive [--day YYYY-MM-DD]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Iterable
+
+import numpy as np
+import redis.asyncio as redis
+from minio import Minio
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
+
+from app.config import settings
+from app.services import cache, history_cache
+from app.services.cache import create_valkey_client
+from app.services.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+SOURCE_PREFIX = "temperature/"
+ARCHIVE_PREFIX = "archive/temperature/"
+COLUMNS = {
+    "timestamp": np.float64,
+    "average_temperature": np.float64,
+    "samples": np.int32,
+}
+LOCK_PREFIX = "hivebox:archive:lock:"
+
+# Delete or extend a lock only while it still holds this writer's token.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+RENEW_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_lock_client: redis.Redis | None = None
+
+
+class ArchiveLockError(Exception):
+    """Raised when a day's archive lock could not be taken."""
+
+    pass
+
+
+def set_archive_lock_client(client: redis.Redis) -> None:
+    """Set Valkey client from main app"""
+    global _lock_client
+    _lock_client = client
+
+
+def archive_name(day: date) -> str:
+    return f"{ARCHIVE_PREFIX}{day.isoformat()}.npz"
+
+
+def source_timestamp(object_name: str) -> float:
+    """Epoch seconds encoded in a `temperature/<utc iso>.json` object name"""
+    stamp = object_name[len(SOURCE_PREFIX) :].removesuffix(".json")
+    return datetime.fromisoformat(stamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def pending_days(client: Minio, before: date) -> dict[date, list[str]]:
+    """
+    Group uncompacted source objects by UTC day.
+
+    Args:
+        client: MinIO client
+        before: Only days strictly before this date are returned
+
+    Returns:
+        dict: day -> source object names
+    """
+    days: dict[date, list[str]] = {}
+    for obj in client.list_objects(
+        settings.MINIO_BUCKET, prefix=SOURCE_PREFIX, recursive=True
+    ):
+        try:
+            day = date.fromisoformat(obj.object_name[len(SOURCE_PREFIX) :][:10])
+        except ValueError:
+            continue
+        if day < before:
+            days.setdefault(day, []).append(obj.object_name)
+    return days
+
+
+def encode_columns(columns: dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **columns)
+    return buffer.getvalue()
+
+
+def decode_columns(payload: bytes) -> dict[str, np.ndarray]:
+    with np.load(io.BytesIO(payload)) as archive:
+        return {name: archive[name] for name in COLUMNS}
+
+
+def empty_columns() -> dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def column_stats(columns: dict[str, np.ndarray]) -> dict[str, str]:
+    """Summary statistics stored as object metadata"""
+    values = columns["average_temperature"]
+    if not len(values):
+        return {"count": "0"}
+    return {
+        "count": str(len(values)),
+        "min": f"{values.min():.2f}",
+        "max": f"{values.max():.2f}",
+        "mean": f"{values.mean():.2f}",
+        "first": f"{columns['timestamp'][0]:.3f}",
+        "last": f"{columns['timestamp'][-1]:.3f}",
+    }
+
+
+async def _renew_lock(key: str, token: str, ttl_ms: int) -> None:
+    while True:
+        await asyncio.sleep(ttl_ms / 3000)
+        try:
+            renewed = await cache.script(_lock_client, RENEW_LOCK_SCRIPT, [key], [token, ttl_ms])
+        except redis.RedisError as e:
+            logger.warning(f"Archive lock {key} not renewed: {e}")
+            continue
+        if not int(renewed):
+            logger.warning(f"Archive lock {key} was lost")
+            return
+
+
+@asynccontextmanager
+async def day_lock(day: date, wait: float = 0.0) -> AsyncIterator[None]:
+    """
+    Hold the write lock of one archive day.
+
+    The lock is renewed while held and expires ARCHIVE_LOCK_TTL seconds
+    after its holder dies. Without a Valkey client (tests, one-off tools
+    without Valkey) the caller is taken to be the only writer.
+
+    Args:
+        day: The archive day to write
+        wait: Seconds to keep retrying while another writer holds it
+
+    Raises:
+        ArchiveLockError: If the lock is held elsewhere or Valkey is unreachable
+    """
+    if _lock_client is None:
+        yield
+        return
+    key = f"{LOCK_PREFIX}{day.isoformat()}"
+    token = uuid.uuid4().hex
+    ttl_ms = settings.ARCHIVE_LOCK_TTL * 1000
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            acquired = await cache.command(_lock_client, "set", key, token, px=ttl_ms, nx=True)
+        except redis.RedisError as e:
+            raise ArchiveLockError(f"Archive lock {key} unavailable: {e}") from e
+        if acquired:
+            break
+        if time.monotonic() >= deadline:
+            raise ArchiveLockError(f"Archive lock {key} is held by another writer")
+        await asyncio.sleep(1.0)
+
+    renewer = asyncio.create_task(_renew_lock(key, token, ttl_ms))
+    try:
+        yield
+    finally:
+        renewer.cancel()
+        try:
+            await cache.script(_lock_client, RELEASE_LOCK_SCRIPT, [key], [token])
+        except redis.RedisError as e:
+            logger.warning(f"Archive lock {key} not released, expires on its own: {e}")
+
+
+def fetch_day(client: Minio, day: date) -> tuple[bytes, str] | None:
+    """
+    A day's encoded archive with its ETag.
+
+    Returns:
+        tuple: (payload, etag), or None if the day has not been compacted
+    """
+    try:
+        response = client.get_object(settings.MINIO_BUCKET, archive_name(day))
+    except S3Error as e:
+        if e.code == "NoSuchKey":
+            return None
+        raise
+    try:
+        return response.read(), response.headers.get("ETag", "").strip('"')
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def read_day(client: Minio, day: date) -> bytes | None:
+    """A day's encoded archive, or None if it has not been compacted"""
+    fetched = fetch_day(client, day)
+    return None if fetched is None else fetched[0]
+
+
+def day_etags(client: Minio, start: date, end: date) -> dict[date, str]:
+    """
+    ETags of the archived days in an inclusive range, from one listing.
+
+    Only names sharing the range's common date prefix (e.g. its year) are
+    listed. Days without an archive are absent from the result.
+    """
+    prefix = os.path.commonprefix([start.isoformat(), end.isoformat()])
+    etags = {}
+    for obj in client.list_objects(settings.MINIO_BUCKET, prefix=f"{ARCHIVE_PREFIX}{prefix}"):
+        try:
+            day = date.fromisoformat(obj.object_name[len(ARCHIVE_PREFIX) :][:10])
+        except ValueError:
+            continue
+        if start <= day <= end:
+            etags[day] = (obj.etag or "").strip('"')
+    return etags
+
+
+def load_day(client: Minio, day: date) -> dict[str, np.ndarray]:
+    """Read a day's archive, or empty columns if it has not been compacted"""
+    payload = read_day(client, day)
+    return empty_columns() if payload is None else decode_columns(payload)
+
+
+def read_sources(client: Minio, names: list[str]) -> dict[str, np.ndarray]:
+    rows = []
+    for name in names:
+        response = client.get_object(settings.MINIO_BUCKET, name)
+        try:
+            data = json.loads(response.read())
+        finally:
+            response.close()
+            response.release_conn()
+        rows.append(
+            (
+                source_timestamp(name),
+                float(data["average_temperature"]),
+                int(data.get("samples", 0)),
+            )
+        )
+    if not rows:
+        return empty_columns()
+    timestamps, values, samples = zip(*rows)
+    return {
+        "timestamp": np.array(timestamps, dtype=COLUMNS["timestamp"]),
+        "average_temperature": np.array(values, dtype=COLUMNS["average_temperature"]),
+        "samples": np.array(samples, dtype=COLUMNS["samples"]),
+    }
+
+
+def merge_columns(*parts: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Concatenate column sets, sorted by timestamp with duplicates dropped"""
+    merged = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+    _, unique = np.unique(merged["timestamp"], return_index=True)
+    return {name: column[unique] for name, column in merged.items()}
+
+
+def write_day(client: Minio, day: date, columns: dict[str, np.ndarray]) -> None:
+    """Replace a day's archive with the given columns"""
+    payload = encode_columns(columns)
+    client.put_object(
+        settings.MINIO_BUCKET,
+        archive_name(day),
+        data=io.BytesIO(payload),
+        length=len(payload),
+        content_type="application/x-npz",
+        metadata=column_stats(columns),
+    )
+
+
+def compact_day(client: Minio, day: date, names: list[str]) -> int:
+    """
+    Merge a day's source objects into its archive, then delete them.
+
+    Returns:
+        int: Rows in the day's archive
+    """
+    with start_span("archive compact_day", day=day.isoformat(), objects=len(names)):
+        columns = merge_columns(load_day(client, day), read_sources(client, names))
+        write_day(client, day, columns)
+        errors = list(
+            client.remove_objects(
+                settings.MINIO_BUCKET, (DeleteObject(name) for name in names)
+            )
+        )
+    for error in errors:
+        logger.warning(f"Archive cleanup failed for {error.name}: {error.message}")
+    logger.info(f"Compacted {len(names)} objects into {archive_name(day)}")
+    return len(columns["timestamp"])
+
+
+async def compact_locked(client: Minio, day: date) -> int | None:
+    """
+    Compact one day under its lock.
+
+    The day's sources are listed again once the lock is held, so objects
+    another writer compacted and deleted meanwhile are not read.
+
+    Returns:
+        int: Rows in the day's archive, None if nothing was left to compact
+
+    Raises:
+        ArchiveLockError: If the day's lock could not be taken
+    """
+    async with day_lock(day):
+        names = await asyncio.to_thread(
+            lambda: pending_days(client, day + timedelta(days=1)).get(day, [])
+        )
+        if not names:
+            return None
+        return await asyncio.to_thread(compact_day, client, day, names)
+
+
+async def compact(client: Minio, now: float | None = None) -> dict[date, int]:
+    """
+    Compact every day that closed at least ARCHIVE_GRACE_SECONDS ago.
+
+    The grace period keeps compaction away from days that writers may still
+    be appending to. Days locked by another writer are skipped.
+
+    Returns:
+        dict: day -> rows in its archive
+    """
+    now = time.time() if now is None else now
+    cutoff = datetime.fromtimestamp(
+        now - settings.ARCHIVE_GRACE_SECONDS, tz=timezone.utc
+    ).date()
+    results = {}
+    for day in sorted(await asyncio.to_thread(pending_days, client, cutoff)):
+        try:
+            rows = await compact_locked(client, day)
+        except ArchiveLockError as e:
+            logger.info(f"Skipped compacting {day.isoformat()}: {e}")
+            continue
+        if rows is not None:
+            results[day] = rows
+    return results
+
+
+def downsample(
+    columns: dict[str, np.ndarray], resolution: int, decimals: int | None = 2
+) -> dict[str, np.ndarray]:
+    """
+    Combine rows into `resolution`-second windows.
+
+    A window's temperature is the sample-weighted mean of its rows, rounded
+    to `decimals` (None keeps full precision), and its samples are their sum.
+    """
+    if not len(columns["timestamp"]):
+        return empty_columns()
+    windows = np.floor(columns["timestamp"] / resolution) * resolution
+    timestamps, index = np.unique(windows, return_inverse=True)
+    samples = np.bincount(index, weights=columns["samples"])
+    totals = np.bincount(index, weights=columns["average_temperature"] * columns["samples"])
+    means = np.divide(totals, samples, out=np.zeros_like(totals), where=samples > 0)
+    if decimals is not None:
+        means = np.round(means, decimals)
+    return {
+        "timestamp": timestamps.astype(COLUMNS["timestamp"]),
+        "average_temperature": means.astype(COLUMNS["average_temperature"]),
+        "samples": samples.astype(COLUMNS["samples"]),
+    }
+
+
+def downsample_days(
+    days: Iterable[dict[str, np.ndarray]], resolution: int
+) -> dict[str, np.ndarray]:
+    """
+    Downsample consecutive days one at a time, then combine their windows.
+
+    Only each day's small per-window result is concatenated, never the raw
+    rows; a window spanning several days is merged by sample weight.
+    """
+    parts = [downsample(day, resolution, decimals=None) for day in days]
+    if not parts:
+        return empty_columns()
+    return downsample(
+        {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS},
+        resolution,
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compact archived temperature data")
+    parser.add_argument(
+        "--day", type=date.fromisoformat, help="Compact only this UTC day"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    client = Minio(
+        settings.MINIO_ENDPOINT,
+        access_key=settings.MINIO_ACCESS_KEY,
+        secret_key=settings.MINIO_SECRET_KEY,
+        secure=settings.MINIO_SECURE,
+    )
+    valkey = create_valkey_client()
+    set_archive_lock_client(valkey)
+    history_cache.set_history_cache_client(valkey)
+    return asyncio.run(_compact_main(client, args.day))
+
+
+async def _compact_main(client: Minio, day: date | None) -> int:
+    if day:
+        try:
+            rows = await compact_locked(client, day)
+        except ArchiveLockError as e:
+            print(f"{day.isoformat()}: {e}")
+            return 1
+        results = {} if rows is None else {day: rows}
+    else:
+        results = await compact(client)
+    for compacted, rows in results.items():
+        print(f"{compacted.isoformat()}: {rows} rows")
+    await history_cache.invalidate(results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
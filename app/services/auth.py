@@ -0,0 +1,31 @@
+import hmac
+
+from fastapi import Header, HTTPException
+
+from app.config import settings
+
+
+def check_token(presented: str | None, expected: str) -> bool:
+    """Constant-time comparison; always False when `expected` is unset"""
+    if not expected or not presented:
+        return False
+    return hmac.compare_digest(presented.encode(), expected.encode())
+
+
+def require_bearer(setting: str):
+    """
+    Dependency allowing only `Authorization: Bearer <settings.<setting>>`.
+
+    Endpoints answer 404 while the setting is empty, so they stay invisible
+    unless explicitly enabled.
+    """
+
+    def dependency(authorization: str | None = Header(None)) -> None:
+        expected = getattr(settings, setting)
+        if not expected:
+            raise HTTPException(status_code=404, detail="Not Found")
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not check_token(token, expected):
+            raise HTTPException(status_code=401, detail="Invalid token")
+
+    return dependency
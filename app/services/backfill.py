@@ -0,0 +1,352 @@
+"""Backfill the temperature archive from openSenseMap's measurement history.
+
+For each box, the temperature sensor's raw measurements are fetched for a
+date range in chunks of CHUNK days, many requests at a time, each through
+the shared upstream rate limiter at background priority. Raw measurements
+are averaged per box and STORAGE_INTERVAL window, then across boxes, and
+merged into the daily `archive/temperature/YYYY-MM-DD.npz` files under each
+day's archive lock. Rows already in an archive win over backfilled ones.
+
+Completed days are checkpointed in MinIO after every chunk, so a rerun with
+the same range resumes where the last one stopped. A day is complete only
+once every box was read for it; a chunk with a failed box is left for the
+rerun, and the command exits non-zero while any day is missing.
+
+Usage:
+    python -m app.services.backfill --from 2024-01-01 --to 2024-12-31 \\
+        [--box ID ...] [--chunk-days 1] [--concurrency 8]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+
+import httpx
+import numpy as np
+from minio import Minio
+from minio.error import S3Error
+
+from app.config import settings
+from app.routers.metrics import upstream_requests
+from app.services import archive, history_cache
+from app.services.cache import create_valkey_client
+from app.services.opensensemap import OpenSenseMapError, fetch_box_data, parse_timestamp
+from app.services.rate_limit import RateLimitExceeded, set_rate_limit_client, upstream_limiter
+from app.services.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PREFIX = "backfill/checkpoints/"
+# openSenseMap returns at most this many measurements per request.
+MAX_MEASUREMENTS = 10000
+
+
+def day_chunks(start: date, end: date, chunk_days: int) -> list[list[date]]:
+    """Split an inclusive day range into consecutive chunks of days"""
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    return [days[i : i + chunk_days] for i in range(0, len(days), chunk_days)]
+
+
+def day_bounds(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def aggregate_series(
+    per_box: list[tuple[np.ndarray, np.ndarray]], interval: int
+) -> dict[str, np.ndarray]:
+    """
+    Reduce raw per-box measurements to the archive's aggregate rows.
+
+    Each box's readings are first averaged within each `interval`-second
+    window, so boxes that report often do not outweigh the others; the
+    window's row is the mean over boxes, with `samples` the number of boxes.
+
+    Args:
+        per_box: (epoch seconds, values) arrays of each box
+
+    Returns:
+        dict: Archive columns sorted by timestamp
+    """
+    per_box = [(ts, values) for ts, values in per_box if len(ts)]
+    if not per_box:
+        return archive.empty_columns()
+    windows = np.concatenate([np.floor(ts / interval) * interval for ts, _ in per_box])
+    boxes = np.concatenate([np.full(len(ts), n) for n, (ts, _) in enumerate(per_box)])
+    values = np.concatenate([values for _, values in per_box])
+
+    keys, inverse = np.unique(np.stack([windows, boxes]), axis=1, return_inverse=True)
+    box_means = np.bincount(inverse, weights=values) / np.bincount(inverse)
+    timestamps, window_index = np.unique(keys[0], return_inverse=True)
+    counts = np.bincount(window_index)
+    means = np.bincount(window_index, weights=box_means) / counts
+    return {
+        "timestamp": timestamps.astype(archive.COLUMNS["timestamp"]),
+        "average_temperature": np.round(means, 2).astype(
+            archive.COLUMNS["average_temperature"]
+        ),
+        "samples": counts.astype(archive.COLUMNS["samples"]),
+    }
+
+
+async def temperature_sensor_id(box_id: str) -> str | None:
+    """ID of the box's TEMPERATURE_PHENOMENON sensor, if it has one"""
+    box_data = await fetch_box_data(box_id)
+    for sensor in box_data.get("sensors", []):
+        if sensor.get("title") == settings.TEMPERATURE_PHENOMENON:
+            return sensor.get("_id")
+    return None
+
+
+async def fetch_measurements(
+    client: httpx.AsyncClient,
+    box_id: str,
+    sensor_id: str,
+    start: datetime,
+    end: datetime,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Raw measurements of one sensor in [start, end).
+
+    A window that hits the per-request limit is split in half and fetched
+    again, so dense sensors are never truncated.
+
+    Returns:
+        tuple: epoch seconds and values
+    """
+    url = f"{settings.OPENSENSEMAP_API_URL}/boxes/{box_id}/data/{sensor_id}"
+    params = {
+        "from-date": start.isoformat().replace("+00:00", "Z"),
+        "to-date": end.isoformat().replace("+00:00", "Z"),
+        "format": "json",
+    }
+    with start_span("fetch_measurements", box_id=box_id) as span:
+        # A backfill has no deadline: keep queueing behind live traffic.
+        while True:
+            try:
+                await upstream_limiter.acquire("background")
+                break
+            except RateLimitExceeded:
+                continue
+        try:
+            response = await client.get(url, params=params, timeout=60.0)
+            response.raise_for_status()
+            upstream_requests.labels(outcome="ok").inc()
+        except httpx.HTTPError as e:
+            upstream_requests.labels(outcome="error").inc()
+            raise OpenSenseMapError(f"Failed to fetch history of {box_id}: {e}") from e
+        rows = response.json()
+        span.set_attribute("rows", len(rows))
+
+    if len(rows) >= MAX_MEASUREMENTS and end - start > timedelta(minutes=1):
+        middle = start + (end - start) / 2
+        first, second = await asyncio.gather(
+            fetch_measurements(client, box_id, sensor_id, start, middle),
+            fetch_measurements(client, box_id, sensor_id, middle, end),
+        )
+        return np.concatenate([first[0], second[0]]), np.concatenate([first[1], second[1]])
+
+    timestamps = np.fromiter(
+        (parse_timestamp(row["createdAt"]) for row in rows), dtype=np.float64, count=len(rows)
+    )
+    values = np.fromiter((float(row["value"]) for row in rows), dtype=np.float64, count=len(rows))
+    in_range = (timestamps >= start.timestamp()) & (timestamps < end.timestamp())
+    return timestamps[in_range], values[in_range]
+
+
+def checkpoint_name(start: date, end: date) -> str:
+    return f"{CHECKPOINT_PREFIX}{start.isoformat()}_{end.isoformat()}.json"
+
+
+def load_checkpoint(client: Minio, start: date, end: date) -> set[date]:
+    """Days of the range completed by earlier runs"""
+    try:
+        response = client.get_object(settings.MINIO_BUCKET, checkpoint_name(start, end))
+    except S3Error as e:
+        if e.code == "NoSuchKey":
+            return set()
+        raise
+    try:
+        return {date.fromisoformat(day) for day in json.loads(response.read())["done"]}
+    finally:
+        response.close()
+        response.release_conn()
+
+
+def save_checkpoint(client: Minio, start: date, end: date, done: set[date]) -> None:
+    payload = json.dumps({"done": sorted(day.isoformat() for day in done)}).encode()
+    client.put_object(
+        settings.MINIO_BUCKET,
+        checkpoint_name(start, end),
+        data=io.BytesIO(payload),
+        length=len(payload),
+        content_type="application/json",
+    )
+
+
+def merge_day(client: Minio, day: date, columns: dict[str, np.ndarray]) -> int:
+    """
+    Merge backfilled rows into a day's archive; existing rows take precedence.
+
+    Returns:
+        int: Rows in the day's archive
+    """
+    merged = archive.merge_columns(archive.load_day(client, day), columns)
+    archive.write_day(client, day, merged)
+    return len(merged["timestamp"])
+
+
+class Backfill:
+    """One backfill run over a date range"""
+
+    def __init__(
+        self,
+        minio: Minio,
+        box_ids: list[str],
+        start: date,
+        end: date,
+        chunk_days: int = 1,
+        concurrency: int = 8,
+    ):
+        self.minio = minio
+        self.box_ids = box_ids
+        self.start = start
+        self.end = end
+        self.chunk_days = chunk_days
+        self.concurrency = concurrency
+        self._requests = asyncio.Semaphore(concurrency)
+        self._checkpoint = asyncio.Lock()
+        self.done: set[date] = set()
+
+    async def _fetch_box(
+        self, http: httpx.AsyncClient, box_id: str, sensor_id: str, days: list[date]
+    ) -> tuple[np.ndarray, np.ndarray] | None:
+        """A box's measurements for the chunk, None if they could not be read"""
+        start, _ = day_bounds(days[0])
+        _, end = day_bounds(days[-1])
+        async with self._requests:
+            try:
+                return await fetch_measurements(http, box_id, sensor_id, start, end)
+            except OpenSenseMapError as e:
+                logger.warning(f"{box_id} {days[0]}..{days[-1]} failed: {e}")
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"{box_id} {days[0]}..{days[-1]} unreadable: {e!r}")
+            return None
+
+    async def _run_chunk(
+        self, http: httpx.AsyncClient, sensors: dict[str, str], days: list[date]
+    ) -> None:
+        per_box = await asyncio.gather(
+            *(self._fetch_box(http, box_id, sensor, days) for box_id, sensor in sensors.items())
+        )
+        if any(series is None for series in per_box):
+            # Existing rows win on merge, so a partial average merged now
+            # could never be corrected by a rerun: leave the whole chunk.
+            logger.warning(f"{days[0]}..{days[-1]} left for a rerun: not every box was read")
+            return
+        series = aggregate_series(list(per_box), settings.STORAGE_INTERVAL)
+        for day in days:
+            start, end = (bound.timestamp() for bound in day_bounds(day))
+            mask = (series["timestamp"] >= start) & (series["timestamp"] < end)
+            if mask.any():
+                columns = {name: column[mask] for name, column in series.items()}
+                try:
+                    # Wait out a compaction of the same day rather than skip it.
+                    async with archive.day_lock(day, wait=settings.ARCHIVE_LOCK_TTL):
+                        rows = await asyncio.to_thread(merge_day, self.minio, day, columns)
+                except archive.ArchiveLockError as e:
+                    logger.warning(f"{day.isoformat()} not merged: {e}")
+                    continue
+                await history_cache.invalidate([day])
+                logger.info(f"{day.isoformat()}: {rows} rows")
+            self.done.add(day)
+        # Chunks run concurrently: write one copy at a time, each taken after
+        # the previous write finished, so a slow PUT cannot undo a newer one.
+        async with self._checkpoint:
+            done = set(self.done)
+            await asyncio.to_thread(save_checkpoint, self.minio, self.start, self.end, done)
+
+    async def run(self) -> set[date]:
+        """
+        Backfill every day not yet checkpointed.
+
+        Returns:
+            set: Days completed by this and earlier runs
+        """
+        self.done = await asyncio.to_thread(load_checkpoint, self.minio, self.start, self.end)
+        chunks = [
+            days
+            for days in day_chunks(self.start, self.end, self.chunk_days)
+            if not set(days) <= self.done
+        ]
+        logger.info(f"Backfilling {len(chunks)} chunks for {len(self.box_ids)} boxes")
+
+        sensors = {}
+        for box_id in self.box_ids:
+            try:
+                sensor_id = await temperature_sensor_id(box_id)
+            except OpenSenseMapError as e:
+                # Averages without this box would be merged for good.
+                logger.error(f"Backfill stopped, sensor of {box_id} unknown: {e}")
+                return self.done
+            if sensor_id:
+                sensors[box_id] = sensor_id
+        if not sensors:
+            return self.done
+
+        # Requests are bounded by the semaphore; chunks only need enough
+        # overlap to keep it saturated.
+        parallel = max(1, self.concurrency // len(sensors))
+        async with httpx.AsyncClient() as http:
+            for i in range(0, len(chunks), parallel):
+                await asyncio.gather(
+                    *(self._run_chunk(http, sensors, days) for days in chunks[i : i + parallel])
+                )
+        return self.done
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Backfill archived temperature data")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, required=True)
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, required=True)
+    parser.add_argument(
+        "--box", dest="boxes", action="append", help="Box ID (default: SENSEBOX_IDS)"
+    )
+    parser.add_argument("--chunk-days", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+    if args.end < args.start:
+        parser.error("--to must not be before --from")
+    logging.basicConfig(level=logging.INFO)
+
+    # Share the upstream budget, the history query cache and the archive
+    # locks with running replicas.
+    valkey = create_valkey_client()
+    set_rate_limit_client(valkey)
+    history_cache.set_history_cache_client(valkey)
+    archive.set_archive_lock_client(valkey)
+    minio = Minio(
+        settings.MINIO_ENDPOINT,
+        access_key=settings.MINIO_ACCESS_KEY,
+        secret_key=settings.MINIO_SECRET_KEY,
+        secure=settings.MINIO_SECURE,
+    )
+    backfill = Backfill(
+        minio,
+        args.boxes or settings.SENSEBOX_IDS,
+        args.start,
+        args.end,
+        chunk_days=args.chunk_days,
+        concurrency=args.concurrency,
+    )
+    done = asyncio.run(backfill.run())
+    total = (args.end - args.start).days + 1
+    print(f"{len(done)}/{total} days backfilled")
+    return 0 if len(done) == total else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
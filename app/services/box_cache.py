@@ -0,0 +1,262 @@
+import logging
+import struct
+import time
+import zlib
+from typing import AsyncIterator, Iterable
+
+import numpy as np
+import redis.asyncio as redis
+
+from app.config import settings
+from app.services import cache
+from app.services.aggregation import aggregate
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "hivebox:boxes:"
+
+# float32 value, float64 measured_at, float64 fetched_at, uint8 status: 21 bytes
+READING_STRUCT = struct.Struct("<fddB")
+STATUS_CODES = {"ok": 0, "error": 1, "anomaly": 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+_box_cache_client: redis.Redis | None = None
+
+
+def set_box_cache_client(client: redis.Redis) -> None:
+    """Set binary-safe Valkey client from main app"""
+    global _box_cache_client
+    _box_cache_client = client
+
+
+def get_box_cache_client() -> redis.Redis | None:
+    """Get the binary-safe Valkey client"""
+    return _box_cache_client
+
+
+def bucket_key(box_id: str) -> str:
+    """
+    Hash a box into one of BOX_CACHE_BUCKETS small hashes.
+
+    Small hashes stay in Valkey's compact listpack encoding, which costs far
+    less memory per entry than one key per box. Size the bucket count so each
+    bucket holds fewer than `hash-max-listpack-entries` (128 by default) boxes.
+    """
+    bucket = zlib.crc32(box_id.encode("utf-8")) % settings.BOX_CACHE_BUCKETS
+    return f"{KEY_PREFIX}{bucket}"
+
+
+def encode_reading(
+    value: float, measured_at: float, fetched_at: float, status: str = "ok"
+) -> bytes:
+    """Pack a reading into its 21-byte cache representation"""
+    return READING_STRUCT.pack(value, measured_at, fetched_at, STATUS_CODES[status])
+
+
+def decode_reading(raw: bytes) -> dict:
+    """Unpack a cached reading"""
+    value, measured_at, fetched_at, status = READING_STRUCT.unpack(raw)
+    return {
+        "value": value,
+        "measured_at": measured_at,
+        "fetched_at": fetched_at,
+        "status": STATUS_NAMES.get(status, "unknown"),
+    }
+
+
+async def store_readings(readings: Iterable[dict], now: float | None = None) -> bool:
+    """
+    Cache the latest reading of each box in one round trip.
+
+    Fields expire with their measurement: a reading is only returned while
+    it is younger than MAX_DATA_AGE_SECONDS, and each bucket hash expires
+    once its freshest reading does.
+
+    Args:
+        readings: Dicts with box_id, value, measured_at and optional
+            fetched_at/status
+
+    Returns:
+        bool: True if the readings were written
+    """
+    if _box_cache_client is None:
+        return False
+
+    now = time.time() if now is None else now
+    buckets: dict[str, dict[str, bytes]] = {}
+    bucket_ttl: dict[str, int] = {}
+    for reading in readings:
+        remaining = reading["measured_at"] + settings.MAX_DATA_AGE_SECONDS - now
+        if remaining <= 0:
+            continue
+        key = bucket_key(reading["box_id"])
+        buckets.setdefault(key, {})[reading["box_id"]] = encode_reading(
+            reading["value"],
+            reading["measured_at"],
+            reading.get("fetched_at", now),
+            reading.get("status", "ok"),
+        )
+        bucket_ttl[key] = max(bucket_ttl.get(key, 0), int(remaining) + 1)
+
+    if not buckets:
+        return True
+
+    # EXPIRE NX sets a TTL on new buckets; EXPIRE GT only ever extends it.
+    commands = []
+    for key, mapping in buckets.items():
+        commands.append(("hset", key, cache.Kwargs(mapping=mapping)))
+        commands.append(("expire", key, bucket_ttl[key], cache.Kwargs(nx=True)))
+        commands.append(("expire", key, bucket_ttl[key], cache.Kwargs(gt=True)))
+    try:
+        await cache.pipeline(_box_cache_client, commands)
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"Box cache write error: {e}")
+        return False
+
+
+async def forget_box(box_id: str) -> bool:
+    """
+    Drop a box's cached reading.
+
+    Returns:
+        bool: True if a reading was deleted
+    """
+    if _box_cache_client is None:
+        return False
+    try:
+        return bool(
+            await cache.command(_box_cache_client, "hdel", bucket_key(box_id), box_id)
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Box cache delete error: {e}")
+        return False
+
+
+async def load_readings(
+    box_ids: list[str] | None = None, now: float | None = None
+) -> dict[str, dict]:
+    """
+    Read cached readings for a subset of boxes (or all) in one round trip.
+
+    Expired fields are dropped from the result and deleted lazily.
+
+    Args:
+        box_ids: Boxes to read; None reads every bucket
+
+    Returns:
+        dict: box_id -> reading dict
+    """
+    if _box_cache_client is None:
+        return {}
+
+    now = time.time() if now is None else now
+    if box_ids is None:
+        keys = [f"{KEY_PREFIX}{n}" for n in range(settings.BOX_CACHE_BUCKETS)]
+        commands = [("hgetall", key) for key in keys]
+    else:
+        grouped: dict[str, list[str]] = {}
+        for box_id in box_ids:
+            grouped.setdefault(bucket_key(box_id), []).append(box_id)
+        keys = list(grouped)
+        commands = [("hmget", key, grouped[key]) for key in keys]
+
+    try:
+        replies = await cache.pipeline(_box_cache_client, commands)
+    except redis.RedisError as e:
+        logger.warning(f"Box cache read error: {e}")
+        return {}
+
+    readings: dict[str, dict] = {}
+    expired: dict[str, list[str]] = {}
+    for key, reply in zip(keys, replies):
+        if box_ids is None:
+            items = reply.items()
+        else:
+            items = zip(grouped[key], reply)
+        for box_id, raw in items:
+            if raw is None:
+                continue
+            if isinstance(box_id, bytes):
+                box_id = box_id.decode("utf-8")
+            reading = decode_reading(raw)
+            if now - reading["measured_at"] > settings.MAX_DATA_AGE_SECONDS:
+                expired.setdefault(key, []).append(box_id)
+                continue
+            readings[box_id] = reading
+
+    if expired:
+        try:
+            await cache.pipeline(
+                _box_cache_client,
+                [("hdel", key, *fields) for key, fields in expired.items()],
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Box cache cleanup error: {e}")
+
+    return readings
+
+
+async def cached_average(box_ids: list[str] | None = None) -> tuple[float, int]:
+    """
+    Rebuild the aggregate for any subset of boxes from cache.
+
+    Args:
+        box_ids: Boxes to include; None includes every cached box
+
+    Returns:
+        tuple: (aggregated temperature rounded to 2 decimals, sample count)
+    """
+    readings = await load_readings(box_ids)
+    if not readings:
+        return 0.0, 0
+    values = np.fromiter(
+        (reading["value"] for reading in readings.values()),
+        dtype=np.float64,
+        count=len(readings),
+    )
+    return round(aggregate(values), 2), len(readings)
+
+
+async def scan_readings(
+    bucket: int = 0, cursor: int = 0, count: int = 256, now: float | None = None
+) -> AsyncIterator[tuple[tuple[int, int] | None, dict[str, dict]]]:
+    """
+    Walk every cached reading in bounded batches with HSCAN.
+
+    Only one batch is held in memory at a time, and the walk can resume
+    from any position it yielded. Expired fields are skipped.
+
+    Args:
+        bucket: Bucket index to start from
+        cursor: HSCAN cursor within that bucket
+        count: HSCAN COUNT hint per batch
+
+    Yields:
+        tuple: (position to resume after this batch or None when done,
+            box_id -> reading dict)
+
+    Raises:
+        redis.RedisError: If Valkey cannot be read
+    """
+    if _box_cache_client is None:
+        return
+
+    now = time.time() if now is None else now
+    while bucket < settings.BOX_CACHE_BUCKETS:
+        key = f"{KEY_PREFIX}{bucket}"
+        cursor, fields = await cache.command(
+            _box_cache_client, "hscan", key, cursor, None, count
+        )
+        readings = {}
+        for box_id, raw in fields.items():
+            reading = decode_reading(raw)
+            if now - reading["measured_at"] > settings.MAX_DATA_AGE_SECONDS:
+                continue
+            if isinstance(box_id, bytes):
+                box_id = box_id.decode("utf-8")
+            readings[box_id] = reading
+        if cursor == 0:
+            bucket += 1
+        position = (bucket, cursor) if bucket < settings.BOX_CACHE_BUCKETS else None
+        yield position, readings
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator
+
+from app.config import settings
+from app.routers.metrics import stream_broadcasts, stream_subscribers
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriberLimitError(Exception):
+    """Raised when the hub already serves the maximum number of subscribers."""
+
+    pass
+
+
+class BroadcastHub:
+    """
+    Fan-out hub for temperature updates.
+
+    Each update is encoded once and shared by every subscriber. Subscribers
+    only hold a wake-up event, so a slow consumer skips intermediate updates
+    and always resumes at the latest one instead of buffering a backlog.
+    """
+
+    def __init__(self, max_subscribers: int = 1000):
+        self.max_subscribers = max_subscribers
+        self._subscribers: set[asyncio.Event] = set()
+        self._latest: bytes | None = None
+        self._version = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def is_full(self) -> bool:
+        return len(self._subscribers) >= self.max_subscribers
+
+    @property
+    def latest(self) -> bytes | None:
+        return self._latest
+
+    def reserve(self) -> asyncio.Event:
+        """
+        Take a subscriber slot for a stream that starts later.
+
+        Returns:
+            asyncio.Event: Subscription to pass to subscribe()
+
+        Raises:
+            SubscriberLimitError: If the subscriber limit is reached
+        """
+        if self.is_full():
+            raise SubscriberLimitError("Too many stream subscribers")
+        event = asyncio.Event()
+        self._subscribers.add(event)
+        stream_subscribers.set(len(self._subscribers))
+        return event
+
+    def release(self, subscription: asyncio.Event) -> None:
+        """Give back a subscriber slot; releasing twice is harmless"""
+        self._subscribers.discard(subscription)
+        stream_subscribers.set(len(self._subscribers))
+
+    def publish(self, data: dict) -> bool:
+        """
+        Broadcast an update to all subscribers.
+
+        Args:
+            data: JSON-serializable payload
+
+        Returns:
+            bool: False if the payload equals the last one and was skipped
+        """
+        frame = f"data: {json.dumps(data, sort_keys=True)}\n\n".encode("utf-8")
+        if frame == self._latest:
+            return False
+
+        self._latest = frame
+        self._version += 1
+        for event in self._subscribers:
+            event.set()
+        stream_broadcasts.inc()
+        return True
+
+    async def subscribe(
+        self, keepalive: float | None = None, subscription: asyncio.Event | None = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Yield encoded SSE frames, starting with the latest update.
+
+        Args:
+            keepalive: Seconds of silence after which an SSE comment is sent
+            subscription: Slot taken earlier with reserve(); one is taken on
+                first iteration otherwise
+
+        Raises:
+            SubscriberLimitError: If the subscriber limit is reached
+        """
+        event = subscription if subscription is not None else self.reserve()
+        seen = self._version
+        try:
+            if self._latest is not None:
+                yield self._latest
+            while True:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                event.clear()
+                if self._version != seen:
+                    seen = self._version
+                    yield self._latest
+        finally:
+            self.release(event)
+
+
+temperature_hub = BroadcastHub(max_subscribers=settings.STREAM_MAX_SUBSCRIBERS)
@@ -0,0 +1,148 @@
+import functools
+import hashlib
+import logging
+import time
+from typing import Any, Sequence
+
+import redis.asyncio as redis
+from redis.exceptions import NoScriptError
+
+from app.config import settings
+from app.routers.metrics import valkey_command_duration
+from app.services.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+
+def create_valkey_client(decode_responses: bool = True) -> redis.Redis:
+    """
+    Create a Valkey client backed by a bounded, tuned connection pool.
+
+    Args:
+        decode_responses: Decode replies to str; disable for binary values
+
+    Returns:
+        redis.Redis: Client sharing one pool across all routers
+    """
+    pool = redis.BlockingConnectionPool(
+        host=settings.VALKEY_HOST,
+        port=settings.VALKEY_PORT,
+        decode_responses=decode_responses,
+        max_connections=settings.VALKEY_MAX_CONNECTIONS,
+        timeout=settings.VALKEY_POOL_TIMEOUT,
+        socket_timeout=settings.VALKEY_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.VALKEY_SOCKET_TIMEOUT,
+        socket_keepalive=True,
+        health_check_interval=30,
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+class _Timer:
+    """Observe command latency into the per-command histogram and a span"""
+
+    def __init__(self, command: str):
+        self.command = command
+
+    def __enter__(self):
+        self.span = start_span(f"valkey {self.command}", **{"db.system": "valkey"})
+        self.span.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        valkey_command_duration.labels(command=self.command).observe(
+            time.perf_counter() - self.started
+        )
+        self.span.__exit__(*exc)
+        return False
+
+
+class Kwargs(dict):
+    """Keyword arguments for a pipeline command, passed as its last element"""
+
+
+async def get(client: redis.Redis, key: str) -> Any:
+    """GET a key"""
+    with _Timer("get"):
+        return await client.get(key)
+
+
+async def setex(client: redis.Redis, key: str, ttl: int, value: Any) -> None:
+    """SET a key with an expiry in seconds"""
+    with _Timer("set"):
+        await client.set(key, value, ex=ttl)
+
+
+async def command(client: redis.Redis, name: str, *args: Any, **kwargs: Any) -> Any:
+    """Run a single command by name, e.g. command(client, "set", key, value, nx=True)"""
+    with _Timer(name):
+        return await getattr(client, name)(*args, **kwargs)
+
+
+@functools.cache
+def _script_sha(source: str) -> str:
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+async def script(
+    client: redis.Redis, source: str, keys: Sequence[str], args: Sequence[Any]
+) -> Any:
+    """
+    Run a Lua script by its SHA1 with EVALSHA.
+
+    The script body is only sent (SCRIPT LOAD) when Valkey does not know
+    the script yet: on first use, or after a restart or SCRIPT FLUSH.
+    """
+    sha = _script_sha(source)
+    with _Timer("evalsha"):
+        try:
+            return await client.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            await client.script_load(source)
+            return await client.evalsha(sha, len(keys), *keys, *args)
+
+
+async def get_with_ttl(client: redis.Redis, key: str) -> tuple[Any, int]:
+    """
+    Fetch a value and its remaining TTL in one round trip.
+
+    Returns:
+        tuple: (value or None, ttl in seconds; negative if missing/no expiry)
+    """
+    with _Timer("pipeline"):
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.ttl(key)
+            value, ttl = await pipe.execute()
+    return value, ttl
+
+
+async def mget(client: redis.Redis, keys: Sequence[str]) -> list[Any]:
+    """GET many keys in one round trip"""
+    if not keys:
+        return []
+    with _Timer("mget"):
+        return await client.mget(keys)
+
+
+async def pipeline(client: redis.Redis, commands: Sequence[tuple]) -> list[Any]:
+    """
+    Run a batch of commands in one round trip.
+
+    Args:
+        client: Valkey client
+        commands: Tuples of (method name, *args), e.g. ("hget", key, field),
+            optionally ending with Kwargs, e.g. ("expire", key, ttl, Kwargs(nx=True))
+
+    Returns:
+        list: One result per command
+    """
+    if not commands:
+        return []
+    with _Timer("pipeline"):
+        async with client.pipeline(transaction=False) as pipe:
+            for name, *args in commands:
+                kwargs = args.pop() if args and isinstance(args[-1], Kwargs) else {}
+                getattr(pipe, name)(*args, **kwargs)
+            return await pipe.execute()
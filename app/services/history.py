@@ -0,0 +1,152 @@
+import logging
+import time
+from typing import Iterable
+
+import redis.asyncio as redis
+
+from app.config import settings
+from app.services import cache
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE_KEY = "hivebox:history:temperature"
+BOX_KEY_PREFIX = "hivebox:history:box:"
+
+# Append an aggregate point unless the stream already has one from the last
+# ARGV[1] milliseconds (server clock), so every replica together writes at
+# most one point per HISTORY_AGGREGATE_INTERVAL.
+# KEYS: stream; ARGV: interval ms, max points, min ID, TTL, field/value pairs
+SAMPLE_AGGREGATE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local last = redis.call('XREVRANGE', KEYS[1], '+', '-', 'COUNT', 1)[1]
+if last and now - tonumber(string.match(last[1], '^%d+')) < tonumber(ARGV[1]) then
+  return 0
+end
+redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[2], '*', unpack(ARGV, 5))
+redis.call('XTRIM', KEYS[1], 'MINID', '~', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+_history_client: redis.Redis | None = None
+_last_aggregate_at = float("-inf")
+
+
+def set_history_client(client: redis.Redis) -> None:
+    """Set Valkey client from main app"""
+    global _history_client
+    _history_client = client
+
+
+def _min_id(now: float) -> str:
+    return str(int((now - settings.HISTORY_RETENTION_SECONDS) * 1000))
+
+
+def _trim_commands(key: str, now: float) -> list[tuple]:
+    """Cap a stream by length and age, and expire it if it stops growing"""
+    return [
+        ("xtrim", key, cache.Kwargs(minid=_min_id(now), approximate=True)),
+        ("expire", key, settings.HISTORY_RETENTION_SECONDS),
+    ]
+
+
+async def _sample_aggregate(aggregate: dict, now: float) -> None:
+    """Append an aggregate point at most once per HISTORY_AGGREGATE_INTERVAL"""
+    global _last_aggregate_at
+    # Skip the round trip while this process's own last point is recent.
+    if now - _last_aggregate_at < settings.HISTORY_AGGREGATE_INTERVAL:
+        return
+    args = [
+        settings.HISTORY_AGGREGATE_INTERVAL * 1000,
+        settings.HISTORY_MAX_POINTS,
+        _min_id(now),
+        settings.HISTORY_RETENTION_SECONDS,
+        "average_temperature",
+        aggregate["average_temperature"],
+        "samples",
+        aggregate["samples"],
+    ]
+    await cache.script(_history_client, SAMPLE_AGGREGATE_SCRIPT, [AGGREGATE_KEY], args)
+    _last_aggregate_at = now
+
+
+async def record(
+    aggregate: dict | None = None,
+    readings: Iterable[dict] = (),
+    now: float | None = None,
+) -> bool:
+    """
+    Append an aggregate and/or new box readings to capped streams.
+
+    Box readings are appended as they arrive. Aggregates are published far
+    more often (every cache miss and ingest batch), so the aggregate stream
+    is sampled: at most one point per HISTORY_AGGREGATE_INTERVAL across all
+    replicas, and the rest are dropped. Each stream is capped at
+    HISTORY_MAX_POINTS entries and trimmed to HISTORY_RETENTION_SECONDS, so
+    memory stays bounded by configuration; keep HISTORY_MAX_POINTS times
+    the interval at least the retention.
+
+    Args:
+        aggregate: Temperature result with average_temperature and samples
+        readings: Dicts with box_id, value and measured_at
+
+    Returns:
+        bool: True if the entries were written or skipped by sampling
+    """
+    if _history_client is None:
+        return False
+
+    now = time.time() if now is None else now
+    commands: list[tuple] = []
+    for reading in readings:
+        key = f"{BOX_KEY_PREFIX}{reading['box_id']}"
+        fields = {"value": reading["value"], "measured_at": reading["measured_at"]}
+        commands.append(
+            ("xadd", key, fields, cache.Kwargs(maxlen=settings.HISTORY_MAX_POINTS))
+        )
+        commands.extend(_trim_commands(key, now))
+
+    try:
+        if aggregate is not None:
+            await _sample_aggregate(aggregate, now)
+        if commands:
+            await cache.pipeline(_history_client, commands)
+        return True
+    except redis.RedisError as e:
+        logger.warning(f"History write error: {e}")
+        return False
+
+
+async def recent(
+    window: int, box_id: str | None = None, now: float | None = None
+) -> list[dict]:
+    """
+    Read the last `window` seconds of history in one round trip.
+
+    Args:
+        window: Seconds to look back
+        box_id: Read a single box's readings instead of the aggregate
+
+    Returns:
+        list: Points ordered oldest first
+    """
+    if _history_client is None:
+        return []
+
+    now = time.time() if now is None else now
+    key = AGGREGATE_KEY if box_id is None else f"{BOX_KEY_PREFIX}{box_id}"
+    min_id = str(int((now - window) * 1000))
+    entries = await cache.command(_history_client, "xrange", key, min_id, "+")
+
+    points = []
+    for entry_id, fields in entries:
+        point = {"timestamp": int(entry_id.split("-")[0]) / 1000}
+        if box_id is None:
+            point["average_temperature"] = float(fields["average_temperature"])
+            point["samples"] = int(fields["samples"])
+        else:
+            point["value"] = float(fields["value"])
+            point["measured_at"] = float(fields["measured_at"])
+        points.append(point)
+    return points
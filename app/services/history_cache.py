@@ -0,0 +1,211 @@
+"""Cache archive history query results in Valkey.
+
+A result is stored under its range, resolution and the box registry
+version (so a registry change never serves a result for the old box set)
+together with the generation of every archive day it covers. Writing a day's archive
+(compaction, backfill) bumps that day's generation and deletes exactly the
+results overlapping it; a result computed from a read that raced such a
+write is refused at store time, because the generations it was read under
+no longer match.
+
+Ranges ending before today cannot change except through an archive write,
+so they are cached without expiry; ranges reaching today expire after
+HISTORY_QUERY_CACHE_TTL. All results together are held under
+HISTORY_QUERY_CACHE_MAX_BYTES by evicting the least recently used.
+"""
+
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable
+
+import redis.asyncio as redis
+
+from app.config import settings
+from app.routers.metrics import history_query_cache
+from app.services import cache
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "hivebox:history:query:"
+LRU_KEY = f"{PREFIX}lru"
+SIZES_KEY = f"{PREFIX}sizes"
+TOTAL_KEY = f"{PREFIX}bytes"
+GENERATIONS_KEY = f"{PREFIX}generations"
+DAY_PREFIX = f"{PREFIX}day:"
+ENTRY_PREFIX = f"{PREFIX}entry:"
+
+# KEYS: entry, LRU, sizes, total, generations, day sets...
+# ARGV: payload, ttl (0 = none), now, max bytes, then (day, generation)
+# pairs the result was read under. Returns 1 if stored.
+PUT_SCRIPT = """
+local ndays = #KEYS - 5
+for i = 1, ndays do
+  local current = redis.call('HGET', KEYS[5], ARGV[3 + 2 * i]) or '0'
+  if current ~= ARGV[4 + 2 * i] then
+    return 0
+  end
+end
+local size = string.len(ARGV[1])
+local old = tonumber(redis.call('HGET', KEYS[3], KEYS[1]) or '0')
+if tonumber(ARGV[2]) > 0 then
+  redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+else
+  redis.call('SET', KEYS[1], ARGV[1])
+end
+redis.call('HSET', KEYS[3], KEYS[1], size)
+redis.call('ZADD', KEYS[2], ARGV[3], KEYS[1])
+for i = 1, ndays do
+  redis.call('SADD', KEYS[5 + i], KEYS[1])
+end
+local total = redis.call('INCRBY', KEYS[4], size - old)
+local max = tonumber(ARGV[4])
+while total > max do
+  local victim = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+  if not victim then
+    break
+  end
+  redis.call('ZREM', KEYS[2], victim)
+  redis.call('DEL', victim)
+  total = redis.call('INCRBY', KEYS[4], -tonumber(redis.call('HGET', KEYS[3], victim) or '0'))
+  redis.call('HDEL', KEYS[3], victim)
+end
+return 1
+"""
+
+# KEYS: LRU, sizes, total, generations, day sets...; ARGV: days
+INVALIDATE_SCRIPT = """
+for i = 1, #ARGV do
+  redis.call('HINCRBY', KEYS[4], ARGV[i], 1)
+  for _, entry in ipairs(redis.call('SMEMBERS', KEYS[4 + i])) do
+    redis.call('DEL', entry)
+    redis.call('ZREM', KEYS[1], entry)
+    local size = redis.call('HGET', KEYS[2], entry)
+    if size then
+      redis.call('INCRBY', KEYS[3], -tonumber(size))
+      redis.call('HDEL', KEYS[2], entry)
+    end
+  end
+  redis.call('DEL', KEYS[4 + i])
+end
+return #ARGV
+"""
+
+_history_cache_client: redis.Redis | None = None
+
+
+def set_history_cache_client(client: redis.Redis) -> None:
+    """Set Valkey client from main app"""
+    global _history_cache_client
+    _history_cache_client = client
+
+
+def days_between(start: date, end: date) -> list[str]:
+    """ISO dates of an inclusive range"""
+    return [(start + timedelta(days=n)).isoformat() for n in range((end - start).days + 1)]
+
+
+def entry_key(start: date, end: date, resolution: int, registry_version: str) -> str:
+    return f"{ENTRY_PREFIX}{registry_version}:{start.isoformat()}:{end.isoformat()}:{resolution}"
+
+
+def is_immutable(end: date, now: float | None = None) -> bool:
+    """True if the range ends before the current UTC day"""
+    now = time.time() if now is None else now
+    return end < datetime.fromtimestamp(now, tz=timezone.utc).date()
+
+
+async def get(start: date, end: date, resolution: int, registry_version: str) -> dict | None:
+    """A cached result, marking it recently used; None on a miss"""
+    if _history_cache_client is None:
+        return None
+    key = entry_key(start, end, resolution, registry_version)
+    try:
+        payload, _ = await cache.pipeline(
+            _history_cache_client,
+            [("get", key), ("zadd", LRU_KEY, {key: time.time()}, cache.Kwargs(xx=True))],
+        )
+    except redis.RedisError as e:
+        logger.warning(f"History cache read error: {e}")
+        payload = None
+    history_query_cache.labels(result="miss" if payload is None else "hit").inc()
+    return None if payload is None else json.loads(payload)
+
+
+async def generations(start: date, end: date) -> list[str] | None:
+    """
+    Current generation of every day in a range, read before the archive.
+
+    Returns:
+        list: Generations to pass to put(), or None if nothing can be cached
+    """
+    if _history_cache_client is None:
+        return None
+    try:
+        current = await cache.command(
+            _history_cache_client, "hmget", GENERATIONS_KEY, days_between(start, end)
+        )
+    except redis.RedisError as e:
+        logger.warning(f"History cache read error: {e}")
+        return None
+    return [generation or "0" for generation in current]
+
+
+async def put(
+    start: date,
+    end: date,
+    resolution: int,
+    registry_version: str,
+    result: dict,
+    read_generations: list[str] | None,
+    now: float | None = None,
+) -> bool:
+    """
+    Cache a result unless a day it covers was rewritten since it was read.
+
+    Returns:
+        bool: True if stored
+    """
+    if _history_cache_client is None or read_generations is None:
+        return False
+    payload = json.dumps(result)
+    if len(payload) > settings.HISTORY_QUERY_CACHE_MAX_BYTES:
+        return False
+    now = time.time() if now is None else now
+    days = days_between(start, end)
+    ttl = 0 if is_immutable(end, now) else settings.HISTORY_QUERY_CACHE_TTL
+    keys = [entry_key(start, end, resolution, registry_version)]
+    keys += [LRU_KEY, SIZES_KEY, TOTAL_KEY, GENERATIONS_KEY]
+    keys += [f"{DAY_PREFIX}{day}" for day in days]
+    args = [payload, ttl, now, settings.HISTORY_QUERY_CACHE_MAX_BYTES]
+    for day, generation in zip(days, read_generations):
+        args += [day, generation]
+    try:
+        stored = await cache.script(_history_cache_client, PUT_SCRIPT, keys, args)
+    except redis.RedisError as e:
+        logger.warning(f"History cache write error: {e}")
+        return False
+    return bool(int(stored))
+
+
+async def invalidate(days: Iterable[date]) -> bool:
+    """
+    Drop every cached result overlapping the given archive days.
+
+    Call after a day's archive object has been written.
+
+    Returns:
+        bool: True if the invalidation reached Valkey
+    """
+    days = sorted({day.isoformat() for day in days})
+    if _history_cache_client is None or not days:
+        return False
+    keys = [LRU_KEY, SIZES_KEY, TOTAL_KEY, GENERATIONS_KEY]
+    keys += [f"{DAY_PREFIX}{day}" for day in days]
+    try:
+        await cache.script(_history_cache_client, INVALIDATE_SCRIPT, keys, days)
+    except redis.RedisError as e:
+        logger.warning(f"History cache invalidation error: {e}")
+        return False
+    return True
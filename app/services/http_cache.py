@@ -0,0 +1,79 @@
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping
+
+
+def make_etag(payload: str | bytes) -> str:
+    """
+    Weak ETag derived from the serialized result.
+
+    Weak, because the hashed payload is the cached JSON while the response
+    body is serialized again by the framework: the two are equivalent but
+    not guaranteed to be byte-identical.
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    return f'W/"{hashlib.blake2b(payload, digest_size=16).hexdigest()}"'
+
+
+def cache_headers(
+    etag: str, last_modified: float, max_age: int, stale_while_revalidate: int
+) -> dict[str, str]:
+    """
+    Build validator and freshness headers for a cached response.
+
+    Args:
+        etag: Entity tag of the body
+        last_modified: Epoch seconds the body was computed
+        max_age: Seconds the response stays fresh for shared caches
+        stale_while_revalidate: Seconds a stale copy may be served while
+            the cache revalidates in the background
+
+    Returns:
+        dict: ETag, Last-Modified and Cache-Control headers
+    """
+    return {
+        "ETag": etag,
+        "Last-Modified": formatdate(int(last_modified), usegmt=True),
+        "Cache-Control": (
+            f"public, max-age={max(int(max_age), 0)}, "
+            f"stale-while-revalidate={int(stale_while_revalidate)}"
+        ),
+    }
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison against an If-None-Match header (RFC 9110 13.1.2)"""
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque for candidate in header.split(",")
+    )
+
+
+def is_not_modified(
+    request_headers: Mapping[str, str], etag: str, last_modified: float
+) -> bool:
+    """
+    Evaluate conditional request headers.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted
+    when it is absent, as RFC 9110 requires.
+
+    Returns:
+        bool: True if a 304 Not Modified response should be sent
+    """
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+
+    return False
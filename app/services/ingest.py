@@ -0,0 +1,203 @@
+import json
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.services.aggregate_state import aggregate_state
+from app.services.anomaly import screen
+from app.services.opensensemap import parse_timestamp
+from app.services.registry import box_registry
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson")
+BINARY_CONTENT_TYPE = "application/x-hivebox-readings"
+
+# Fixed-size little-endian record: 24-byte ASCII box ID (senseBox IDs are
+# 24 hex characters), float64 epoch seconds, float32 value. 36 bytes total.
+RECORD_DTYPE = np.dtype([("box_id", "S24"), ("timestamp", "<f8"), ("value", "<f4")])
+
+MAX_BOX_ID_LENGTH = 64
+MIN_VALUE = -60.0
+MAX_VALUE = 85.0
+MAX_CLOCK_SKEW_SECONDS = 300
+
+
+class IngestError(Exception):
+    """Raised when an ingest payload cannot be decoded at all."""
+
+    pass
+
+
+class UnsupportedContentType(IngestError):
+    """Raised when the payload's content type is not an ingest format."""
+
+    pass
+
+
+def parse_ndjson(body: bytes) -> tuple[list[str], np.ndarray, np.ndarray, int]:
+    """
+    Decode newline-delimited JSON readings.
+
+    Each line is an object with 'box_id', 'value' and 'timestamp' (ISO
+    string or epoch seconds). Malformed lines are counted, not raised.
+
+    Args:
+        body: Request body
+
+    Returns:
+        tuple: box IDs, values, timestamps and number of malformed lines
+    """
+    box_ids: list[str] = []
+    values: list[float] = []
+    timestamps: list[float] = []
+    malformed = 0
+
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            box_id = item["box_id"]
+            value = float(item["value"])
+            timestamp = item["timestamp"]
+            if isinstance(timestamp, str):
+                timestamp = parse_timestamp(timestamp)
+            else:
+                timestamp = float(timestamp)
+            if not isinstance(box_id, str) or not 0 < len(box_id) <= MAX_BOX_ID_LENGTH:
+                raise ValueError("invalid box_id")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            malformed += 1
+            continue
+        box_ids.append(box_id)
+        values.append(value)
+        timestamps.append(timestamp)
+
+    return (
+        box_ids,
+        np.array(values, dtype=np.float64),
+        np.array(timestamps, dtype=np.float64),
+        malformed,
+    )
+
+
+def parse_binary(body: bytes) -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Decode packed RECORD_DTYPE readings without copying.
+
+    Args:
+        body: Request body
+
+    Returns:
+        tuple: raw box IDs, values, timestamps and number of malformed records
+
+    Raises:
+        IngestError: If the body is not a whole number of records
+    """
+    if len(body) % RECORD_DTYPE.itemsize:
+        raise IngestError(
+            f"Binary payload length must be a multiple of {RECORD_DTYPE.itemsize} bytes"
+        )
+    records = np.frombuffer(body, dtype=RECORD_DTYPE)
+    return (
+        records["box_id"],
+        records["value"].astype(np.float64),
+        records["timestamp"],
+        0,
+    )
+
+
+def valid_mask(values: np.ndarray, timestamps: np.ndarray, now: float) -> np.ndarray:
+    """
+    Vectorized range and freshness validation.
+
+    Returns:
+        np.ndarray: Boolean mask, True for acceptable readings
+    """
+    return (
+        np.isfinite(values)
+        & (values >= MIN_VALUE)
+        & (values <= MAX_VALUE)
+        & np.isfinite(timestamps)
+        & (timestamps <= now + MAX_CLOCK_SKEW_SECONDS)
+        & (now - timestamps <= settings.MAX_DATA_AGE_SECONDS)
+    )
+
+
+def ingest_payload(
+    body: bytes, content_type: str, sink: list | None = None
+) -> tuple[int, int]:
+    """
+    Validate a batch of readings and record them in the aggregate state.
+
+    Readings for boxes not in the box registry are rejected, so pushes
+    cannot add boxes nobody tracks.
+
+    Args:
+        body: Request body
+        content_type: NDJSON or binary content type
+        sink: Optional list that receives accepted readings as dicts
+
+    Returns:
+        tuple: (accepted, rejected) reading counts
+
+    Raises:
+        UnsupportedContentType: If the content type is not an ingest format
+        IngestError: If the payload cannot be decoded
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in NDJSON_CONTENT_TYPES:
+        box_ids, values, timestamps, malformed = parse_ndjson(body)
+    elif media_type == BINARY_CONTENT_TYPE:
+        box_ids, values, timestamps, malformed = parse_binary(body)
+    else:
+        raise UnsupportedContentType(f"Unsupported content type: {content_type}")
+
+    now = time.time()
+    mask = valid_mask(values, timestamps, now)
+    if media_type == BINARY_CONTENT_TYPE:
+        mask &= box_ids != b""
+
+    accepted = 0
+    for index in np.flatnonzero(mask):
+        box_id = box_ids[index]
+        if isinstance(box_id, bytes):
+            try:
+                box_id = box_id.decode("ascii")
+            except UnicodeDecodeError:
+                continue
+        if box_id not in box_registry:
+            continue
+        value = float(values[index])
+        measured_at = float(timestamps[index])
+        anomalous = screen(box_id, value, measured_at)
+        if anomalous and settings.ANOMALY_EXCLUDE:
+            aggregate_state.remove(box_id)
+            continue
+        if aggregate_state.update(box_id, value, measured_at, now=now):
+            accepted += 1
+            if sink is not None:
+                reading = {"box_id": box_id, "value": value, "measured_at": measured_at}
+                if anomalous:
+                    reading["status"] = "anomaly"
+                sink.append(reading)
+
+    rejected = malformed + len(values) - accepted
+    return accepted, rejected
+
+
+def encode_binary(readings: list[tuple[str, float, float]]) -> bytes:
+    """
+    Pack (box_id, timestamp, value) tuples into the binary ingest format.
+
+    Args:
+        readings: Tuples of box ID, epoch seconds and value
+
+    Returns:
+        bytes: Payload for BINARY_CONTENT_TYPE
+    """
+    records = np.array(
+        [(box_id.encode("ascii"), ts, value) for box_id, ts, value in readings],
+        dtype=RECORD_DTYPE,
+    )
+    return records.tobytes()
@@ -1,14 +1,19 @@
+import asyncio
 import io
 import json
 import logging
+import time
 from datetime import datetime
 from minio import Minio
 from app.config import settings
 from app.routers.metrics import minio_connection_status, storage_operations
+from app.services.spool import archive_spool
+from app.services.tracing import start_span
 
 logger = logging.getLogger(__name__)
 
 _minio_client: Minio | None = None
+_last_stored: dict | None = None
 
 
 def set_minio_client(client: Minio) -> None:
@@ -18,29 +23,98 @@ def set_minio_client(client: Minio) -> None:
     minio_connection_status.set(1)
 
 
-async def store_temperature_data(data: dict) -> bool:
-    """Store temperature data to MinIO bucket every 5min or by /store"""
-    try:
-        if not _minio_client:
-            logger.error("MinIO client not initialized")
-            minio_connection_status.set(0)
-            return False
-        bucket = settings.MINIO_BUCKET
-        timestamp = datetime.utcnow().isoformat()
-        object_name = f"temperature/{timestamp}.json"
-        json_data = json.dumps(data).encode("utf-8")
-        json_stream = io.BytesIO(json_data)
-        _minio_client.put_object(
-            bucket,
+def get_minio_client() -> Minio | None:
+    """Get the MinIO client set by the main app"""
+    return _minio_client
+
+
+def get_last_stored() -> dict | None:
+    """
+    The most recent archive write from this process.
+
+    Returns:
+        dict | None: object_name, data and stored_at (epoch seconds)
+    """
+    return _last_stored
+
+
+def _remember(object_name: str, data: dict) -> None:
+    global _last_stored
+    _last_stored = {"object_name": object_name, "data": data, "stored_at": time.time()}
+
+
+def put_json(client: Minio, object_name: str, data: dict) -> None:
+    """Write one JSON object to the bucket (blocking)"""
+    json_data = json.dumps(data).encode("utf-8")
+    with start_span("minio put_object", object_name=object_name):
+        client.put_object(
+            settings.MINIO_BUCKET,
             object_name,
-            data=json_stream,
+            data=io.BytesIO(json_data),
             length=len(json_data),
             content_type="application/json",
         )
+
+
+async def store_temperature_data(data: dict) -> bool:
+    """
+    Store temperature data to MinIO bucket every 5min or by /store
+
+    The upload runs off the event loop and is bounded by
+    STORAGE_WRITE_TIMEOUT. If MinIO fails or is slow, or earlier writes are
+    still waiting to be replayed, the data goes to the local spool instead
+    and is uploaded later by replay_spool(). Spool appends run off the
+    event loop too, since they may fsync.
+    """
+    if not _minio_client:
+        logger.error("MinIO client not initialized")
+        minio_connection_status.set(0)
+        return False
+
+    object_name = f"temperature/{datetime.utcnow().isoformat()}.json"
+    if archive_spool.pending_bytes():
+        spooled = await asyncio.to_thread(archive_spool.append, object_name, data)
+        if spooled:
+            _remember(object_name, data)
+        return spooled
+
+    try:
+        await asyncio.wait_for(
+            asyncio.to_thread(put_json, _minio_client, object_name, data),
+            timeout=settings.STORAGE_WRITE_TIMEOUT,
+        )
         storage_operations.inc()
-        logger.info(f"Stored temperature data to {object_name} in bucket {bucket}")
+        logger.info(
+            f"Stored temperature data to {object_name} in bucket {settings.MINIO_BUCKET}"
+        )
+        _remember(object_name, data)
         return True
     except Exception as e:
-        logger.error(f"MinIO S3Error: {e}")
+        logger.error(f"MinIO write failed, spooling {object_name}: {e!r}")
         minio_connection_status.set(0)
-        return False
+        spooled = await asyncio.to_thread(archive_spool.append, object_name, data)
+        if spooled:
+            _remember(object_name, data)
+        return spooled
+
+
+def _replay(object_name: str, data: dict) -> None:
+    put_json(_minio_client, object_name, data)
+    storage_operations.inc()
+
+
+async def replay_spool() -> int:
+    """
+    Drain spooled writes to MinIO in one pass.
+
+    Returns:
+        int: Objects uploaded
+    """
+    await asyncio.to_thread(archive_spool.flush)
+    if _minio_client is None or not archive_spool.pending_bytes():
+        return 0
+    replayed = await asyncio.to_thread(archive_spool.drain, _replay)
+    if replayed:
+        minio_connection_status.set(1)
+        logger.info(f"Replayed {replayed} spooled objects to MinIO")
+    return replayed
@@ -1,8 +1,19 @@
-from datetime import datetime, timezone
+from datetime import datetime
 import logging
-from typing import List, Optional
+import time
+from typing import Iterable, List, Optional
 import httpx
 from app.config import settings
+from app.services.aggregation import aggregate, to_array
+from app.services.aggregate_state import aggregate_state
+from app.services.anomaly import screen
+from app.services import history
+from app.services.box_cache import store_readings
+from app.services.rate_limit import RateLimitExceeded, upstream_limiter
+from app.services.registry import box_registry
+from app.services.scheduler import box_scheduler
+from app.routers.metrics import upstream_requests
+from app.services.tracing import start_span
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +25,24 @@ class OpenSenseMapError(Exception):
 
 
 async def check_senseboxes_availability() -> tuple[int, int]:
-    """Check how many senseBoxes are available"""
+    """
+    Check how many senseBoxes are available
+
+    Probes have the lowest upstream priority; a box whose probe is rate
+    limited counts as available if it has a fresh reading in the state.
+    """
     available = 0
-    total = len(settings.SENSEBOX_IDS)
+    box_ids = box_registry.ids()
+    total = len(box_ids)
 
     async with httpx.AsyncClient(timeout=10.0) as client:
-        for sensebox_id in settings.SENSEBOX_IDS:
+        for sensebox_id in box_ids:
+            try:
+                await upstream_limiter.acquire("probe")
+            except RateLimitExceeded:
+                if aggregate_state.get(sensebox_id) is not None:
+                    available += 1
+                continue
             try:
                 url = f"{settings.OPENSENSEMAP_API_URL}/boxes/{sensebox_id}"
                 response = await client.get(url, timeout=5.0)
@@ -37,28 +60,39 @@ async def check_senseboxes_availability() -> tuple[int, int]:
     return available, total
 
 
-async def fetch_box_data(box_id: str) -> dict:
+async def fetch_box_data(box_id: str, priority: str = "background") -> dict:
     """
     Fetch data for a single senseBox.
 
     Args:
         box_id: The senseBox ID
+        priority: Rate limiter class ("user", "background" or "probe")
 
     Returns:
         dict: Box data from API
 
     Raises:
-        OpenSenseMapError: If API request fails
+        OpenSenseMapError: If API request fails or is rate limited
     """
     url = f"{settings.OPENSENSEMAP_API_URL}/boxes/{box_id}"
-
-    async with httpx.AsyncClient() as client:
+    with start_span("fetch_box_data", box_id=box_id, priority=priority) as span:
         try:
-            response = await client.get(url, timeout=15.0)
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPError as e:
-            raise OpenSenseMapError(f"Failed to fetch box {box_id}: {str(e)}") from e
+            await upstream_limiter.acquire(priority)
+        except RateLimitExceeded as e:
+            raise OpenSenseMapError(f"Failed to fetch box {box_id}: {e}") from e
+
+        async with httpx.AsyncClient() as client:
+            try:
+                response = await client.get(url, timeout=15.0)
+                response.raise_for_status()
+                upstream_requests.labels(outcome="ok").inc()
+                span.set_attribute("http.status_code", response.status_code)
+                return response.json()
+            except httpx.HTTPError as e:
+                upstream_requests.labels(outcome="error").inc()
+                raise OpenSenseMapError(
+                    f"Failed to fetch box {box_id}: {str(e)}"
+                ) from e
 
 
 def extract_temperature_value(box_data: dict) -> Optional[dict]:
@@ -85,46 +119,133 @@ def extract_temperature_value(box_data: dict) -> Optional[dict]:
     return None
 
 
-def is_data_fresh(timestamp_str: str) -> bool:
+def parse_timestamp(timestamp_str: str) -> float:
     """
-    Check if data is fresher than MAX_DATA_AGE_SECONDS.
+    Convert an ISO timestamp (optionally with Z suffix) to epoch seconds.
 
     Args:
         timestamp_str: ISO format timestamp string
 
     Returns:
-        bool: True if data is fresh
+        float: Seconds since the epoch
     """
-    timestamp = datetime.fromisoformat(timestamp_str.replace("Z", "+00:00"))
-    now = datetime.now(timezone.utc)
-    age_seconds = (now - timestamp).total_seconds()
-
-    return age_seconds <= settings.MAX_DATA_AGE_SECONDS
+    return datetime.fromisoformat(timestamp_str.replace("Z", "+00:00")).timestamp()
 
 
-async def fetch_temperature_data() -> List[dict]:
+def is_data_fresh(measured_at: float, now: float | None = None) -> bool:
     """
-    Fetch temperature data from all configured senseBoxes.
+    Check if data is fresher than MAX_DATA_AGE_SECONDS.
+
+    Args:
+        measured_at: Measurement time as epoch seconds
+        now: Current epoch seconds (defaults to time.time())
 
     Returns:
-        list: List of dicts with temperature values and timestamps
+        bool: True if data is fresh
+    """
+    now = time.time() if now is None else now
+    return now - measured_at <= settings.MAX_DATA_AGE_SECONDS
 
-    Raises:
-        OpenSenseMapError: If no valid data could be retrieved
+
+async def fetch_boxes(
+    box_ids: Iterable[str], priority: str = "background"
+) -> List[dict]:
+    """
+    Fetch the latest temperature of the given senseBoxes.
+
+    Each reading is screened by the per-box anomaly detector and recorded
+    in the shared aggregate state as it arrives; boxes whose latest reading
+    is stale, or anomalous with ANOMALY_EXCLUDE set, are dropped from it.
+    Every outcome, including unreadable box data, is reported to the poll
+    scheduler. The latest reading of every box is then written to the
+    per-box cache in one batch, and new measurements are appended to the
+    recent-history streams.
+
+    Args:
+        box_ids: The senseBox IDs to fetch
+        priority: Rate limiter class for the upstream requests
+
+    Returns:
+        list: Fresh readings as dicts with box_id, value and timestamp
     """
     temperature_data = []
+    box_readings = []
+    new_readings = []
 
-    for box_id in settings.SENSEBOX_IDS:
+    for box_id in box_ids:
         try:
-            box_data = await fetch_box_data(box_id)
+            box_data = await fetch_box_data(box_id, priority)
             temp_info = extract_temperature_value(box_data)
-
-            if temp_info and is_data_fresh(temp_info["timestamp"]):
+            measured_at = None
+            if temp_info and temp_info["timestamp"]:
+                measured_at = parse_timestamp(temp_info["timestamp"])
+            box_scheduler.observe(box_id, measured_at)
+
+            if measured_at is not None and is_data_fresh(measured_at):
+                temp_info["box_id"] = box_id
+                anomalous = screen(box_id, temp_info["value"], measured_at)
+                reading = {
+                    "box_id": box_id,
+                    "value": temp_info["value"],
+                    "measured_at": measured_at,
+                }
+                box_readings.append(
+                    {**reading, "status": "anomaly"} if anomalous else reading
+                )
+                if anomalous and settings.ANOMALY_EXCLUDE:
+                    aggregate_state.remove(box_id)
+                    continue
                 temperature_data.append(temp_info)
-
-        except OpenSenseMapError:
+                previous = aggregate_state.get(box_id)
+                aggregate_state.update(box_id, temp_info["value"], measured_at)
+                if previous is None or previous[1] < measured_at:
+                    new_readings.append(reading)
+            else:
+                aggregate_state.remove(box_id)
+
+        except Exception as e:
+            # One box's unexpected payload must not stop polling the others.
+            if not isinstance(e, OpenSenseMapError):
+                logger.warning(f"Unreadable data from box {box_id}: {e!r}")
+            box_scheduler.observe(box_id, None)
+            last = aggregate_state.get(box_id)
+            if last is not None:
+                # Keep the time of the last successful fetch, not of this failure.
+                schedule = box_scheduler.get(box_id)
+                fetched_at = schedule.last_fetched_at if schedule else None
+                box_readings.append(
+                    {
+                        "box_id": box_id,
+                        "value": last[0],
+                        "measured_at": last[1],
+                        "fetched_at": fetched_at or last[1],
+                        "status": "error",
+                    }
+                )
             continue
 
+    await store_readings(box_readings)
+    await history.record(readings=new_readings)
+
+    return temperature_data
+
+
+async def fetch_temperature_data(priority: str = "background") -> List[dict]:
+    """
+    Fetch temperature data from all registered senseBoxes.
+
+    Args:
+        priority: Rate limiter class for the upstream requests
+
+    Returns:
+        list: List of dicts with temperature values and timestamps
+
+    Raises:
+        OpenSenseMapError: If no valid data could be retrieved
+    """
+    temperature_data = await fetch_boxes(box_registry.ids(), priority)
+    aggregate_state.mark_refreshed()
+
     if not temperature_data:
         raise OpenSenseMapError("No fresh temperature data available")
 
@@ -135,6 +256,9 @@ def calculate_average_temperature(temperature_data: List[dict]) -> float:
     """
     Calculate average temperature from temperature data list.
 
+    Uses the method selected by AGGREGATION_METHOD, with optional
+    MAD-based outlier rejection (see app.services.aggregation).
+
     Args:
         temperature_data: List of temperature measurements
 
@@ -144,12 +268,27 @@ def calculate_average_temperature(temperature_data: List[dict]) -> float:
     if not temperature_data:
         return 0.0
 
-    total = sum(item["value"] for item in temperature_data)
-    average = total / len(temperature_data)
+    average = aggregate(to_array(temperature_data))
 
     return round(average, 2)
 
 
+def calculate_state_average() -> float:
+    """
+    Calculate average temperature from the running aggregate state.
+
+    The plain mean is read from the running sum in constant time; robust
+    methods fall back to aggregating the latest value of each box.
+
+    Returns:
+        float: Average temperature rounded to 2 decimal places
+    """
+    if settings.AGGREGATION_METHOD == "mean" and not settings.OUTLIER_REJECTION:
+        return round(aggregate_state.snapshot()["mean"], 2)
+
+    return round(aggregate(aggregate_state.values()), 2)
+
+
 def get_temperature_status(average_temp: float) -> str:
     """
     Determine temperature status based on average temperature.
@@ -0,0 +1,179 @@
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from app.config import settings
+from app.services.auth import check_token
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+def check_debug_token(token: str | None) -> bool:
+    """True if debugging is enabled and `token` matches DEBUG_TOKEN"""
+    return check_token(token, settings.DEBUG_TOKEN)
+
+
+def _frame_name(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """
+    Statistical profiler for one thread.
+
+    A daemon thread snapshots the target thread's stack every `interval`
+    seconds via sys._current_frames(); the target pays no tracing cost.
+    Stacks are aggregated by identical call path.
+    """
+
+    def __init__(self, thread_id: int | None = None, interval: float = 0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame.f_code))
+            frame = frame.f_back
+        self.stacks[tuple(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "Sampler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        if self._stop.is_set():
+            return self
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format, for flamegraph.pl/speedscope"""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def speedscope(self, name: str = "hivebox") -> dict:
+        """speedscope "sampled" profile, weighted in seconds"""
+        frames: dict[str, int] = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(count * self.interval)
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "exporter": "hivebox",
+            "name": name,
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": frame} for frame in frames]},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+
+class ProfileStore:
+    """Bounded store of recent per-request profiles"""
+
+    def __init__(self, max_profiles: int = 20):
+        self.max_profiles = max_profiles
+        self._profiles: OrderedDict[str, Sampler] = OrderedDict()
+        self._ids = itertools.count(1)
+
+    def add(self, sampler: Sampler) -> str:
+        profile_id = str(next(self._ids))
+        self._profiles[profile_id] = sampler
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Sampler | None:
+        return self._profiles.get(profile_id)
+
+
+request_profiles = ProfileStore()
+
+
+class RequestProfilerMiddleware:
+    """
+    Profile single requests to selected paths on demand.
+
+    A request carrying `X-Profile: <DEBUG_TOKEN>` is sampled while it runs
+    (other requests interleaved on the event loop show up too); the
+    response gets an `X-Profile-Id` to fetch the profile from
+    /debug/profile/requests/{id}. With DEBUG_TOKEN unset, or for other
+    paths, requests pass straight through.
+    """
+
+    def __init__(self, app, paths: tuple[str, ...]):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not settings.DEBUG_TOKEN
+            or scope["type"] != "http"
+            or scope["path"] not in self.paths
+        ):
+            return await self.app(scope, receive, send)
+
+        token = next(
+            (value for key, value in scope["headers"] if key == PROFILE_HEADER), None
+        )
+        if token is None or not check_debug_token(token.decode("latin-1")):
+            return await self.app(scope, receive, send)
+
+        sampler = Sampler(interval=settings.PROFILE_INTERVAL).start()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                sampler.stop()
+                profile_id = request_profiles.add(sampler)
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (PROFILE_ID_HEADER, profile_id.encode()),
+                    ],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
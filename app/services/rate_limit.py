@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+
+import redis.asyncio as redis
+
+from app.config import settings
+from app.routers.metrics import upstream_rate_limit
+from app.services import cache
+
+logger = logging.getLogger(__name__)
+
+KEY = "hivebox:ratelimit:opensensemap"
+
+# Share of the bucket each class must leave untouched, so lower classes run
+# dry first and user-facing refreshes can still get a token.
+PRIORITY_RESERVE = {"user": 0.0, "background": 0.25, "probe": 0.5}
+# How long each class may queue for a token before it is denied.
+PRIORITY_MAX_WAIT = {"user": 5.0, "background": 30.0, "probe": 0.0}
+
+# Refill and take one token atomically, using the server clock so replicas
+# with skewed clocks share one bucket. Returns {allowed, seconds to wait}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local floor = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens - 1 >= floor then
+  tokens = tokens - 1
+  allowed = 1
+else
+  wait = (floor + 1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+_rate_limit_client: redis.Redis | None = None
+
+
+class RateLimitExceeded(Exception):
+    """Raised when no upstream token became available in time."""
+
+    pass
+
+
+def set_rate_limit_client(client: redis.Redis) -> None:
+    """Set Valkey client from main app"""
+    global _rate_limit_client
+    _rate_limit_client = client
+
+
+class TokenBucket:
+    """In-process token bucket with the same semantics as the Valkey script"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, floor: float) -> tuple[bool, float]:
+        """
+        Take one token if more than `floor` would remain.
+
+        Returns:
+            tuple: (allowed, seconds until a token is expected)
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens - 1 >= floor:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (floor + 1 - self.tokens) / self.rate
+
+
+class UpstreamLimiter:
+    """
+    Cluster-wide limiter for OpenSenseMap requests.
+
+    Tokens come from one bucket in Valkey shared by every replica. If
+    Valkey is unreachable, each replica falls back to a local bucket with
+    its 1/UPSTREAM_REPLICAS share of the rate.
+    """
+
+    def __init__(self, rate: float, burst: float, replicas: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.local = TokenBucket(rate / max(replicas, 1), burst / max(replicas, 1))
+
+    async def _take(self, floor_share: float) -> tuple[bool, float]:
+        if _rate_limit_client is not None:
+            try:
+                allowed, wait = await cache.script(
+                    _rate_limit_client,
+                    TOKEN_BUCKET_SCRIPT,
+                    [KEY],
+                    [self.rate, self.burst, self.burst * floor_share],
+                )
+                return bool(int(allowed)), float(wait)
+            except redis.RedisError as e:
+                logger.warning(f"Shared rate limiter unavailable, using local: {e}")
+        return self.local.take(self.local.burst * floor_share)
+
+    async def acquire(self, priority: str = "background") -> None:
+        """
+        Wait for an upstream token, within the class's queueing budget.
+
+        Args:
+            priority: "user", "background" or "probe"
+
+        Raises:
+            RateLimitExceeded: If no token was granted in time
+        """
+        reserve = PRIORITY_RESERVE[priority]
+        deadline = time.monotonic() + PRIORITY_MAX_WAIT[priority]
+        queued = False
+        while True:
+            allowed, wait = await self._take(reserve)
+            if allowed:
+                upstream_rate_limit.labels(
+                    priority=priority, outcome="queued" if queued else "allowed"
+                ).inc()
+                return
+            if time.monotonic() + wait > deadline:
+                upstream_rate_limit.labels(priority=priority, outcome="denied").inc()
+                raise RateLimitExceeded(f"Upstream rate limit reached ({priority})")
+            queued = True
+            await asyncio.sleep(wait)
+
+
+upstream_limiter = UpstreamLimiter(
+    settings.UPSTREAM_RATE,
+    settings.UPSTREAM_BURST,
+    replicas=settings.UPSTREAM_REPLICAS,
+)
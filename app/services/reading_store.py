@@ -0,0 +1,131 @@
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+
+class SlotColumns:
+    """
+    Per-box numpy columns addressed through an ID-to-slot map.
+
+    Subclasses declare their columns in COLUMNS. Every box owns one slot
+    (row) across all columns; released slots are zeroed and reused, and
+    capacity doubles when full, so updates never allocate per box.
+    """
+
+    COLUMNS: dict[str, type] = {}
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self._index: dict[str, int] = {}
+        self._ids: list[str | None] = [None] * capacity
+        self._free: list[int] = list(range(capacity - 1, -1, -1))
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    @property
+    def capacity(self) -> int:
+        return len(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, box_id: str) -> bool:
+        return box_id in self._index
+
+    def _grow(self) -> None:
+        old = self.capacity
+        new = old * 2
+        self._ids.extend([None] * old)
+        self._free.extend(range(new - 1, old - 1, -1))
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            grown = np.zeros(new, dtype=column.dtype)
+            grown[:old] = column
+            setattr(self, name, grown)
+
+    def _slot(self, box_id: str) -> int:
+        """The box's slot, allocating a zeroed one if it has none"""
+        slot = self._index.get(box_id)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._index[box_id] = slot
+            self._ids[slot] = box_id
+        return slot
+
+    def _release(self, slot: int) -> None:
+        del self._index[self._ids[slot]]
+        self._ids[slot] = None
+        for name in self.COLUMNS:
+            getattr(self, name)[slot] = 0
+        self._free.append(slot)
+
+
+class ReadingStore(SlotColumns):
+    """
+    Latest reading of each box in parallel numpy columns.
+
+    The value and measurement time of every slot live in float64 arrays, so
+    a box costs 17 bytes of column data plus its ID-map entry instead of a
+    dict of Python objects. Stale readings are found with one vectorized
+    comparison over the measurement column.
+    """
+
+    COLUMNS = {"values": np.float64, "measured_at": np.float64, "live": bool}
+
+    def get(self, box_id: str) -> tuple[float, float] | None:
+        """Return (value, measured_at) for a box, if present"""
+        slot = self._index.get(box_id)
+        if slot is None:
+            return None
+        return float(self.values[slot]), float(self.measured_at[slot])
+
+    def set(self, box_id: str, value: float, measured_at: float) -> None:
+        """Insert or overwrite a box's reading"""
+        slot = self._slot(box_id)
+        self.live[slot] = True
+        self.values[slot] = value
+        self.measured_at[slot] = measured_at
+
+    def remove(self, box_id: str) -> tuple[float, float] | None:
+        """
+        Drop a box.
+
+        Returns:
+            tuple: Its (value, measured_at), or None if it was not stored
+        """
+        previous = self.get(box_id)
+        if previous is not None:
+            self._release(self._index[box_id])
+        return previous
+
+    def remove_older_than(self, cutoff: float) -> np.ndarray:
+        """
+        Drop every reading measured before `cutoff`.
+
+        Returns:
+            np.ndarray: Values of the dropped readings
+        """
+        stale = np.flatnonzero(self.live & (self.measured_at < cutoff))
+        removed = self.values[stale].copy()
+        for slot in stale.tolist():
+            self._release(slot)
+        return removed
+
+    def oldest(self) -> float | None:
+        """Earliest measurement time, or None when empty"""
+        if not self._index:
+            return None
+        return float(self.measured_at[self.live].min())
+
+    def live_values(self) -> np.ndarray:
+        """Values of all stored boxes as a contiguous float array"""
+        return self.values[self.live]
+
+    def box_ids(self) -> list[str]:
+        """IDs of all stored boxes"""
+        return [self._ids[slot] for slot in np.flatnonzero(self.live).tolist()]
+
+    def columns(self) -> tuple[list[str], np.ndarray, np.ndarray]:
+        """Box IDs with their values and measurement times, in slot order"""
+        return self.box_ids(), self.values[self.live], self.measured_at[self.live]
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from typing import Iterable
+
+import redis.asyncio as redis
+
+from app.config import settings
+from app.services import cache
+from app.services.aggregate_state import aggregate_state
+from app.services.anomaly import anomaly_detector
+from app.services.scheduler import box_scheduler
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_KEY = "hivebox:registry:boxes"
+INITIALIZED_KEY = "hivebox:registry:initialized"
+CHANGES_CHANNEL = "hivebox:registry:changes"
+
+# Seed the set once per Valkey, then return it. A set that already has
+# members (from before the marker existed) is kept as is; an empty set
+# after that is a registry whose boxes were all removed.
+# KEYS: set, marker; ARGV: seed IDs
+LOAD_SCRIPT = """
+if redis.call('SET', KEYS[2], '1', 'NX') and redis.call('SCARD', KEYS[1]) == 0 and #ARGV > 0 then
+  redis.call('SADD', KEYS[1], unpack(ARGV))
+end
+return redis.call('SMEMBERS', KEYS[1])
+"""
+BOX_ID_PATTERN = re.compile(r"^[0-9a-f]{24}$")
+
+_registry_client: redis.Redis | None = None
+
+
+def set_registry_client(client: redis.Redis) -> None:
+    """Set Valkey client from main app"""
+    global _registry_client
+    _registry_client = client
+
+
+def get_registry_client() -> redis.Redis | None:
+    return _registry_client
+
+
+def is_valid_box_id(box_id: str) -> bool:
+    """senseBox IDs are 24-character lowercase hex ObjectIds"""
+    return bool(BOX_ID_PATTERN.match(box_id))
+
+
+class BoxRegistry:
+    """
+    Set of senseBoxes this deployment tracks.
+
+    The shared copy is a Valkey set, seeded from SENSEBOX_IDS only the first
+    time any replica loads it (INITIALIZED_KEY marks that), so removing
+    every box sticks; every change is published on CHANGES_CHANNEL so all
+    replicas apply it. Applying a change touches only the affected box: an
+    added box is scheduled for an immediate first poll, a removed one is
+    dropped from the scheduler, the aggregate state and the anomaly
+    detector. Without Valkey the registry is the static SENSEBOX_IDS list.
+    """
+
+    def __init__(self, box_ids: Iterable[str] = ()):
+        self._box_ids: dict[str, None] = dict.fromkeys(box_ids)
+
+    def __len__(self) -> int:
+        return len(self._box_ids)
+
+    def __contains__(self, box_id: str) -> bool:
+        return box_id in self._box_ids
+
+    def ids(self) -> list[str]:
+        """Tracked box IDs, in the order they were added"""
+        return list(self._box_ids)
+
+    def version(self) -> str:
+        """Short hash of the tracked set, changing whenever a box is added or removed"""
+        return hashlib.sha256("\n".join(sorted(self._box_ids)).encode()).hexdigest()[:16]
+
+    def reset(self, box_ids: Iterable[str]) -> None:
+        """Replace the local set without touching other components"""
+        self._box_ids = dict.fromkeys(box_ids)
+
+    def apply(self, op: str, box_id: str) -> bool:
+        """
+        Apply one change locally.
+
+        Returns:
+            bool: False if the change was already applied
+        """
+        if op == "add":
+            if box_id in self._box_ids:
+                return False
+            self._box_ids[box_id] = None
+            box_scheduler.add(box_id)
+        elif op == "remove":
+            if box_id not in self._box_ids:
+                return False
+            del self._box_ids[box_id]
+            box_scheduler.remove(box_id)
+            aggregate_state.remove(box_id)
+            anomaly_detector.remove(box_id)
+        else:
+            raise ValueError(f"Unknown registry operation: {op}")
+        logger.info(f"Box registry: {op} {box_id}")
+        return True
+
+    def reconcile(self, box_ids: Iterable[str]) -> tuple[list[str], list[str]]:
+        """
+        Converge on a full set of IDs by applying only the differences.
+
+        Returns:
+            tuple: (added IDs, removed IDs)
+        """
+        wanted = dict.fromkeys(box_ids)
+        added = [box_id for box_id in wanted if self.apply("add", box_id)]
+        removed = [
+            box_id
+            for box_id in list(self._box_ids)
+            if box_id not in wanted and self.apply("remove", box_id)
+        ]
+        return added, removed
+
+    async def load(self) -> None:
+        """Reconcile with the shared set, seeding it on first use"""
+        if _registry_client is None:
+            return
+        seed = self.ids() or settings.SENSEBOX_IDS
+        members = await cache.script(
+            _registry_client, LOAD_SCRIPT, [REGISTRY_KEY, INITIALIZED_KEY], seed
+        )
+        # Keep the local order for known boxes; SMEMBERS order is arbitrary.
+        known = [box_id for box_id in self._box_ids if box_id in members]
+        self.reconcile(known + sorted(set(members) - set(known)))
+
+    async def _change(self, op: str, box_id: str) -> bool:
+        if _registry_client is not None:
+            command = "sadd" if op == "add" else "srem"
+            changed = await cache.command(_registry_client, command, REGISTRY_KEY, box_id)
+            message = json.dumps({"op": op, "box_id": box_id})
+            await cache.command(_registry_client, "publish", CHANGES_CHANNEL, message)
+            self.apply(op, box_id)
+            return bool(changed)
+        return self.apply(op, box_id)
+
+    async def add(self, box_id: str) -> bool:
+        """
+        Track a box on every replica.
+
+        Returns:
+            bool: False if it was already tracked
+        """
+        return await self._change("add", box_id)
+
+    async def remove(self, box_id: str) -> bool:
+        """
+        Stop tracking a box on every replica.
+
+        Returns:
+            bool: False if it was not tracked
+        """
+        return await self._change("remove", box_id)
+
+    def handle_message(self, data: str) -> None:
+        """Apply a change published by any replica, including this one"""
+        try:
+            change = json.loads(data)
+            self.apply(change["op"], change["box_id"])
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring malformed registry change {data!r}: {e}")
+
+    async def listen(self) -> None:
+        """
+        Apply changes from other replicas until cancelled.
+
+        Pub/sub does not buffer messages for disconnected subscribers, so
+        after every (re)subscribe the full set is reconciled once to pick
+        up changes missed in between.
+        """
+        delay = 1.0
+        while True:
+            if _registry_client is None:
+                return
+            pubsub = _registry_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(CHANGES_CHANNEL)
+                await self.load()
+                delay = 1.0
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.handle_message(message["data"])
+            except redis.RedisError as e:
+                logger.warning(f"Registry subscription lost, retrying in {delay:.0f}s: {e}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.STARTUP_RETRY_MAX_DELAY)
+
+
+box_registry = BoxRegistry(settings.SENSEBOX_IDS)
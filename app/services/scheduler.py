@@ -0,0 +1,185 @@
+import heapq
+import time
+from typing import Iterable
+
+from app.config import settings
+
+# Weight of the newest observed interval in the running estimate.
+INTERVAL_SMOOTHING = 0.3
+
+
+class BoxSchedule:
+    """Learned reporting cadence of one box"""
+
+    __slots__ = ("last_measured_at", "last_fetched_at", "interval", "misses", "next_poll_at")
+
+    def __init__(self, next_poll_at: float):
+        self.last_measured_at: float | None = None
+        self.last_fetched_at: float | None = None
+        self.interval: float | None = None
+        self.misses = 0
+        self.next_poll_at = next_poll_at
+
+
+class PollScheduler:
+    """
+    Per-box polling schedule learned from `lastMeasurement.createdAt`.
+
+    Each box is polled shortly after its next expected measurement. Boxes
+    that produce nothing new are polled with exponential backoff up to
+    MAX_POLL_INTERVAL, so idle boxes cost almost no upstream requests.
+    """
+
+    def __init__(self):
+        self._boxes: dict[str, BoxSchedule] = {}
+        self._heap: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def get(self, box_id: str) -> BoxSchedule | None:
+        return self._boxes.get(box_id)
+
+    def clear(self) -> None:
+        self._boxes.clear()
+        self._heap.clear()
+
+    def add(self, box_id: str, now: float | None = None) -> None:
+        """Schedule a box for an immediate first poll if it is new"""
+        if box_id in self._boxes:
+            return
+        now = time.time() if now is None else now
+        self._boxes[box_id] = BoxSchedule(now)
+        heapq.heappush(self._heap, (now, box_id))
+
+    def items(self) -> list[tuple[str, BoxSchedule]]:
+        return list(self._boxes.items())
+
+    def restore(
+        self,
+        box_id: str,
+        last_measured_at: float | None,
+        interval: float | None,
+        misses: int,
+        now: float | None = None,
+    ) -> None:
+        """
+        Reinstate a learned schedule, e.g. from a state snapshot.
+
+        The box is due when its next measurement is expected, or at once if
+        that time has already passed.
+        """
+        now = time.time() if now is None else now
+        schedule = BoxSchedule(now)
+        schedule.last_measured_at = last_measured_at
+        schedule.interval = interval
+        schedule.misses = misses
+        self._boxes[box_id] = schedule
+        at = now
+        if last_measured_at is not None and interval is not None:
+            at = max(now, last_measured_at + interval + settings.POLL_GRACE_SECONDS)
+        self._schedule(box_id, at)
+
+    def remove(self, box_id: str) -> None:
+        """Stop polling a box; its heap entry is dropped lazily"""
+        self._boxes.pop(box_id, None)
+
+    def sync(self, box_ids: Iterable[str], now: float | None = None) -> None:
+        """Add new boxes and drop boxes that are no longer configured"""
+        wanted = set(box_ids)
+        for box_id in wanted - self._boxes.keys():
+            self.add(box_id, now)
+        for box_id in self._boxes.keys() - wanted:
+            self.remove(box_id)
+
+    def _schedule(self, box_id: str, at: float) -> None:
+        self._boxes[box_id].next_poll_at = at
+        heapq.heappush(self._heap, (at, box_id))
+
+    def _backoff(self, schedule: BoxSchedule) -> float:
+        delay = settings.MIN_POLL_INTERVAL * (2**schedule.misses)
+        return min(delay, settings.MAX_POLL_INTERVAL)
+
+    def observe(
+        self, box_id: str, measured_at: float | None, now: float | None = None
+    ) -> None:
+        """
+        Record the outcome of polling a box and schedule its next poll.
+
+        Args:
+            box_id: The senseBox ID
+            measured_at: createdAt of its latest measurement, None on error
+            now: Current epoch seconds (defaults to time.time())
+        """
+        now = time.time() if now is None else now
+        self.add(box_id, now)
+        schedule = self._boxes[box_id]
+        if measured_at is not None:
+            schedule.last_fetched_at = now
+
+        is_new = measured_at is not None and (
+            schedule.last_measured_at is None or measured_at > schedule.last_measured_at
+        )
+        if not is_new:
+            schedule.misses += 1
+            self._schedule(box_id, now + self._backoff(schedule))
+            return
+
+        if schedule.last_measured_at is not None:
+            observed = measured_at - schedule.last_measured_at
+            if schedule.interval is None:
+                schedule.interval = observed
+            else:
+                schedule.interval += INTERVAL_SMOOTHING * (observed - schedule.interval)
+        schedule.last_measured_at = measured_at
+        schedule.misses = 0
+
+        interval = schedule.interval or settings.MIN_POLL_INTERVAL
+        interval = min(max(interval, settings.MIN_POLL_INTERVAL), settings.MAX_POLL_INTERVAL)
+        expected = measured_at + interval + settings.POLL_GRACE_SECONDS
+        if expected <= now:
+            expected = now + self._backoff(schedule)
+        self._schedule(box_id, expected)
+
+    def pop_due(self, now: float | None = None) -> list[str]:
+        """
+        Return boxes whose next poll time has passed.
+
+        Returned boxes stay unscheduled until observe() is called for them.
+        """
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, box_id = heapq.heappop(self._heap)
+            schedule = self._boxes.get(box_id)
+            if schedule is not None and schedule.next_poll_at == at:
+                schedule.next_poll_at = float("inf")
+                due.append(box_id)
+        return due
+
+    def release(self, box_ids: Iterable[str], now: float | None = None) -> None:
+        """
+        Reschedule popped boxes whose poll never reported an outcome.
+
+        Call after polling the boxes returned by pop_due(), whatever
+        happened; boxes that were observed are left alone, the others are
+        treated as failed polls and backed off.
+        """
+        for box_id in box_ids:
+            schedule = self._boxes.get(box_id)
+            if schedule is not None and schedule.next_poll_at == float("inf"):
+                self.observe(box_id, None, now)
+
+    def seconds_until_due(self, now: float | None = None) -> float:
+        """Time until the next scheduled poll, or MAX_POLL_INTERVAL if none"""
+        now = time.time() if now is None else now
+        while self._heap:
+            at, box_id = self._heap[0]
+            schedule = self._boxes.get(box_id)
+            if schedule is not None and schedule.next_poll_at == at:
+                return max(at - now, 0.0)
+            heapq.heappop(self._heap)
+        return float(settings.MAX_POLL_INTERVAL)
+
+
+box_scheduler = PollScheduler()
@@ -0,0 +1,252 @@
+"""Bounded local disk cache of archive day segments, read through mmap.
+
+Archive objects are compressed `.npz` files, which cannot be memory-mapped.
+A fetched day is therefore decoded once and written to SEGMENT_CACHE_DIR
+as one file: a JSON header followed by each column's raw, 64-byte aligned
+data. Later reads map the columns straight from the page cache with
+`np.memmap`, so history queries neither download the object again nor copy
+it into Python buffers.
+
+Each file records the archive generation it was fetched under (see
+`history_cache`) and the object's ETag. A segment is only served for the
+same generation and while the object still has that ETag, checked for a
+whole query with one bucket listing, so a day rewritten by compaction or
+backfill is fetched again even if the generations were lost with a Valkey
+restart. The header holds a
+SHA-256 of the data, checked the first time a file is opened by this
+process; corrupt files are dropped and refetched. Files are evicted least
+recently used first to stay under SEGMENT_CACHE_MAX_BYTES.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+from minio import Minio
+
+from app.config import settings
+from app.routers.metrics import segment_cache_bytes, segment_cache_requests, segment_cache_saved
+from app.services import archive
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"HBSEG1\n\0"
+ALIGN = 64
+SUFFIX = ".seg"
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def encode_segment(
+    columns: dict[str, np.ndarray], generation: str, object_bytes: int, etag: str = ""
+) -> bytes:
+    """Lay out columns as a header plus aligned raw data"""
+    layout, data, offset = {}, bytearray(), 0
+    for name in archive.COLUMNS:
+        column = np.ascontiguousarray(columns[name])
+        padding = _aligned(offset) - offset
+        data += b"\0" * padding
+        offset += padding
+        layout[name] = [column.dtype.str, offset, len(column)]
+        data += column.tobytes()
+        offset += column.nbytes
+    header = json.dumps(
+        {
+            "generation": generation,
+            "etag": etag,
+            "object_bytes": object_bytes,
+            "sha256": hashlib.sha256(data).hexdigest(),
+            "columns": layout,
+        }
+    ).encode()
+    start = _aligned(len(MAGIC) + 4 + len(header))
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    return prefix + b"\0" * (start - len(prefix)) + bytes(data)
+
+
+def _read_header(path: str) -> tuple[dict, int]:
+    """A segment's header and the offset of its data section"""
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a segment file")
+        (length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(length))
+    return header, _aligned(len(MAGIC) + 4 + length)
+
+
+def _checksum(path: str, start: int) -> str:
+    with open(path, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size <= start:
+            return hashlib.sha256(b"").hexdigest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(memoryview(mapped)[start:]).hexdigest()
+
+
+class SegmentCache:
+    """
+    Day segments on local disk with LRU eviction.
+
+    Safe to use from several worker threads; files are replaced atomically,
+    and a mapped file stays readable after it is evicted.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.configure(directory, max_bytes)
+
+    def configure(self, directory: str, max_bytes: int) -> None:
+        """Point the cache at a directory; an empty path disables it"""
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # path -> file size, least recently used first; built on first use
+        self._index: OrderedDict[str, int] | None = None
+        self._bytes = 0
+        self._validated: set[tuple[str, int, int]] = set()
+
+    def _path(self, day: date) -> str:
+        return os.path.join(self.directory, f"{day.isoformat()}{SUFFIX}")
+
+    def _load_index(self) -> OrderedDict[str, int]:
+        if self._index is None:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, entry.path, stat.st_size))
+            # Hits update atime only, so a restart keeps the LRU order.
+            self._index = OrderedDict((path, size) for _, path, size in sorted(entries))
+            self._bytes = sum(self._index.values())
+            segment_cache_bytes.set(self._bytes)
+        return self._index
+
+    def _drop(self, path: str) -> None:
+        self._bytes -= self._load_index().pop(path, 0)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        segment_cache_bytes.set(self._bytes)
+
+    def _open(
+        self, path: str, generation: str, etag: str
+    ) -> tuple[dict[str, np.ndarray], int] | None:
+        """Map a cached segment if it is current and intact"""
+        try:
+            stat = os.stat(path)
+            header, start = _read_header(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable segment {path}: {e}")
+            self._drop(path)
+            return None
+        if header["generation"] != generation or header.get("etag") != etag:
+            return None
+        # Checked once per file version; hits leave mtime untouched.
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in self._validated:
+            if _checksum(path, start) != header["sha256"]:
+                logger.warning(f"Dropping corrupt segment {path}")
+                self._drop(path)
+                return None
+            self._validated.add(key)
+        columns = {
+            name: np.memmap(path, dtype=dtype, mode="r", offset=start + offset, shape=(rows,))
+            if rows
+            else np.empty(0, dtype=dtype)
+            for name, (dtype, offset, rows) in header["columns"].items()
+        }
+        os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+        return columns, header["object_bytes"]
+
+    def _store(self, path: str, payload: bytes) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(payload)
+        os.replace(tmp, path)
+        index = self._load_index()
+        self._bytes += len(payload) - index.pop(path, 0)
+        index[path] = len(payload)
+        while self._bytes > self.max_bytes and len(index) > 1:
+            self._drop(next(iter(index)))
+        segment_cache_bytes.set(self._bytes)
+
+    def load_day(
+        self, client: Minio, day: date, generation: str | None, etag: str | None
+    ) -> dict[str, np.ndarray]:
+        """
+        A day's archive columns, from disk when cached for this generation.
+
+        Without a generation (history cache unavailable) or a directory, the
+        object is read from MinIO and not cached.
+
+        Args:
+            etag: The object's current ETag (see archive.day_etags), None if
+                the day has no archive
+        """
+        if not self.directory or generation is None:
+            return archive.load_day(client, day)
+        path = self._path(day)
+        with self._lock:
+            self._load_index()
+            cached = None if etag is None else self._open(path, generation, etag)
+            if cached is not None:
+                columns, object_bytes = cached
+                self._index.move_to_end(path)
+                segment_cache_requests.labels(result="hit").inc()
+                segment_cache_saved.inc(object_bytes)
+                return columns
+
+        segment_cache_requests.labels(result="miss").inc()
+        fetched = None if etag is None else archive.fetch_day(client, day)
+        if fetched is None:
+            return archive.empty_columns()
+        payload, etag = fetched
+        columns = archive.decode_columns(payload)
+        with self._lock:
+            try:
+                self._store(path, encode_segment(columns, generation, len(payload), etag))
+            except OSError as e:
+                logger.warning(f"Segment cache write failed for {day}: {e}")
+        return columns
+
+
+segment_cache = SegmentCache(settings.SEGMENT_CACHE_DIR, settings.SEGMENT_CACHE_MAX_BYTES)
+
+
+def read_downsampled(
+    client: Minio,
+    start: date,
+    end: date,
+    resolution: int,
+    generations: list[str] | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Downsample an inclusive range of archive days (blocking).
+
+    Days are reduced one at a time, straight from their mapped segments,
+    and only the per-window partial results are combined. Cached segments
+    are checked against ETags from one listing of the range.
+    """
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    etags = {}
+    if segment_cache.directory and generations:
+        etags = archive.day_etags(client, start, end)
+    generations = generations or [None] * len(days)
+    loaded = (
+        segment_cache.load_day(client, day, gen, etags.get(day))
+        for day, gen in zip(days, generations)
+    )
+    return archive.downsample_days(loaded, resolution)
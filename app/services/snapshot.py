@@ -0,0 +1,189 @@
+"""Persist per-box state so a restarted replica can serve immediately.
+
+A snapshot holds the latest reading of every box in the aggregate state and
+the learned poll schedule of every box, as one small `.npz` file. It is
+written atomically to SNAPSHOT_PATH on local disk and to SNAPSHOT_OBJECT in
+MinIO, which survives pod replacement. All replicas share the MinIO object;
+they poll the same boxes, so the last writer's state is as good as any.
+
+On startup the local snapshot is restored before traffic is accepted; without
+one, the shared snapshot is fetched in the background. Readings still within
+MAX_DATA_AGE_SECONDS go back into the aggregate state, schedules back into
+the poll scheduler, and the state keeps the snapshot's refresh time, so its
+age stays visible while the background refresh catches up.
+"""
+
+import io
+import logging
+import os
+import time
+
+import numpy as np
+from minio import Minio
+from minio.error import S3Error
+
+from app.config import settings
+from app.services.aggregate_state import aggregate_state
+from app.services.registry import box_registry
+from app.services.scheduler import box_scheduler
+from app.services.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+
+def capture(now: float | None = None) -> dict[str, np.ndarray]:
+    """
+    Copy the aggregate state and poll schedules into snapshot columns.
+
+    Runs on the event loop so the state cannot change mid-copy; encoding
+    and writing can then happen in a worker thread.
+    """
+    now = time.time() if now is None else now
+    box_ids, values, measured_at = aggregate_state.columns()
+    schedules = box_scheduler.items()
+    refreshed_at = aggregate_state.refreshed_at
+    return {
+        "version": np.int32(SNAPSHOT_VERSION),
+        "saved_at": np.float64(now),
+        "refreshed_at": np.float64(np.nan if refreshed_at is None else refreshed_at),
+        "box_id": np.array(box_ids, dtype=str),
+        "value": values.copy(),
+        "measured_at": measured_at.copy(),
+        "schedule_box_id": np.array([box_id for box_id, _ in schedules], dtype=str),
+        "last_measured_at": np.array(
+            [np.nan if s.last_measured_at is None else s.last_measured_at for _, s in schedules],
+            dtype=np.float64,
+        ),
+        "interval": np.array(
+            [np.nan if s.interval is None else s.interval for _, s in schedules],
+            dtype=np.float64,
+        ),
+        "misses": np.array([s.misses for _, s in schedules], dtype=np.int32),
+    }
+
+
+def encode_snapshot(columns: dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **columns)
+    return buffer.getvalue()
+
+
+def _optional(value: float) -> float | None:
+    return None if np.isnan(value) else float(value)
+
+
+def restore_snapshot(payload: bytes, now: float | None = None) -> dict:
+    """
+    Load a snapshot into the aggregate state and poll scheduler.
+
+    Only boxes that are still registered are restored; readings older than
+    MAX_DATA_AGE_SECONDS are skipped.
+
+    Returns:
+        dict: saved_at, age (seconds since the snapshot's last refresh),
+            readings and schedules restored
+
+    Raises:
+        ValueError: If the payload is not a snapshot of a known version
+    """
+    now = time.time() if now is None else now
+    with np.load(io.BytesIO(payload)) as data:
+        if int(data["version"]) != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {int(data['version'])}")
+        columns = {name: data[name] for name in data.files}
+
+    readings = 0
+    for box_id, value, measured_at in zip(
+        columns["box_id"].tolist(), columns["value"], columns["measured_at"]
+    ):
+        if box_id in box_registry and aggregate_state.update(
+            box_id, float(value), float(measured_at), now=now
+        ):
+            readings += 1
+
+    schedules = 0
+    for box_id, last, interval, misses in zip(
+        columns["schedule_box_id"].tolist(),
+        columns["last_measured_at"],
+        columns["interval"],
+        columns["misses"],
+    ):
+        if box_id in box_registry:
+            box_scheduler.restore(
+                box_id, _optional(last), _optional(interval), int(misses), now=now
+            )
+            schedules += 1
+
+    saved_at = float(columns["saved_at"])
+    refreshed_at = _optional(columns["refreshed_at"])
+    aggregate_state.refreshed_at = refreshed_at if readings else None
+    return {
+        "saved_at": saved_at,
+        "age": now - (refreshed_at if refreshed_at is not None else saved_at),
+        "readings": readings,
+        "schedules": schedules,
+    }
+
+
+def write_local(payload: bytes, path: str) -> None:
+    """Replace the snapshot file atomically (blocking)"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as file:
+        file.write(payload)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp, path)
+
+
+def read_local() -> bytes | None:
+    """The snapshot at SNAPSHOT_PATH, or None if disabled or missing"""
+    if not settings.SNAPSHOT_PATH:
+        return None
+    try:
+        with open(settings.SNAPSHOT_PATH, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def read_remote(client: Minio | None) -> bytes | None:
+    """The shared snapshot in MinIO, or None if disabled or missing (blocking)"""
+    if client is None or not settings.SNAPSHOT_OBJECT:
+        return None
+    with start_span("snapshot read_remote"):
+        try:
+            response = client.get_object(settings.MINIO_BUCKET, settings.SNAPSHOT_OBJECT)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                return None
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+
+def save(columns: dict[str, np.ndarray], client: Minio | None) -> int:
+    """
+    Encode captured columns and write them to every destination (blocking).
+
+    Returns:
+        int: Snapshot size in bytes
+    """
+    with start_span("snapshot save") as span:
+        payload = encode_snapshot(columns)
+        span.set_attribute("bytes", len(payload))
+        if settings.SNAPSHOT_PATH:
+            write_local(payload, settings.SNAPSHOT_PATH)
+        if client is not None and settings.SNAPSHOT_OBJECT:
+            client.put_object(
+                settings.MINIO_BUCKET,
+                settings.SNAPSHOT_OBJECT,
+                data=io.BytesIO(payload),
+                length=len(payload),
+                content_type="application/x-npz",
+            )
+    return len(payload)
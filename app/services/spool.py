@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from app.config import settings
+from app.routers.metrics import spool_pending_bytes, spool_records
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "current.log"
+REPLAY_GLOB = "replay-*.log"
+
+
+class Spool:
+    """
+    Append-only, disk-backed queue of archive writes.
+
+    Records are appended as JSON lines to `current.log`, flushed to the OS
+    on every append and fsynced at most every `fsync_interval` seconds.
+    Draining first renames `current.log` to a `replay-*.log` segment, so new
+    appends never race with the upload; a segment is deleted only after
+    every record in it was uploaded, and leftover segments from a crash are
+    replayed on the next drain. Uploads must be idempotent (same object name).
+
+    The spool survives process crashes and restarts; it is only as durable
+    as its directory, so records on an ephemeral volume are lost with it.
+    Appends and flushes block on disk I/O: call them off the event loop.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_bytes: int,
+        fsync_interval: float = 1.0,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._last_fsync = 0.0
+        self._dirty = False
+        self._size: int | None = None
+
+    def _current_path(self) -> Path:
+        return self.directory / CURRENT_FILE
+
+    def _segments(self) -> list[Path]:
+        return sorted(self.directory.glob(REPLAY_GLOB))
+
+    def _open(self):
+        if self._file is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._file = open(self._current_path(), "ab")
+        return self._file
+
+    def _measure(self) -> int:
+        if self._size is None:
+            paths = [self._current_path(), *self._segments()]
+            self._size = sum(path.stat().st_size for path in paths if path.exists())
+        return self._size
+
+    def pending_bytes(self) -> int:
+        """Bytes waiting to be replayed"""
+        with self._lock:
+            return self._measure()
+
+    def append(self, object_name: str, data: dict) -> bool:
+        """
+        Queue one object write, on disk after the next fsync.
+
+        Returns:
+            bool: False if the spool is full and the record was dropped
+        """
+        line = (
+            json.dumps({"object_name": object_name, "data": data}, separators=(",", ":"))
+            + "\n"
+        ).encode("utf-8")
+        with self._lock:
+            if self._measure() + len(line) > self.max_bytes:
+                spool_records.labels(event="dropped").inc()
+                logger.error(f"Spool full, dropping {object_name}")
+                return False
+            file = self._open()
+            file.write(line)
+            file.flush()
+            self._size += len(line)
+            self._dirty = True
+            if time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+        spool_records.labels(event="spooled").inc()
+        spool_pending_bytes.set(self._size)
+        return True
+
+    def _fsync(self) -> None:
+        if self._file is not None and self._dirty:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+        self._last_fsync = time.monotonic()
+
+    def flush(self) -> None:
+        """fsync any appends still only in the page cache"""
+        with self._lock:
+            self._fsync()
+
+    def _rotate(self) -> None:
+        with self._lock:
+            if self._file is None:
+                if not self._current_path().exists():
+                    return
+            else:
+                self._fsync()
+                self._file.close()
+                self._file = None
+            current = self._current_path()
+            if current.stat().st_size:
+                current.rename(self.directory / f"replay-{time.time_ns()}.log")
+
+    def drain(self, upload: Callable[[str, dict], None]) -> int:
+        """
+        Replay every spooled record through `upload`, oldest first.
+
+        Stops at the first failed upload and leaves the remaining segments
+        for the next drain.
+
+        Args:
+            upload: Writes one object; raises on failure
+
+        Returns:
+            int: Records uploaded
+        """
+        if not self.directory.exists():
+            return 0
+        self._rotate()
+
+        replayed = 0
+        try:
+            for segment in self._segments():
+                with open(segment, "rb") as file:
+                    for line in file:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # A torn final line from a crash mid-append.
+                            logger.warning(f"Skipping corrupt spool record in {segment}")
+                            continue
+                        upload(record["object_name"], record["data"])
+                        replayed += 1
+                        spool_records.labels(event="replayed").inc()
+                segment.unlink()
+        finally:
+            with self._lock:
+                self._size = None
+                spool_pending_bytes.set(self._measure())
+        return replayed
+
+
+archive_spool = Spool(
+    settings.SPOOL_DIR,
+    max_bytes=settings.SPOOL_MAX_BYTES,
+    fsync_interval=settings.SPOOL_FSYNC_INTERVAL,
+)
@@ -0,0 +1,319 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Protocol
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = b"traceparent"
+
+
+class Span:
+    """One timed operation within a trace"""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "sampled",
+        "start",
+        "end",
+        "attributes",
+        "status",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        sampled: bool = True,
+        span_id: str | None = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id or secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start = time.time()
+        self.end: float | None = None
+        self.attributes: dict[str, Any] = {}
+        self.status = "ok"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    @property
+    def traceparent(self) -> str:
+        """W3C trace context header value"""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in for spans that are not recorded"""
+
+    sampled = False
+    trace_id = "0" * 32
+    span_id = "0" * 16
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Span | _NoopSpan | None] = ContextVar(
+    "hivebox_current_span", default=None
+)
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class InMemoryExporter:
+    """Keep the most recent finished spans, for tests and local analysis"""
+
+    def __init__(self, max_spans: int = 10000):
+        self.spans: deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class FileExporter:
+    """
+    Append finished spans as JSON lines.
+
+    The file is opened once; export() only queues the line and a background
+    thread writes queued lines in batches, so requests never wait on disk I/O.
+    If the writer falls max_queued spans behind, new spans are dropped.
+    """
+
+    def __init__(self, path: str, max_queued: int = 10000):
+        self.path = path
+        self.dropped = 0
+        self._queue: queue.Queue[str | None] = queue.Queue(maxsize=max_queued)
+        self._file = open(path, "a", encoding="utf-8")  # pylint: disable=consider-using-with
+        self._writer = threading.Thread(target=self._write, name="trace-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(json.dumps(span.to_dict(), default=str) + "\n")
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty() and len(batch) < 1000:
+                batch.append(self._queue.get_nowait())
+            lines = [line for line in batch if line is not None]
+            try:
+                self._file.writelines(lines)
+                self._file.flush()
+            except OSError as e:
+                logger.warning(f"Trace file write failed: {e}")
+            for _ in batch:
+                self._queue.task_done()
+            if len(lines) < len(batch):
+                self._file.close()
+                return
+
+    def flush(self) -> None:
+        """Wait until every queued span has been written"""
+        if self._writer.is_alive():
+            self._queue.join()
+
+    def close(self) -> None:
+        """Write the remaining spans and stop the writer thread"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+
+class LoggingExporter:
+    """Log one line per finished span"""
+
+    def export(self, span: Span) -> None:
+        logger.info(
+            f"span {span.name} trace={span.trace_id} "
+            f"{span.duration * 1000:.1f}ms {span.status} {span.attributes}"
+        )
+
+
+def exporter_from_settings() -> SpanExporter | None:
+    """Build the exporter named by TRACE_EXPORTER (none, memory, file, log)"""
+    kind = settings.TRACE_EXPORTER
+    if kind == "memory":
+        return InMemoryExporter()
+    if kind == "file":
+        return FileExporter(settings.TRACE_FILE)
+    if kind == "log":
+        return LoggingExporter()
+    return None
+
+
+_exporter: SpanExporter | None = exporter_from_settings()
+
+
+def set_exporter(exporter: SpanExporter | None) -> None:
+    """Install a span exporter; None disables tracing"""
+    global _exporter
+    _exporter = exporter
+
+
+def get_exporter() -> SpanExporter | None:
+    return _exporter
+
+
+def current_span() -> Span | _NoopSpan | None:
+    return _current_span.get()
+
+
+def parse_traceparent(value: str) -> Span | None:
+    """
+    Remote parent from a W3C `traceparent` header, or None if malformed.
+
+    The returned span only carries context; it is never exported.
+    """
+    parts = value.strip().split("-")
+    if len(parts) != 4 or parts[0] != "00":
+        return None
+    _, trace_id, span_id, flags = parts
+    if len(trace_id) != 32 or len(span_id) != 16 or trace_id == "0" * 32:
+        return None
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return Span("remote", trace_id, sampled=sampled, span_id=span_id)
+
+
+@contextmanager
+def start_span(
+    name: str, parent: Span | None = None, **attributes: Any
+) -> Iterator[Span | _NoopSpan]:
+    """
+    Time a block as a child of the current (or given) span.
+
+    The sampling decision is made once per trace, at its root, with
+    probability TRACE_SAMPLE_RATE; spans of unsampled traces cost a
+    context-variable lookup. Exceptions are recorded and re-raised.
+    """
+    if _exporter is None:
+        yield NOOP_SPAN
+        return
+
+    parent = parent or _current_span.get()
+    if parent is None:
+        sampled = random.random() < settings.TRACE_SAMPLE_RATE
+        span = Span(name, secrets.token_hex(16)) if sampled else NOOP_SPAN
+    elif parent.sampled:
+        span = Span(name, parent.trace_id, parent_id=parent.span_id)
+    else:
+        span = NOOP_SPAN
+
+    if span is NOOP_SPAN:
+        token = _current_span.set(NOOP_SPAN)
+        try:
+            yield NOOP_SPAN
+        finally:
+            _current_span.reset(token)
+        return
+
+    span.attributes.update(attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end = time.time()
+        try:
+            _exporter.export(span)
+        except Exception as e:
+            logger.warning(f"Span export failed: {e}")
+
+
+class TracingMiddleware:
+    """
+    Root span per HTTP request, continuing an incoming `traceparent`.
+
+    The response carries the request's `traceparent` so callers can find
+    the trace.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if _exporter is None or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        remote = None
+        for key, value in scope["headers"]:
+            if key == TRACEPARENT_HEADER:
+                remote = parse_traceparent(value.decode("latin-1"))
+                break
+
+        name = f"{scope['method']} {scope['path']}"
+        with start_span(name, parent=remote, **{"http.path": scope["path"]}) as span:
+
+            async def send_with_context(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    if span.sampled:
+                        message = {
+                            **message,
+                            "headers": [
+                                *message.get("headers", []),
+                                (TRACEPARENT_HEADER, span.traceparent.encode()),
+                            ],
+                        }
+                await send(message)
+
+            await self.app(scope, receive, send_with_context)
@@ -0,0 +1,34 @@
+import pytest
+
+from app.services.aggregate_state import aggregate_state
+from app.services.anomaly import anomaly_detector
+from app.config import settings
+from app.services.rate_limit import upstream_limiter
+from app.services.registry import box_registry
+from app.services.scheduler import box_scheduler
+from app.services.segment_cache import segment_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_snapshot(tmp_path, monkeypatch):
+    """Keep state snapshots out of the shared default path"""
+    monkeypatch.setattr(settings, "SNAPSHOT_PATH", str(tmp_path / "state.npz"))
+
+
+@pytest.fixture(autouse=True)
+def isolated_segment_cache(tmp_path):
+    """Give every test an empty segment cache directory"""
+    segment_cache.configure(str(tmp_path / "segments"), settings.SEGMENT_CACHE_MAX_BYTES)
+
+
+@pytest.fixture(autouse=True)
+def reset_aggregate_state():
+    """Isolate tests from readings recorded by earlier tests"""
+    aggregate_state.clear()
+    box_scheduler.clear()
+    anomaly_detector.clear()
+    upstream_limiter.local.tokens = upstream_limiter.local.burst
+    box_registry.reset(settings.SENSEBOX_IDS)
+    yield
+    aggregate_state.clear()
+    box_scheduler.clear()
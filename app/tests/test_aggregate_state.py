@@ -0,0 +1,167 @@
+import time
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.aggregate_state import AggregateState, aggregate_state
+from app.services.opensensemap import calculate_state_average, fetch_temperature_data
+from app.config.settings import settings
+
+client = TestClient(app)
+
+
+def test_update_running_sum_and_count():
+    """Test running aggregates follow updates"""
+    state = AggregateState(max_age_seconds=3600)
+    now = time.time()
+
+    state.update("a", 20.0, now, now=now)
+    state.update("b", 24.0, now, now=now)
+    snapshot = state.snapshot(now=now)
+
+    assert snapshot["count"] == 2
+    assert snapshot["mean"] == 22.0
+    assert snapshot["min"] == 20.0
+    assert snapshot["max"] == 24.0
+
+
+def test_update_replaces_previous_reading():
+    """Test a new reading replaces the box's previous value"""
+    state = AggregateState(max_age_seconds=3600)
+    now = time.time()
+
+    state.update("a", 20.0, now - 10, now=now)
+    state.update("b", 30.0, now - 10, now=now)
+    state.update("a", 26.0, now, now=now)
+    snapshot = state.snapshot(now=now)
+
+    assert snapshot["count"] == 2
+    assert snapshot["mean"] == 28.0
+    assert snapshot["min"] == 26.0
+
+
+def test_update_ignores_older_reading():
+    """Test an out-of-order older reading does not overwrite a newer one"""
+    state = AggregateState(max_age_seconds=3600)
+    now = time.time()
+
+    state.update("a", 20.0, now, now=now)
+    assert state.update("a", 99.0, now - 60, now=now) is False
+
+    assert state.get("a") == (20.0, now)
+
+
+def test_update_rejects_expired_reading():
+    """Test readings older than max age are not kept"""
+    state = AggregateState(max_age_seconds=60)
+    now = time.time()
+
+    assert state.update("a", 20.0, now - 120, now=now) is False
+    assert len(state) == 0
+
+
+def test_expire_removes_old_readings():
+    """Test readings expire once older than max age"""
+    state = AggregateState(max_age_seconds=60)
+    now = time.time()
+
+    state.update("old", 10.0, now - 50, now=now)
+    state.update("new", 30.0, now, now=now)
+    snapshot = state.snapshot(now=now + 30)
+
+    assert snapshot["count"] == 1
+    assert snapshot["mean"] == 30.0
+    assert snapshot["min"] == 30.0
+    assert "old" not in state
+
+
+def test_remove_last_box_resets_sum():
+    """Test removing every box leaves an empty aggregate"""
+    state = AggregateState(max_age_seconds=60)
+    now = time.time()
+
+    state.update("a", 0.1, now, now=now)
+    state.remove("a")
+    snapshot = state.snapshot(now=now)
+
+    assert snapshot == {
+        "count": 0,
+        "sum": 0.0,
+        "mean": 0.0,
+        "min": 0.0,
+        "max": 0.0,
+        "refreshed_at": None,
+    }
+
+
+def test_storage_stays_bounded_under_polling():
+    """Test continuous updates and expiry reuse storage instead of growing it"""
+    state = AggregateState(max_age_seconds=60)
+    now = time.time()
+
+    for i in range(5000):
+        state.update(f"box{i % 1500}", float(i), now + i, now=now + i)
+        state.expire(now + i)
+
+    assert state._readings.capacity <= 2048
+    assert state.snapshot(now=now + 4999)["max"] == 4999.0
+
+
+def test_is_warm():
+    """Test warmness depends on refresh time and content"""
+    state = AggregateState(max_age_seconds=3600)
+    now = time.time()
+
+    state.mark_refreshed(now)
+    assert state.is_warm(300, now=now) is False
+
+    state.update("a", 20.0, now, now=now)
+    assert state.is_warm(300, now=now + 10) is True
+    assert state.is_warm(300, now=now + 301) is False
+
+
+@pytest.mark.asyncio
+async def test_fetch_temperature_data_feeds_state():
+    """Test fetched readings are recorded in the aggregate state"""
+    box_data = {
+        "sensors": [
+            {
+                "title": settings.TEMPERATURE_PHENOMENON,
+                "lastMeasurement": {
+                    "value": "21.0",
+                    "createdAt": datetime.now(timezone.utc).isoformat(),
+                },
+            }
+        ]
+    }
+
+    with patch(
+        "app.services.opensensemap.fetch_box_data",
+        new=AsyncMock(return_value=box_data),
+    ):
+        result = await fetch_temperature_data()
+
+    assert {item["box_id"] for item in result} == set(settings.SENSEBOX_IDS)
+    assert len(aggregate_state) == len(set(settings.SENSEBOX_IDS))
+    assert calculate_state_average() == 21.0
+    assert aggregate_state.refreshed_at is not None
+
+
+def test_temperature_endpoint_serves_warm_state():
+    """Test /temperature reads the running aggregate without refetching"""
+    now = time.time()
+    aggregate_state.update("a", 20.0, now)
+    aggregate_state.update("b", 22.0, now)
+    aggregate_state.mark_refreshed()
+
+    fetch = AsyncMock()
+    with patch("app.routers.temperature.fetch_temperature_data", new=fetch):
+        response = client.get("/temperature")
+
+    assert response.status_code == 200
+    assert response.json()["average_temperature"] == 21.0
+    assert response.json()["samples"] == 2
+    fetch.assert_not_called()
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.config.settings import Settings
+from app.services.aggregation import (
+    aggregate,
+    mad_inlier_mask,
+    to_array,
+    trimmed_mean,
+)
+from app.services.opensensemap import calculate_average_temperature
+
+
+def test_to_array_is_contiguous_float():
+    """Test conversion of measurement dicts to a float64 array"""
+    data = [{"value": 20.0}, {"value": 21.5}]
+    values = to_array(data)
+
+    assert values.dtype == np.float64
+    assert values.flags["C_CONTIGUOUS"]
+    assert values.tolist() == [20.0, 21.5]
+
+
+def test_mad_inlier_mask_flags_broken_sensor():
+    """Test that a single broken sensor is rejected"""
+    values = np.array([20.0, 21.0, 20.5, 19.5, 85.0])
+    mask = mad_inlier_mask(values, threshold=3.5)
+
+    assert mask.tolist() == [True, True, True, True, False]
+
+
+def test_mad_inlier_mask_identical_values():
+    """Test that identical samples are all inliers"""
+    values = np.full(5, 20.0)
+
+    assert mad_inlier_mask(values, threshold=3.5).all()
+
+
+def test_mad_inlier_mask_zero_mad_fallback():
+    """Test outlier detection when more than half the samples are identical"""
+    values = np.array([20.0, 20.0, 20.0, 20.0, 60.0])
+    mask = mad_inlier_mask(values, threshold=3.5)
+
+    assert mask.tolist() == [True, True, True, True, False]
+
+
+def test_trimmed_mean():
+    """Test trimmed mean cuts both tails"""
+    values = np.array([1.0, 10.0, 11.0, 12.0, 100.0])
+
+    assert trimmed_mean(values, 0.2) == 11.0
+    assert trimmed_mean(np.array([]), 0.2) == 0.0
+
+
+@pytest.mark.parametrize(
+    "method,expected",
+    [
+        pytest.param("mean", 33.0, id="mean"),
+        pytest.param("median", 21.0, id="median"),
+        pytest.param("trimmed_mean", 21.0, id="trimmed_mean"),
+    ],
+)
+def test_aggregate_methods(method, expected):
+    """Test each configured aggregation method"""
+    values = np.array([20.0, 21.0, 22.0, 19.0, 83.0])
+
+    with patch("app.services.aggregation.settings.TRIM_PROPORTION", 0.2):
+        assert aggregate(values, method) == pytest.approx(expected)
+
+
+def test_settings_reject_unknown_aggregation_method(monkeypatch):
+    """Test an invalid AGGREGATION_METHOD fails at startup, not per request"""
+    monkeypatch.setenv("AGGREGATION_METHOD", "mode")
+
+    with pytest.raises(ValueError, match="AGGREGATION_METHOD"):
+        Settings()
+
+
+def test_aggregate_unknown_method():
+    """Test that an unknown method is rejected"""
+    with pytest.raises(ValueError, match="Unknown aggregation method"):
+        aggregate(np.array([20.0]), "mode")
+
+
+def test_calculate_average_temperature_rejects_outliers():
+    """Test average ignores a broken sensor when rejection is enabled"""
+    data = [{"value": v} for v in (20.0, 21.0, 22.0, 21.0, 999.0)]
+
+    with patch("app.services.aggregation.settings.OUTLIER_REJECTION", True):
+        assert calculate_average_temperature(data) == 21.0
@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.config import settings
+from app.services.aggregate_state import aggregate_state
+from app.services.anomaly import AnomalyDetector
+from app.services.opensensemap import fetch_boxes
+
+
+def warm_up(detector, box_id="a", value=20.0, readings=20):
+    for i in range(readings):
+        assert detector.observe(box_id, value + (i % 2) * 0.2, float(i)) is False
+    return float(readings)
+
+
+def test_spike_flagged_without_moving_baseline():
+    """Test an outlier is flagged and does not shift the box's mean"""
+    detector = AnomalyDetector()
+    t = warm_up(detector)
+    mean = float(detector.mean[detector._index["a"]])
+
+    assert detector.observe("a", 45.0, t) is True
+    assert detector.is_flagged("a")
+    assert detector.flagged_count == 1
+    assert float(detector.mean[detector._index["a"]]) == mean
+
+    assert detector.observe("a", 20.1, t + 1) is False
+    assert detector.flagged_count == 0
+
+
+def test_no_flags_during_warmup():
+    """Test a box is not judged before it has enough history"""
+    detector = AnomalyDetector()
+    detector.observe("a", 20.0, 1.0)
+
+    assert detector.observe("a", 45.0, 2.0) is False
+
+
+def test_repeated_measurement_not_counted_twice():
+    """Test re-polling the same measurement keeps its flag without rescoring"""
+    detector = AnomalyDetector()
+    t = warm_up(detector)
+
+    assert detector.observe("a", 45.0, t) is True
+    for _ in range(settings.ANOMALY_RESET_AFTER + 1):
+        assert detector.observe("a", 45.0, t) is True
+    assert int(detector.streak[detector._index["a"]]) == 1
+
+
+def test_persistent_shift_becomes_new_baseline():
+    """Test a sustained level change stops being flagged"""
+    detector = AnomalyDetector()
+    t = warm_up(detector)
+
+    flags = [detector.observe("a", 30.0, t + i) for i in range(settings.ANOMALY_RESET_AFTER)]
+
+    assert flags[:-1] == [True] * (settings.ANOMALY_RESET_AFTER - 1)
+    assert flags[-1] is False
+    assert float(detector.mean[detector._index["a"]]) == 30.0
+
+
+def test_many_boxes_share_preallocated_columns():
+    """Test thousands of boxes fit without per-reading growth"""
+    detector = AnomalyDetector(capacity=4096)
+    for i in range(4000):
+        detector.observe(f"box{i}", 20.0, 1.0)
+        detector.observe(f"box{i}", 20.5, 2.0)
+
+    assert detector.capacity == 4096
+    assert len(detector) == 4000
+
+
+@pytest.mark.asyncio
+async def test_fetch_boxes_excludes_flagged_readings():
+    """Test anomalous readings are marked in the box cache and left out of the aggregate"""
+    detector = AnomalyDetector()
+    box_id = "5eba5fbad46fb8001b799786"
+    warm_up(detector, box_id, readings=20)
+    now = datetime.now(timezone.utc)
+    box_data = {
+        "sensors": [
+            {
+                "title": settings.TEMPERATURE_PHENOMENON,
+                "lastMeasurement": {"value": "60.0", "createdAt": now.isoformat()},
+            }
+        ]
+    }
+    store = AsyncMock()
+
+    with patch("app.services.anomaly.anomaly_detector", detector), patch(
+        "app.services.anomaly.settings.ANOMALY_EXCLUDE", True
+    ), patch(
+        "app.services.opensensemap.fetch_box_data", new=AsyncMock(return_value=box_data)
+    ), patch(
+        "app.services.opensensemap.store_readings", new=store
+    ):
+        result = await fetch_boxes([box_id])
+
+    assert result == []
+    assert box_id not in aggregate_state
+    assert store.await_args.args[0][0]["status"] == "anomaly"
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import json
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+import redis.asyncio as redis
+from minio.error import S3Error
+
+from app.services import archive
+
+
+class FakeMinio:
+    """In-memory stand-in for the MinIO calls used by compaction"""
+
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.metadata: dict[str, dict] = {}
+        self.gets = 0
+        self.lists = 0
+
+    def list_objects(self, bucket, prefix="", recursive=False):
+        self.lists += 1
+        return [
+            SimpleNamespace(object_name=name, etag=f'"{self.etag(name)}"')
+            for name in sorted(self.objects)
+            if name.startswith(prefix)
+        ]
+
+    def get_object(self, bucket, name):
+        self.gets += 1
+        if name not in self.objects:
+            raise S3Error(MagicMock(), "NoSuchKey", "missing", name, "", "")
+        return SimpleNamespace(
+            read=io.BytesIO(self.objects[name]).read,
+            headers={"ETag": f'"{self.etag(name)}"'},
+            close=lambda: None,
+            release_conn=lambda: None,
+        )
+
+    def etag(self, name):
+        return hashlib.md5(self.objects[name]).hexdigest()
+
+    def put_object(self, bucket, name, data, length, content_type=None, metadata=None):
+        self.objects[name] = data.read()
+        self.metadata[name] = metadata or {}
+
+    def remove_objects(self, bucket, delete_objects):
+        for obj in delete_objects:
+            self.objects.pop(obj.name, None)
+        return iter(())
+
+    def add_sample(self, stamp: str, value: float, samples: int = 3):
+        payload = {"average_temperature": value, "samples": samples}
+        self.objects[f"temperature/{stamp}.json"] = json.dumps(payload).encode()
+
+
+def epoch(stamp: str) -> float:
+    return datetime.fromisoformat(stamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+@pytest.mark.asyncio
+async def test_compact_merges_closed_days_only():
+    """Test closed days become one archive and today's samples are left alone"""
+    client = FakeMinio()
+    client.add_sample("2026-01-01T10:05:00.000001", 20.0)
+    client.add_sample("2026-01-01T10:00:00", 22.0)
+    client.add_sample("2026-01-02T12:00:00", 24.0)
+
+    result = await archive.compact(client, now=epoch("2026-01-02T12:30:00"))
+
+    assert result == {date(2026, 1, 1): 2}
+    assert sorted(client.objects) == [
+        "archive/temperature/2026-01-01.npz",
+        "temperature/2026-01-02T12:00:00.json",
+    ]
+    columns = archive.load_day(client, date(2026, 1, 1))
+    assert columns["average_temperature"].tolist() == [22.0, 20.0]
+    assert columns["samples"].tolist() == [3, 3]
+    assert client.metadata["archive/temperature/2026-01-01.npz"]["mean"] == "21.00"
+
+
+@pytest.mark.asyncio
+async def test_compact_is_idempotent_after_interruption():
+    """Test a rerun with leftover originals does not duplicate rows"""
+    client = FakeMinio()
+    client.add_sample("2026-01-01T10:00:00", 22.0)
+    client.add_sample("2026-01-01T11:00:00", 23.0)
+    leftovers = dict(client.objects)
+    await archive.compact(client, now=epoch("2026-01-03T00:00:00"))
+
+    # Simulate a crash after the archive was written but before deletion,
+    # plus a late writer adding one more sample.
+    client.objects.update(leftovers)
+    client.add_sample("2026-01-01T12:00:00", 24.0)
+    result = await archive.compact(client, now=epoch("2026-01-03T00:00:00"))
+
+    assert result == {date(2026, 1, 1): 3}
+    assert list(client.objects) == ["archive/temperature/2026-01-01.npz"]
+
+
+def lock_valkey(acquired=True):
+    valkey = MagicMock()
+    valkey.set = AsyncMock(return_value=acquired)
+    valkey.evalsha = AsyncMock(return_value=1)
+    return valkey
+
+
+@pytest.mark.asyncio
+async def test_compact_holds_day_lock_and_releases_it():
+    """Test a day is compacted under its lock, which is released afterwards"""
+    client = FakeMinio()
+    client.add_sample("2026-01-01T10:00:00", 22.0)
+    valkey = lock_valkey()
+    with patch.object(archive, "_lock_client", valkey):
+        result = await archive.compact(client, now=epoch("2026-01-03T00:00:00"))
+
+    assert result == {date(2026, 1, 1): 1}
+    key, token = valkey.set.await_args.args
+    assert key == f"{archive.LOCK_PREFIX}2026-01-01"
+    assert valkey.set.await_args.kwargs["nx"] is True
+    assert valkey.evalsha.await_args.args[-2:] == (key, token)
+
+
+@pytest.mark.asyncio
+async def test_compact_skips_days_locked_elsewhere():
+    """Test a day held by another writer, or without Valkey, is left for later"""
+    client = FakeMinio()
+    client.add_sample("2026-01-01T10:00:00", 22.0)
+    unreachable = lock_valkey()
+    unreachable.set.side_effect = redis.ConnectionError("down")
+
+    for valkey in (lock_valkey(acquired=None), unreachable):
+        with patch.object(archive, "_lock_client", valkey):
+            assert await archive.compact(client, now=epoch("2026-01-03T00:00:00")) == {}
+        valkey.evalsha.assert_not_awaited()
+    assert list(client.objects) == ["temperature/2026-01-01T10:00:00.json"]
+
+
+@pytest.mark.asyncio
+async def test_compact_relists_sources_under_lock():
+    """Test sources compacted by another writer before the lock are not reread"""
+    client = FakeMinio()
+    client.add_sample("2026-01-01T10:00:00", 22.0)
+    valkey = lock_valkey()
+
+    async def compacted_elsewhere(*args, **kwargs):
+        # Another replica finishes the day while this one takes the lock.
+        archive.compact_day(client, date(2026, 1, 1), ["temperature/2026-01-01T10:00:00.json"])
+        return True
+
+    valkey.set.side_effect = compacted_elsewhere
+    with patch.object(archive, "_lock_client", valkey):
+        result = await archive.compact(client, now=epoch("2026-01-03T00:00:00"))
+
+    assert result == {}
+    assert list(client.objects) == ["archive/temperature/2026-01-01.npz"]
+
+
+def test_downsample_weights_by_samples():
+    """Test rows are combined into windows weighted by their sample counts"""
+    columns = {
+        "timestamp": np.array([epoch("2026-01-01T10:05:00"), epoch("2026-01-01T10:35:00"),
+                               epoch("2026-01-01T11:00:00")]),
+        "average_temperature": np.array([20.0, 24.0, 18.0]),
+        "samples": np.array([3, 1, 2], dtype=np.int32),
+    }
+
+    hourly = archive.downsample(columns, 3600)
+
+    assert hourly["timestamp"].tolist() == [epoch("2026-01-01T10:00:00"),
+                                            epoch("2026-01-01T11:00:00")]
+    assert hourly["average_temperature"].tolist() == [21.0, 18.0]
+    assert hourly["samples"].tolist() == [4, 2]
+    assert len(archive.downsample(archive.empty_columns(), 3600)["timestamp"]) == 0
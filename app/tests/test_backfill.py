@@ -0,0 +1,180 @@
+import time
+from datetime import date, datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import numpy as np
+
+from app.config import settings
+from app.services import archive, backfill
+from app.services.opensensemap import OpenSenseMapError
+from app.tests.test_archive import FakeMinio, epoch
+
+
+def test_aggregate_series_weights_boxes_equally():
+    """Test a box reporting often counts once per window, like a sparse one"""
+    dense = (np.array([epoch("2026-01-01T10:00:00") + i for i in range(10)]), np.full(10, 30.0))
+    sparse = (np.array([epoch("2026-01-01T10:01:00")]), np.array([20.0]))
+    later = (np.array([epoch("2026-01-01T10:10:00")]), np.array([21.234]))
+
+    columns = backfill.aggregate_series([dense, sparse, later, (np.empty(0), np.empty(0))], 300)
+
+    assert columns["timestamp"].tolist() == [
+        epoch("2026-01-01T10:00:00"),
+        epoch("2026-01-01T10:10:00"),
+    ]
+    assert columns["average_temperature"].tolist() == [25.0, 21.23]
+    assert columns["samples"].tolist() == [2, 1]
+
+
+async def test_fetch_measurements_splits_full_windows():
+    """Test a window at the upstream row limit is fetched again in halves"""
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.params["from-date"])
+        if len(requests) == 1:
+            row = {"createdAt": "2026-01-01T00:00:00Z", "value": "1"}
+            rows = [row] * backfill.MAX_MEASUREMENTS
+        else:
+            start = request.url.params["from-date"].replace("Z", "")
+            rows = [{"createdAt": f"{start}.000Z", "value": "20.5"}]
+        return httpx.Response(200, json=rows)
+
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    async with httpx.AsyncClient(transport=httpx.MockTransport(respond)) as client:
+        timestamps, values = await backfill.fetch_measurements(
+            client, "box", "sensor", start, datetime(2026, 1, 2, tzinfo=timezone.utc)
+        )
+
+    assert len(requests) == 3
+    assert timestamps.tolist() == [epoch("2026-01-01T00:00:00"), epoch("2026-01-01T12:00:00")]
+    assert values.tolist() == [20.5, 20.5]
+
+
+def fake_history(box_id, sensor_id, start, end):
+    """One reading per box at noon of every day in the window"""
+    days = np.arange(start.timestamp(), end.timestamp(), 86400) + 43200
+    return days, np.full(len(days), 20.0 if box_id == "a" else 22.0)
+
+
+async def test_backfill_merges_into_archive_and_resumes():
+    """Test days are merged under existing rows and skipped once checkpointed"""
+    client = FakeMinio()
+    noon = epoch("2026-01-02T12:00:00")
+    archive.write_day(
+        client,
+        date(2026, 1, 2),
+        {
+            "timestamp": np.array([noon]),
+            "average_temperature": np.array([18.0]),
+            "samples": np.array([5], dtype=np.int32),
+        },
+    )
+    fetch = AsyncMock(side_effect=lambda http, *args: fake_history(*args))
+
+    with (
+        patch.object(backfill, "temperature_sensor_id", AsyncMock(return_value="s")),
+        patch.object(backfill, "fetch_measurements", fetch),
+    ):
+        run = backfill.Backfill(client, ["a", "b"], date(2026, 1, 1), date(2026, 1, 3),
+                                chunk_days=2)
+        done = await run.run()
+        assert fetch.await_count == 4
+
+        rerun = backfill.Backfill(client, ["a", "b"], date(2026, 1, 1), date(2026, 1, 3))
+        assert await rerun.run() == done
+        assert fetch.await_count == 4
+
+    assert done == {date(2026, 1, 1), date(2026, 1, 2), date(2026, 1, 3)}
+    first = archive.load_day(client, date(2026, 1, 1))
+    assert first["average_temperature"].tolist() == [21.0]
+    assert first["samples"].tolist() == [2]
+    existing = archive.load_day(client, date(2026, 1, 2))
+    assert existing["average_temperature"].tolist() == [18.0]
+    assert existing["samples"].tolist() == [5]
+
+
+async def test_backfill_leaves_locked_days_unchecked():
+    """Test a day whose archive lock stays held elsewhere is not checkpointed"""
+    client = FakeMinio()
+    fetch = AsyncMock(side_effect=lambda http, *args: fake_history(*args))
+    valkey = MagicMock()
+    valkey.set = AsyncMock(return_value=None)
+
+    with (
+        patch.object(backfill, "temperature_sensor_id", AsyncMock(return_value="s")),
+        patch.object(backfill, "fetch_measurements", fetch),
+        patch.object(archive, "_lock_client", valkey),
+        patch.object(settings, "ARCHIVE_LOCK_TTL", 0),
+    ):
+        done = await backfill.Backfill(client, ["a"], date(2026, 1, 1), date(2026, 1, 1)).run()
+
+    assert done == set()
+    assert "archive/temperature/2026-01-01.npz" not in client.objects
+
+
+async def test_backfill_leaves_chunks_with_failed_boxes():
+    """Test a chunk missing any box is neither merged nor checkpointed"""
+    client = FakeMinio()
+
+    def flaky(http, box_id, sensor_id, start, end):
+        if box_id == "b" and start.date() == date(2026, 1, 2):
+            raise OpenSenseMapError("timeout")
+        if box_id == "a" and start.date() == date(2026, 1, 3):
+            raise ValueError("could not convert string to float: 'NaN?'")
+        return fake_history(box_id, sensor_id, start, end)
+
+    with (
+        patch.object(backfill, "temperature_sensor_id", AsyncMock(return_value="s")),
+        patch.object(backfill, "fetch_measurements", AsyncMock(side_effect=flaky)),
+    ):
+        done = await backfill.Backfill(client, ["a", "b"], date(2026, 1, 1), date(2026, 1, 3)).run()
+
+    assert done == {date(2026, 1, 1)}
+    assert sorted(name for name in client.objects if name.startswith("archive/")) == [
+        "archive/temperature/2026-01-01.npz"
+    ]
+
+
+async def test_backfill_stops_when_a_sensor_lookup_fails():
+    """Test nothing is merged while any box's sensor is unknown"""
+    client = FakeMinio()
+    lookup = AsyncMock(side_effect=["s", OpenSenseMapError("down")])
+    fetch = AsyncMock(side_effect=lambda http, *args: fake_history(*args))
+
+    with (
+        patch.object(backfill, "temperature_sensor_id", lookup),
+        patch.object(backfill, "fetch_measurements", fetch),
+    ):
+        done = await backfill.Backfill(client, ["a", "b"], date(2026, 1, 1), date(2026, 1, 1)).run()
+
+    assert done == set()
+    fetch.assert_not_awaited()
+
+
+async def test_checkpoints_are_written_one_at_a_time_from_copies():
+    """Test concurrent chunks never share or reorder checkpoint writes"""
+    client = FakeMinio()
+    fetch = AsyncMock(side_effect=lambda http, *args: fake_history(*args))
+    written = []
+    active = []
+
+    def save(minio, start, end, done):
+        active.append(done)
+        assert len(active) == 1
+        time.sleep(0.01)
+        written.append(sorted(done))
+        active.pop()
+
+    with (
+        patch.object(backfill, "temperature_sensor_id", AsyncMock(return_value="s")),
+        patch.object(backfill, "fetch_measurements", fetch),
+        patch.object(backfill, "save_checkpoint", save),
+    ):
+        run = backfill.Backfill(client, ["a"], date(2026, 1, 1), date(2026, 1, 4), concurrency=4)
+        done = await run.run()
+
+    assert len(written) == 4
+    assert [len(days) for days in written] == sorted(len(days) for days in written)
+    assert written[-1] == sorted(done)
@@ -0,0 +1,168 @@
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import redis.asyncio as redis
+
+from app.services import box_cache
+from app.services.box_cache import (
+    READING_STRUCT,
+    bucket_key,
+    cached_average,
+    decode_reading,
+    encode_reading,
+    load_readings,
+    store_readings,
+)
+
+
+@pytest.fixture
+def box_client():
+    """Install a placeholder binary Valkey client"""
+    with patch("app.services.box_cache._box_cache_client", MagicMock()) as client:
+        yield client
+
+
+def test_encode_decode_round_trip():
+    """Test readings survive the 21-byte encoding"""
+    raw = encode_reading(21.5, 1000.0, 1005.0, "error")
+
+    assert len(raw) == READING_STRUCT.size == 21
+    assert decode_reading(raw) == {
+        "value": 21.5,
+        "measured_at": 1000.0,
+        "fetched_at": 1005.0,
+        "status": "error",
+    }
+
+
+def test_bucket_key_is_stable():
+    """Test a box always maps to the same bounded bucket"""
+    key = bucket_key("5eba5fbad46fb8001b799786")
+
+    assert key == bucket_key("5eba5fbad46fb8001b799786")
+    assert key.startswith("hivebox:boxes:")
+    assert 0 <= int(key.rsplit(":", 1)[1]) < 64
+
+
+@pytest.mark.asyncio
+async def test_store_readings_without_client():
+    """Test writes are skipped when no client is configured"""
+    with patch("app.services.box_cache._box_cache_client", None):
+        assert await store_readings([{"box_id": "a", "value": 1.0}]) is False
+
+
+@pytest.mark.asyncio
+async def test_store_readings_batches_and_sets_expiry(box_client):
+    """Test readings are written in one pipeline with freshness-based TTL"""
+    now = time.time()
+    pipeline = AsyncMock(return_value=[])
+    readings = [
+        {"box_id": "a", "value": 20.0, "measured_at": now - 600},
+        {"box_id": "old", "value": 20.0, "measured_at": now - 10**7},
+    ]
+
+    with patch("app.services.box_cache.cache.pipeline", new=pipeline):
+        assert await store_readings(readings, now=now) is True
+
+    pipeline.assert_awaited_once()
+    commands = pipeline.await_args.args[1]
+    hset = [c for c in commands if c[0] == "hset"]
+    assert len(hset) == 1
+    assert list(hset[0][2]["mapping"]) == ["a"]
+    expires = [c for c in commands if c[0] == "expire"]
+    assert expires[0][2] == 3600 - 600 + 1
+    assert [c[3] for c in expires] == [{"nx": True}, {"gt": True}]
+
+
+@pytest.mark.asyncio
+async def test_store_readings_handles_redis_error(box_client):
+    """Test Valkey errors do not propagate"""
+    with patch(
+        "app.services.box_cache.cache.pipeline",
+        new=AsyncMock(side_effect=redis.RedisError("down")),
+    ):
+        readings = [{"box_id": "a", "value": 20.0, "measured_at": time.time()}]
+        assert await store_readings(readings) is False
+
+
+@pytest.mark.asyncio
+async def test_load_readings_subset_drops_expired(box_client):
+    """Test subset reads use HMGET and lazily delete expired fields"""
+    now = time.time()
+    fresh = encode_reading(21.0, now - 10, now)
+    stale = encode_reading(30.0, now - 10**7, now)
+    ids = ["a", "b", "c"]
+
+    async def fake_pipeline(client, commands):
+        if commands[0][0] == "hdel":
+            return [1]
+        replies = []
+        for _, _, fields in commands:
+            values = {"a": fresh, "b": stale, "c": None}
+            replies.append([values[f] for f in fields])
+        return replies
+
+    pipeline = AsyncMock(side_effect=fake_pipeline)
+    with patch("app.services.box_cache.cache.pipeline", new=pipeline):
+        readings = await load_readings(ids, now=now)
+
+    assert list(readings) == ["a"]
+    assert readings["a"]["value"] == 21.0
+    assert pipeline.await_count == 2
+    assert pipeline.await_args.args[1][0][0] == "hdel"
+
+
+@pytest.mark.asyncio
+async def test_load_readings_all_buckets(box_client):
+    """Test reading every box uses one HGETALL per bucket in one pipeline"""
+    now = time.time()
+    raw = encode_reading(22.0, now, now)
+    replies = [{} for _ in range(64)]
+    replies[0] = {b"x": raw}
+
+    pipeline = AsyncMock(return_value=replies)
+    with patch("app.services.box_cache.cache.pipeline", new=pipeline):
+        readings = await load_readings(now=now)
+
+    assert readings == {"x": decode_reading(raw)}
+    assert len(pipeline.await_args.args[1]) == 64
+
+
+@pytest.mark.asyncio
+async def test_cached_average_subset():
+    """Test the aggregate can be rebuilt from cached readings"""
+    now = time.time()
+    cached = {
+        "a": decode_reading(encode_reading(20.0, now, now)),
+        "b": decode_reading(encode_reading(24.0, now, now, "error")),
+    }
+
+    with patch("app.services.box_cache.load_readings", new=AsyncMock(return_value=cached)):
+        assert await cached_average(["a", "b"]) == (22.0, 2)
+
+    with patch("app.services.box_cache.load_readings", new=AsyncMock(return_value={})):
+        assert await cached_average() == (0.0, 0)
+
+
+@pytest.mark.asyncio
+async def test_scan_readings_walks_buckets_in_batches(box_client):
+    """Test the scan resumes within a bucket and skips expired fields"""
+    now = time.time()
+    replies = {
+        (0, 0): (7, {b"a": encode_reading(20.0, now, now)}),
+        (0, 7): (0, {b"b": encode_reading(21.0, now - 7200, now)}),
+        (1, 0): (0, {b"c": encode_reading(22.0, now, now, "error")}),
+    }
+
+    async def hscan(client, name, key, cursor, match, count):
+        bucket = int(key.rsplit(":", 1)[1])
+        return replies.get((bucket, cursor), (0, {}))
+
+    with patch("app.services.box_cache.settings.BOX_CACHE_BUCKETS", 2):
+        with patch("app.services.box_cache.cache.command", new=hscan):
+            batches = [batch async for batch in box_cache.scan_readings(now=now)]
+
+    assert [position for position, _ in batches] == [(0, 7), (1, 0), None]
+    assert [list(readings) for _, readings in batches] == [["a"], [], ["c"]]
+    assert batches[2][1]["c"]["status"] == "error"
@@ -0,0 +1,98 @@
+import json
+import time
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routers.boxes import decode_cursor, encode_cursor
+
+client = TestClient(app)
+
+
+def fake_scan(batches):
+    """Build a scan_readings replacement yielding fixed batches from a position"""
+
+    async def scan(bucket=0, cursor=0, count=256, now=None):
+        for position, readings in batches:
+            if position is not None and position <= (bucket, cursor):
+                continue
+            yield position, readings
+
+    return scan
+
+
+def reading(value, age, status="ok"):
+    now = time.time()
+    return {
+        "value": value,
+        "measured_at": now - age,
+        "fetched_at": now,
+        "status": status,
+    }
+
+
+BATCHES = [
+    ((1, 0), {"a": reading(20.0, 10), "b": reading(21.0, 1800, "error")}),
+    ((2, 0), {"c": reading(22.0, 60)}),
+    (None, {"d": reading(23.0, 30)}),
+]
+
+
+def test_cursor_round_trip():
+    """Test cursor tokens decode to the position they encode"""
+    assert decode_cursor(encode_cursor((12, 345))) == (12, 345)
+    assert encode_cursor(None) is None
+
+
+def test_box_readings_unavailable_without_cache():
+    """Test /boxes/readings returns 503 without a box cache"""
+    with patch("app.routers.boxes.get_box_cache_client", return_value=None):
+        response = client.get("/boxes/readings")
+
+    assert response.status_code == 503
+
+
+def test_box_readings_paginates_with_cursor():
+    """Test JSON pages stop once the limit is reached and resume from the cursor"""
+    with patch("app.routers.boxes.get_box_cache_client", return_value=MagicMock()):
+        with patch("app.routers.boxes.scan_readings", new=fake_scan(BATCHES)):
+            first = client.get("/boxes/readings", params={"limit": 2}).json()
+            second = client.get(
+                "/boxes/readings", params={"limit": 2, "cursor": first["next_cursor"]}
+            ).json()
+
+    assert [item["box_id"] for item in first["readings"]] == ["a", "b"]
+    assert [item["box_id"] for item in second["readings"]] == ["c", "d"]
+    assert second["next_cursor"] is None
+
+
+def test_box_readings_filters():
+    """Test freshness and status filters"""
+    with patch("app.routers.boxes.get_box_cache_client", return_value=MagicMock()):
+        with patch("app.routers.boxes.scan_readings", new=fake_scan(BATCHES)):
+            fresh = client.get("/boxes/readings", params={"max_age": 120}).json()
+            errors = client.get("/boxes/readings", params={"status": "error"}).json()
+
+    assert sorted(item["box_id"] for item in fresh["readings"]) == ["a", "c", "d"]
+    assert [item["box_id"] for item in errors["readings"]] == ["b"]
+
+
+def test_box_readings_rejects_bad_cursor():
+    """Test malformed cursors return 400"""
+    with patch("app.routers.boxes.get_box_cache_client", return_value=MagicMock()):
+        response = client.get("/boxes/readings", params={"cursor": "!!"})
+
+    assert response.status_code == 400
+
+
+def test_box_readings_ndjson_stream():
+    """Test NDJSON output has one reading per line"""
+    with patch("app.routers.boxes.get_box_cache_client", return_value=MagicMock()):
+        with patch("app.routers.boxes.scan_readings", new=fake_scan(BATCHES)):
+            response = client.get("/boxes/readings", params={"format": "ndjson"})
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["box_id"] for line in lines] == ["a", "b", "c", "d"]
+    assert lines[0]["age"] >= 10
@@ -0,0 +1,133 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from app.routers.temperature import refresh_temperature, stream_temperature
+from app.services.broadcast import BroadcastHub, SubscriberLimitError
+from app.tests.test_temperature import fetches
+
+
+def parse_frame(frame: bytes) -> dict:
+    """Decode an SSE data frame"""
+    assert frame.startswith(b"data: ")
+    return json.loads(frame[len(b"data: ") :])
+
+
+def test_publish_skips_unchanged_payload():
+    """Test identical updates are broadcast only once"""
+    hub = BroadcastHub()
+
+    assert hub.publish({"average_temperature": 20.0}) is True
+    assert hub.publish({"average_temperature": 20.0}) is False
+    assert hub.publish({"average_temperature": 21.0}) is True
+
+
+@pytest.mark.asyncio
+async def test_subscribe_receives_latest_then_updates():
+    """Test a subscriber gets the current value and later updates"""
+    hub = BroadcastHub()
+    hub.publish({"average_temperature": 20.0})
+
+    stream = hub.subscribe()
+    first = await anext(stream)
+    assert parse_frame(first)["average_temperature"] == 20.0
+    assert hub.subscriber_count == 1
+
+    pending = asyncio.ensure_future(anext(stream))
+    await asyncio.sleep(0)
+    hub.publish({"average_temperature": 22.0})
+    assert parse_frame(await pending)["average_temperature"] == 22.0
+
+    await stream.aclose()
+    assert hub.subscriber_count == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_skips_to_newest():
+    """Test a slow consumer does not buffer intermediate updates"""
+    hub = BroadcastHub()
+    stream = hub.subscribe()
+    pending = asyncio.ensure_future(anext(stream))
+    await asyncio.sleep(0)
+
+    for value in range(100):
+        hub.publish({"average_temperature": float(value)})
+
+    assert parse_frame(await pending)["average_temperature"] == 99.0
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_subscribe_keepalive():
+    """Test idle streams receive a keepalive comment"""
+    hub = BroadcastHub()
+    stream = hub.subscribe(keepalive=0.01)
+
+    assert await anext(stream) == b": keepalive\n\n"
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_subscriber_limit():
+    """Test subscribers beyond the limit are rejected"""
+    hub = BroadcastHub(max_subscribers=1)
+    hub.publish({"average_temperature": 20.0})
+    first = hub.subscribe()
+    await anext(first)
+
+    assert hub.is_full()
+    with pytest.raises(SubscriberLimitError):
+        await anext(hub.subscribe())
+    await first.aclose()
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_returns_event_stream():
+    """Test /temperature/stream responds with an SSE stream"""
+    response = await stream_temperature()
+
+    assert response.media_type == "text/event-stream"
+    assert response.headers["cache-control"] == "no-cache"
+    await response.background()
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_reserves_before_streaming():
+    """Test the subscriber slot is taken when the endpoint returns, not on first read"""
+    hub = BroadcastHub(max_subscribers=1)
+    with patch("app.routers.temperature.temperature_hub", hub):
+        response = await stream_temperature()
+        with pytest.raises(HTTPException) as exc_info:
+            await stream_temperature()
+        assert exc_info.value.status_code == 503
+
+        await response.background()
+        assert hub.subscriber_count == 0
+        await (await stream_temperature()).background()
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_rejects_when_full():
+    """Test /temperature/stream returns 503 at the subscriber limit"""
+    with patch("app.routers.temperature.temperature_hub.is_full", return_value=True):
+        with pytest.raises(HTTPException) as exc_info:
+            await stream_temperature()
+
+    assert exc_info.value.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_refresh_temperature_publishes_result():
+    """Test refreshed aggregates are broadcast to the hub"""
+    hub = BroadcastHub()
+
+    with patch("app.routers.temperature.fetch_temperature_data", new=fetches(20.0)):
+        with patch("app.routers.temperature.temperature_hub", hub):
+            with patch("app.routers.temperature._valkey_client", None):
+                result = await refresh_temperature(use_state=False)
+
+    assert parse_frame(hub.latest) == json.loads(json.dumps(result))
+    assert result["average_temperature"] == 20.0
@@ -0,0 +1,103 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from redis.exceptions import NoScriptError
+
+from app.services import cache
+
+
+def make_pipeline_client(results):
+    """Build a client whose pipeline returns the given results"""
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=results)
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=None)
+    client = MagicMock()
+    client.pipeline.return_value = pipe
+    return client, pipe
+
+
+def test_create_valkey_client_uses_bounded_pool():
+    """Test the client is backed by a bounded blocking pool"""
+    client = cache.create_valkey_client()
+
+    assert client.connection_pool.max_connections == 50
+
+
+@pytest.mark.asyncio
+async def test_get_with_ttl_single_round_trip():
+    """Test GET and TTL are sent in one pipeline"""
+    client, pipe = make_pipeline_client(['{"a": 1}', 120])
+
+    value, ttl = await cache.get_with_ttl(client, "temperature_data")
+
+    assert (value, ttl) == ('{"a": 1}', 120)
+    client.pipeline.assert_called_once_with(transaction=False)
+    pipe.get.assert_called_once_with("temperature_data")
+    pipe.ttl.assert_called_once_with("temperature_data")
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_batches_commands():
+    """Test arbitrary commands share one round trip"""
+    client, pipe = make_pipeline_client(["x", "y"])
+
+    result = await cache.pipeline(client, [("hget", "k", "a"), ("hget", "k", "b")])
+
+    assert result == ["x", "y"]
+    assert pipe.hget.call_count == 2
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_passes_keyword_arguments():
+    """Test a trailing Kwargs element becomes keyword arguments"""
+    client, pipe = make_pipeline_client([True])
+
+    await cache.pipeline(client, [("expire", "k", 60, cache.Kwargs(nx=True))])
+
+    pipe.expire.assert_called_once_with("k", 60, nx=True)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_and_mget_empty():
+    """Test empty batches skip the round trip"""
+    client = MagicMock()
+
+    assert await cache.pipeline(client, []) == []
+    assert await cache.mget(client, []) == []
+    client.pipeline.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_setex_and_get_record_latency():
+    """Test commands are timed into the latency histogram"""
+    from prometheus_client import REGISTRY
+
+    client = AsyncMock()
+    client.get.return_value = "v"
+
+    await cache.setex(client, "k", 60, "v")
+    assert await cache.get(client, "k") == "v"
+
+    client.set.assert_awaited_once_with("k", "v", ex=60)
+    count = REGISTRY.get_sample_value(
+        "hivebox_valkey_command_duration_seconds_count", {"command": "get"}
+    )
+    assert count >= 1
+
+
+@pytest.mark.asyncio
+async def test_script_sends_body_only_when_unknown():
+    """Test scripts run by SHA1 and are loaded once after NOSCRIPT"""
+    client = MagicMock()
+    client.evalsha = AsyncMock(side_effect=[NoScriptError("NOSCRIPT"), 1, 2])
+    client.script_load = AsyncMock()
+
+    assert await cache.script(client, "return 1", ["k"], [5]) == 1
+    assert await cache.script(client, "return 1", ["k"], [5]) == 2
+
+    client.script_load.assert_awaited_once_with("return 1")
+    sha = client.evalsha.await_args.args[0]
+    assert client.evalsha.await_args.args == (sha, 1, "k", 5)
+    assert len(sha) == 40
@@ -0,0 +1,124 @@
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import history
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def history_client(monkeypatch):
+    """Install a placeholder Valkey client for history"""
+    monkeypatch.setattr(history, "_last_aggregate_at", float("-inf"))
+    with patch("app.services.history._history_client", MagicMock()) as mock:
+        yield mock
+
+
+@pytest.mark.asyncio
+async def test_record_without_client():
+    """Test history writes are skipped without a client"""
+    with patch("app.services.history._history_client", None):
+        assert await history.record(aggregate={"average_temperature": 1}) is False
+
+
+@pytest.mark.asyncio
+async def test_record_caps_streams(history_client):
+    """Test readings are appended to capped, trimmed streams"""
+    now = 1_700_000_000.0
+    pipeline = AsyncMock(return_value=[])
+
+    with patch("app.services.history.cache.pipeline", new=pipeline):
+        with patch("app.services.history.cache.script", new=AsyncMock(return_value=1)):
+            await history.record(
+                aggregate={"average_temperature": 21.5, "samples": 3},
+                readings=[{"box_id": "a", "value": 21.0, "measured_at": now}],
+                now=now,
+            )
+
+    commands = pipeline.await_args.args[1]
+    xadds = [c for c in commands if c[0] == "xadd"]
+    assert [c[1] for c in xadds] == ["hivebox:history:box:a"]
+    assert all(c[3]["maxlen"] == 1440 for c in xadds)
+    xtrim = next(c for c in commands if c[0] == "xtrim")
+    assert xtrim[2]["minid"] == str(int((now - 86400) * 1000))
+
+
+@pytest.mark.asyncio
+async def test_record_samples_aggregates(history_client):
+    """Test aggregates are written at most once per interval, through the sampling script"""
+    now = 1_700_000_000.0
+    script = AsyncMock(return_value=1)
+
+    with patch("app.services.history.cache.script", new=script):
+        for offset in (0, 10, 59, 60):
+            await history.record(
+                aggregate={"average_temperature": 21.5, "samples": 3}, now=now + offset
+            )
+
+    assert script.await_count == 2
+    _, source, keys, args = script.await_args.args
+    assert source == history.SAMPLE_AGGREGATE_SCRIPT
+    assert keys == [history.AGGREGATE_KEY]
+    assert args[:2] == [60_000, 1440]
+    assert args[4:] == ["average_temperature", 21.5, "samples", 3]
+
+
+@pytest.mark.asyncio
+async def test_recent_reads_window(history_client):
+    """Test recent history is read with one XRANGE from the window start"""
+    now = 1_700_000_000.0
+    entries = [
+        ("1699999000000-0", {"average_temperature": "21.5", "samples": "3"}),
+        ("1699999500000-0", {"average_temperature": "22.0", "samples": "3"}),
+    ]
+    command = AsyncMock(return_value=entries)
+
+    with patch("app.services.history.cache.command", new=command):
+        points = await history.recent(3600, now=now)
+
+    command.assert_awaited_once_with(
+        history_client, "xrange", history.AGGREGATE_KEY, "1699996400000", "+"
+    )
+    assert points == [
+        {"timestamp": 1699999000.0, "average_temperature": 21.5, "samples": 3},
+        {"timestamp": 1699999500.0, "average_temperature": 22.0, "samples": 3},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_recent_box_readings(history_client):
+    """Test a single box's readings can be read back"""
+    entries = [("1699999000000-0", {"value": "20.5", "measured_at": "1699998990.0"})]
+
+    with patch(
+        "app.services.history.cache.command", new=AsyncMock(return_value=entries)
+    ):
+        points = await history.recent(600, box_id="a")
+
+    assert points == [
+        {"timestamp": 1699999000.0, "value": 20.5, "measured_at": 1699998990.0}
+    ]
+
+
+def test_recent_endpoint():
+    """Test /temperature/recent returns points for the window"""
+    points = [{"timestamp": time.time(), "average_temperature": 21.0, "samples": 2}]
+
+    with patch(
+        "app.routers.temperature.history.recent", new=AsyncMock(return_value=points)
+    ):
+        response = client.get("/temperature/recent?window=600")
+
+    assert response.status_code == 200
+    assert response.json() == {"window": 600, "box_id": None, "points": points}
+
+
+def test_recent_endpoint_rejects_window_beyond_retention():
+    """Test windows longer than the retention are rejected"""
+    response = client.get("/temperature/recent?window=999999")
+
+    assert response.status_code == 400
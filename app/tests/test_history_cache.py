@@ -0,0 +1,151 @@
+import json
+from datetime import date, datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import archive, history_cache
+from app.services.registry import box_registry
+from app.tests.test_archive import FakeMinio, epoch
+
+client = TestClient(app)
+
+NOW = datetime(2026, 3, 10, 12, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def cache_client():
+    """Install a placeholder Valkey client for the history cache"""
+    with patch("app.services.history_cache._history_cache_client", MagicMock()) as mock:
+        yield mock
+
+
+async def test_put_past_range_without_expiry(cache_client):
+    """Test a range ending before today is stored without TTL under its read generations"""
+    script = AsyncMock(return_value=1)
+    with patch("app.services.history_cache.cache.script", new=script):
+        stored = await history_cache.put(
+            date(2026, 3, 1), date(2026, 3, 2), 3600, "v1", {"points": []}, ["0", "4"], now=NOW
+        )
+
+    assert stored is True
+    _, source, keys, argv = script.await_args.args
+    assert source == history_cache.PUT_SCRIPT
+    assert keys[0] == f"{history_cache.ENTRY_PREFIX}v1:2026-03-01:2026-03-02:3600"
+    assert keys[5:] == [
+        f"{history_cache.DAY_PREFIX}2026-03-01",
+        f"{history_cache.DAY_PREFIX}2026-03-02",
+    ]
+    assert argv[1] == 0
+    assert argv[4:] == ["2026-03-01", "0", "2026-03-02", "4"]
+
+
+async def test_put_range_reaching_today_expires(cache_client, monkeypatch):
+    """Test ranges that can still grow get a TTL and oversized results are skipped"""
+    script = AsyncMock(return_value=1)
+    with patch("app.services.history_cache.cache.script", new=script):
+        await history_cache.put(
+            date(2026, 3, 9), date(2026, 3, 10), 60, "v1", {"points": []}, ["0", "0"], now=NOW
+        )
+        assert script.await_args.args[3][1] == 60
+
+        monkeypatch.setattr(history_cache.settings, "HISTORY_QUERY_CACHE_MAX_BYTES", 10)
+        assert not await history_cache.put(
+            date(2026, 3, 1), date(2026, 3, 1), 60, "v1", {"points": [1, 2, 3]}, ["0"], now=NOW
+        )
+    assert script.await_count == 1
+
+
+async def test_generations_default_to_zero(cache_client):
+    """Test days never written read as generation 0"""
+    command = AsyncMock(return_value=[None, "2"])
+    with patch("app.services.history_cache.cache.command", new=command):
+        assert await history_cache.generations(date(2026, 3, 1), date(2026, 3, 2)) == ["0", "2"]
+    assert command.await_args.args[3] == ["2026-03-01", "2026-03-02"]
+
+
+async def test_invalidate_targets_written_days(cache_client):
+    """Test invalidation bumps and clears exactly the written days"""
+    script = AsyncMock(return_value=2)
+    with patch("app.services.history_cache.cache.script", new=script):
+        assert await history_cache.invalidate([date(2026, 3, 2), date(2026, 3, 1)])
+        assert not await history_cache.invalidate([])
+
+    _, source, keys, days = script.await_args.args
+    assert source == history_cache.INVALIDATE_SCRIPT
+    assert keys[-2:] == [
+        f"{history_cache.DAY_PREFIX}2026-03-01",
+        f"{history_cache.DAY_PREFIX}2026-03-02",
+    ]
+    assert days == ["2026-03-01", "2026-03-02"]
+
+
+def test_history_endpoint_serves_cached_result(cache_client):
+    """Test a cached result is returned without touching the archive"""
+    cached = {"start": "2026-03-01", "end": "2026-03-01", "resolution": 3600, "points": []}
+    pipeline = AsyncMock(return_value=[json.dumps(cached), 1])
+
+    with (
+        patch("app.services.history_cache.cache.pipeline", new=pipeline),
+        patch("app.routers.temperature.get_minio_client") as get_minio,
+    ):
+        response = client.get("/temperature/history?start=2026-03-01&end=2026-03-01")
+
+    assert response.status_code == 200
+    assert response.json() == cached
+    get_minio.assert_not_called()
+
+
+def test_history_cache_key_follows_box_registry(cache_client):
+    """Test a registry change makes the endpoint read a different cache entry"""
+    cached = {"start": "2026-03-01", "end": "2026-03-01", "resolution": 3600, "points": []}
+    pipeline = AsyncMock(return_value=[json.dumps(cached), 1])
+    keys = []
+
+    with patch("app.services.history_cache.cache.pipeline", new=pipeline):
+        for box_ids in (["a" * 24, "b" * 24], ["b" * 24, "a" * 24], ["a" * 24]):
+            with patch.object(box_registry, "_box_ids", dict.fromkeys(box_ids)):
+                client.get("/temperature/history?start=2026-03-01&end=2026-03-01")
+            keys.append(pipeline.await_args.args[1][0][1])
+
+    assert keys[0] == keys[1]
+    assert keys[0] != keys[2]
+
+
+def test_history_endpoint_reads_archive_and_caches(cache_client):
+    """Test a miss is read from the archive, downsampled and cached"""
+    minio = FakeMinio()
+    archive.write_day(
+        minio,
+        date(2026, 3, 1),
+        {
+            "timestamp": np.array([epoch("2026-03-01T10:00:00"), epoch("2026-03-01T10:30:00")]),
+            "average_temperature": np.array([20.0, 22.0]),
+            "samples": np.array([2, 2], dtype=np.int32),
+        },
+    )
+    put = AsyncMock(return_value=True)
+
+    with (
+        patch("app.services.history_cache.cache.pipeline", AsyncMock(return_value=[None, 0])),
+        patch("app.services.history_cache.cache.command", AsyncMock(return_value=["3"])),
+        patch("app.services.history_cache.put", new=put),
+        patch("app.routers.temperature.get_minio_client", return_value=minio),
+    ):
+        response = client.get("/temperature/history?start=2026-03-01&end=2026-03-01")
+
+    assert response.status_code == 200
+    assert response.json()["points"] == [
+        {"timestamp": epoch("2026-03-01T10:00:00"), "average_temperature": 21.0, "samples": 4}
+    ]
+    assert put.await_args.args[4] == response.json()
+    assert put.await_args.args[5] == ["3"]
+
+
+def test_history_endpoint_rejects_bad_ranges():
+    """Test inverted and overlong ranges are rejected"""
+    assert client.get("/temperature/history?start=2026-03-02&end=2026-03-01").status_code == 400
+    assert client.get("/temperature/history?start=2024-01-01&end=2026-01-01").status_code == 400
@@ -0,0 +1,33 @@
+from app.services.http_cache import cache_headers, is_not_modified, make_etag
+
+
+def test_make_etag_is_stable():
+    """Test identical bodies share an ETag and different bodies do not"""
+    assert make_etag('{"a": 1}') == make_etag(b'{"a": 1}')
+    assert make_etag('{"a": 1}') != make_etag('{"a": 2}')
+    assert make_etag('{"a": 1}').startswith('W/"')
+
+
+def test_cache_headers():
+    """Test freshness headers follow the remaining TTL"""
+    headers = cache_headers('"x"', 0, max_age=120, stale_while_revalidate=300)
+
+    assert headers["Last-Modified"] == "Thu, 01 Jan 1970 00:00:00 GMT"
+    assert headers["Cache-Control"] == "public, max-age=120, stale-while-revalidate=300"
+
+
+def test_is_not_modified_if_none_match():
+    """Test If-None-Match lists, weak tags and wildcards"""
+    assert is_not_modified({"if-none-match": '"a", W/"x"'}, '"x"', 0)
+    assert is_not_modified({"if-none-match": "*"}, '"x"', 0)
+    assert not is_not_modified({"if-none-match": '"a"'}, '"x"', 0)
+
+
+def test_is_not_modified_if_modified_since():
+    """Test If-Modified-Since is used only without If-None-Match"""
+    since = {"if-modified-since": "Thu, 01 Jan 1970 00:01:40 GMT"}
+
+    assert is_not_modified(since, '"x"', 100)
+    assert not is_not_modified(since, '"x"', 101)
+    assert not is_not_modified({**since, "if-none-match": '"a"'}, '"x"', 100)
+    assert not is_not_modified({"if-modified-since": "garbage"}, '"x"', 0)
@@ -0,0 +1,241 @@
+import json
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.config import settings
+from app.services.aggregate_state import aggregate_state
+from app.services.registry import box_registry
+from app.services.ingest import (
+    BINARY_CONTENT_TYPE,
+    IngestError,
+    encode_binary,
+    ingest_payload,
+    parse_binary,
+    parse_ndjson,
+)
+
+TOKEN = "1ngest"
+REGISTERED = ["a", "b", "ok", "hot", "stale", "future", "a" * 24, "b" * 24]
+
+client = TestClient(app, headers={"Authorization": f"Bearer {TOKEN}"})
+
+
+@pytest.fixture(autouse=True)
+def ingest_enabled(monkeypatch):
+    """Configure an ingest token and register the boxes used below"""
+    monkeypatch.setattr(settings, "INGEST_TOKEN", TOKEN)
+    box_registry.reset(REGISTERED)
+
+
+def ndjson(*items) -> bytes:
+    """Encode items as NDJSON"""
+    return "\n".join(json.dumps(item) for item in items).encode("utf-8")
+
+
+def test_parse_ndjson_counts_malformed_lines():
+    """Test malformed NDJSON lines are counted, not raised"""
+    now = time.time()
+    body = ndjson(
+        {"box_id": "a", "value": 20.5, "timestamp": now},
+        {"box_id": "b", "value": 21.0, "timestamp": "2026-01-01T00:00:00Z"},
+        {"box_id": "c", "value": "not a number", "timestamp": now},
+        {"value": 20.0, "timestamp": now},
+    ) + b"\n{broken\n\n"
+
+    box_ids, values, timestamps, malformed = parse_ndjson(body)
+
+    assert box_ids == ["a", "b"]
+    assert values.tolist() == [20.5, 21.0]
+    assert timestamps[0] == now
+    assert malformed == 3
+
+
+def test_parse_binary_round_trip():
+    """Test binary records decode to the packed readings"""
+    now = time.time()
+    body = encode_binary([("5eba5fbad46fb8001b799786", now, 22.5)])
+
+    box_ids, values, timestamps, malformed = parse_binary(body)
+
+    assert box_ids[0] == b"5eba5fbad46fb8001b799786"
+    assert values[0] == 22.5
+    assert timestamps[0] == now
+    assert malformed == 0
+
+
+def test_parse_binary_rejects_partial_record():
+    """Test truncated binary payloads are rejected"""
+    with pytest.raises(IngestError, match="multiple of 36 bytes"):
+        parse_binary(b"\x00" * 35)
+
+
+def test_ingest_payload_validates_ranges():
+    """Test out-of-range, stale and future readings are rejected"""
+    now = time.time()
+    body = ndjson(
+        {"box_id": "ok", "value": 20.0, "timestamp": now},
+        {"box_id": "hot", "value": 500.0, "timestamp": now},
+        {"box_id": "stale", "value": 20.0, "timestamp": now - 10**7},
+        {"box_id": "future", "value": 20.0, "timestamp": now + 3600},
+    )
+
+    accepted, rejected = ingest_payload(body, "application/x-ndjson")
+
+    assert (accepted, rejected) == (1, 3)
+    assert "ok" in aggregate_state
+    assert len(aggregate_state) == 1
+
+
+def test_ingest_payload_unsupported_type():
+    """Test unknown content types are rejected"""
+    with pytest.raises(IngestError, match="Unsupported content type"):
+        ingest_payload(b"{}", "application/json")
+
+
+def test_ingest_endpoint_ndjson():
+    """Test /ingest merges NDJSON readings into the aggregate"""
+    now = time.time()
+    body = ndjson(
+        {"box_id": "a", "value": 20.0, "timestamp": now},
+        {"box_id": "b", "value": 24.0, "timestamp": now},
+    )
+
+    response = client.post(
+        "/ingest", content=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "accepted": 2,
+        "rejected": 0,
+        "average_temperature": 22.0,
+    }
+
+
+def test_ingest_endpoint_binary():
+    """Test /ingest accepts packed binary readings"""
+    now = time.time()
+    body = encode_binary([("a" * 24, now, 20.0), ("b" * 24, now, 22.0)])
+
+    response = client.post(
+        "/ingest", content=body, headers={"Content-Type": BINARY_CONTENT_TYPE}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["accepted"] == 2
+    assert response.json()["average_temperature"] == 21.0
+
+
+def test_ingest_endpoint_unsupported_media_type():
+    """Test /ingest returns 415 for unknown content types"""
+    response = client.post(
+        "/ingest", content=b"{}", headers={"Content-Type": "application/json"}
+    )
+
+    assert response.status_code == 415
+
+
+def test_ingest_endpoint_bad_binary():
+    """Test /ingest returns 400 for truncated binary payloads"""
+    response = client.post(
+        "/ingest", content=b"\x00" * 10, headers={"Content-Type": BINARY_CONTENT_TYPE}
+    )
+
+    assert response.status_code == 400
+
+
+def test_ingest_endpoint_payload_too_large():
+    """Test /ingest enforces the maximum payload size"""
+    with patch("app.routers.ingest.settings.INGEST_MAX_BYTES", 10):
+        response = client.post(
+            "/ingest",
+            content=b"x" * 11,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 413
+
+
+def test_ingest_endpoint_caps_streamed_body():
+    """Test bodies without Content-Length are cut off at the size limit"""
+    with patch("app.routers.ingest.settings.INGEST_MAX_BYTES", 10):
+        response = client.post(
+            "/ingest",
+            content=iter([b"x" * 6, b"x" * 6]),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 413
+
+
+def test_ingest_endpoint_requires_token():
+    """Test /ingest is 401 without the token and 404 while it is unset"""
+    anonymous = TestClient(app)
+    body = ndjson({"box_id": "a", "value": 20.0, "timestamp": time.time()})
+    headers = {"Content-Type": "application/x-ndjson"}
+
+    assert anonymous.post("/ingest", content=body, headers=headers).status_code == 401
+    with patch("app.services.auth.settings.INGEST_TOKEN", ""):
+        assert client.post("/ingest", content=body, headers=headers).status_code == 404
+    assert "a" not in aggregate_state
+
+
+def test_ingest_payload_rejects_unregistered_boxes():
+    """Test readings for boxes outside the registry are dropped"""
+    now = time.time()
+    body = ndjson(
+        {"box_id": "a", "value": 20.0, "timestamp": now},
+        {"box_id": "stranger", "value": 30.0, "timestamp": now},
+    )
+
+    assert ingest_payload(body, "application/x-ndjson") == (1, 1)
+    assert "stranger" not in aggregate_state
+
+
+def test_ingest_drops_box_removed_through_admin():
+    """Test a box removed via /admin/boxes is rejected on its next push"""
+    box_id = "a" * 24
+    headers = {"Content-Type": "application/x-ndjson"}
+    admin = {"Authorization": "Bearer adm1n"}
+    body = ndjson({"box_id": box_id, "value": 20.0, "timestamp": time.time()})
+    assert client.post("/ingest", content=body, headers=headers).json()["accepted"] == 1
+
+    with (
+        patch("app.services.auth.settings.ADMIN_TOKEN", "adm1n"),
+        patch("app.services.registry._registry_client", None),
+        patch("app.routers.admin.forget_box", new=AsyncMock()),
+    ):
+        assert client.delete(f"/admin/boxes/{box_id}", headers=admin).status_code == 200
+
+    response = client.post("/ingest", content=body, headers=headers)
+    assert response.json()["accepted"] == 0
+    assert response.json()["rejected"] == 1
+    assert box_id not in aggregate_state
+
+
+def test_ingest_ignores_reading_older_than_current():
+    """Test an out-of-order reading is rejected and not cached or recorded"""
+    now = time.time()
+    headers = {"Content-Type": "application/x-ndjson"}
+    newer = ndjson({"box_id": "a", "value": 20.0, "timestamp": now})
+    older = ndjson({"box_id": "a", "value": 35.0, "timestamp": now - 60})
+
+    with (
+        patch("app.routers.ingest.store_readings", new=AsyncMock()) as store,
+        patch("app.routers.ingest.history.record", new=AsyncMock()) as record,
+    ):
+        assert client.post("/ingest", content=newer, headers=headers).json()["accepted"] == 1
+        response = client.post("/ingest", content=older, headers=headers)
+
+    assert response.json() == {"accepted": 0, "rejected": 1}
+    store.assert_awaited_once()
+    recorded = [call.kwargs["readings"] for call in record.await_args_list
+                if "readings" in call.kwargs]
+    assert recorded == [store.await_args.args[0]]
+    assert aggregate_state.get("a") == (20.0, now)
+    assert ingest_payload(older, "application/x-ndjson", sink=(sink := [])) == (0, 1)
+    assert sink == []
@@ -22,3 +22,80 @@ async def test_lifespan_startup():
         new=AsyncMock(return_value={"average_temperature": 20.5}),
     ):
         pass
+
+
+@pytest.mark.asyncio
+async def test_lifespan_does_not_wait_for_warmup():
+    """Test startup yields before slow MinIO and upstream calls finish"""
+    import asyncio
+    import time
+    from app.main import lifespan, startup_timings
+
+    async def slow_refresh(use_state=True):
+        await asyncio.sleep(5)
+        return {"average_temperature": 20.5}
+
+    with patch("app.main.refresh_temperature", new=slow_refresh):
+        with patch("app.main.setup_minio_bucket", new=AsyncMock()), patch(
+            "app.main.save_state", new=AsyncMock()
+        ):
+            started = time.perf_counter()
+            async with lifespan(app):
+                assert time.perf_counter() - started < 1
+            assert "clients" in startup_timings
+            assert "accepting_traffic" in startup_timings
+
+
+@pytest.mark.asyncio
+async def test_setup_minio_bucket_retries_until_available():
+    """Test bucket setup retries in the background after a failure"""
+    from unittest.mock import MagicMock
+    from app.main import setup_minio_bucket, startup_timings
+
+    mock_client = MagicMock()
+    mock_client.bucket_exists.side_effect = [Exception("down"), False]
+
+    with patch("app.main.get_minio_client", return_value=mock_client):
+        with patch("app.main.asyncio.sleep", new=AsyncMock()):
+            await setup_minio_bucket()
+
+    assert mock_client.bucket_exists.call_count == 2
+    mock_client.make_bucket.assert_called_once()
+    assert "minio_bucket" in startup_timings
+
+
+@pytest.mark.asyncio
+async def test_warm_cache_records_timing():
+    """Test the asynchronous warm-up records its duration"""
+    from app.main import warm_cache, startup_timings
+
+    with patch(
+        "app.main.refresh_temperature",
+        new=AsyncMock(return_value={"average_temperature": 20.5}),
+    ):
+        await warm_cache()
+
+    assert "cache_warmup" in startup_timings
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("slot, runs_singletons", [(0, True), (1, False)])
+async def test_archive_loops_run_in_worker_slot_zero_only(monkeypatch, slot, runs_singletons):
+    """Test only the first server worker writes and compacts the archive"""
+    from app.config import settings
+    from app.main import lifespan
+
+    monkeypatch.setattr(settings, "WORKER_SLOT", slot)
+    storage, compaction = AsyncMock(), AsyncMock()
+    with (
+        patch("app.main.periodic_storage", new=storage),
+        patch("app.main.periodic_compaction", new=compaction),
+        patch("app.main.warm_cache", new=AsyncMock()),
+        patch("app.main.setup_minio_bucket", new=AsyncMock()),
+        patch("app.main.save_state", new=AsyncMock()),
+    ):
+        async with lifespan(app):
+            pass
+
+    assert storage.called is runs_singletons
+    assert compaction.called is runs_singletons
@@ -1,5 +1,10 @@
+import os
+
 from fastapi.testclient import TestClient
+from prometheus_client import Gauge
+
 from app.main import app
+from app.routers import metrics
 
 client = TestClient(app)
 
@@ -42,3 +47,27 @@ def test_metrics_increments_on_temperature_call():
     content = response.text
 
     assert "hivebox_temperature_requests_total" in content
+
+
+def test_gauges_declare_multiprocess_mode():
+    """Test every gauge says how to merge its values across server workers"""
+    gauges = [value for value in vars(metrics).values() if isinstance(value, Gauge)]
+
+    assert gauges
+    assert all(gauge._multiprocess_mode != "all" for gauge in gauges)
+
+
+def test_reap_dead_processes_drops_only_exited_workers(tmp_path, monkeypatch):
+    """Test live gauge files of exited workers are removed, others kept"""
+    dead_pid = 2**22 + 1
+    for pid in (os.getpid(), dead_pid):
+        (tmp_path / f"gauge_livesum_{pid}.db").write_bytes(b"")
+        (tmp_path / f"counter_{pid}.db").write_bytes(b"")
+    monkeypatch.setenv(metrics.METRICS_DIR_ENV, str(tmp_path))
+
+    assert metrics.reap_dead_processes() == [dead_pid]
+    assert set(os.listdir(tmp_path)) == {
+        f"counter_{os.getpid()}.db",
+        f"counter_{dead_pid}.db",
+        f"gauge_livesum_{os.getpid()}.db",
+    }
@@ -1,6 +1,13 @@
+import threading
+
 import pytest
 from unittest.mock import MagicMock, patch
-from app.services.minio_storage import set_minio_client, store_temperature_data
+from app.services.minio_storage import (
+    replay_spool,
+    set_minio_client,
+    store_temperature_data,
+)
+from app.services.spool import Spool
 
 
 def test_set_minio_client():
@@ -31,3 +38,51 @@ async def test_store_temperature_data_no_client():
     with patch("app.services.minio_storage._minio_client", None):
         result = await store_temperature_data({"temperature": 20.5})
         assert result is False
+
+
+@pytest.mark.asyncio
+async def test_store_temperature_data_spools_on_failure(tmp_path):
+    """Test failed writes are spooled and replayed once MinIO recovers"""
+    mock_client = MagicMock()
+    mock_client.put_object.side_effect = ConnectionError("minio down")
+    spool = Spool(tmp_path, max_bytes=4096, fsync_interval=0)
+
+    with patch("app.services.minio_storage._minio_client", mock_client):
+        with patch("app.services.minio_storage.archive_spool", spool):
+            assert await store_temperature_data({"temperature": 20.5}) is True
+            assert spool.pending_bytes() > 0
+
+            # While a backlog exists, new writes queue behind it.
+            assert await store_temperature_data({"temperature": 21.0}) is True
+            assert mock_client.put_object.call_count == 1
+
+            mock_client.put_object.side_effect = None
+            assert await replay_spool() == 2
+
+    assert spool.pending_bytes() == 0
+    assert mock_client.put_object.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_spool_fsync_runs_off_event_loop(tmp_path):
+    """Test spooling a failed write never fsyncs on the event loop thread"""
+    mock_client = MagicMock()
+    mock_client.put_object.side_effect = ConnectionError("minio down")
+    spool = Spool(tmp_path, max_bytes=4096, fsync_interval=0)
+    loop_thread = threading.get_ident()
+    fsync_threads = []
+
+    def fsync(fd):
+        fsync_threads.append(threading.get_ident())
+
+    with (
+        patch("app.services.minio_storage._minio_client", mock_client),
+        patch("app.services.minio_storage.archive_spool", spool),
+        patch("app.services.spool.os.fsync", fsync),
+    ):
+        await store_temperature_data({"temperature": 20.5})
+        mock_client.put_object.side_effect = None
+        await replay_spool()
+
+    assert fsync_threads
+    assert loop_thread not in fsync_threads
@@ -4,10 +4,13 @@ from app.services.opensensemap import (
     fetch_box_data,
     extract_temperature_value,
     is_data_fresh,
+    parse_timestamp,
+    fetch_boxes,
     fetch_temperature_data,
     calculate_average_temperature,
 )
 from app.config.settings import settings
+from app.services.scheduler import box_scheduler
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -126,7 +129,7 @@ def test_is_data_fresh_recent():
     now = datetime.now(timezone.utc)
     timestamp = now.isoformat()
 
-    assert is_data_fresh(timestamp) is True
+    assert is_data_fresh(parse_timestamp(timestamp)) is True
 
 
 def test_is_data_fresh_old():
@@ -134,7 +137,7 @@ def test_is_data_fresh_old():
     old_time = datetime.now(timezone.utc) - timedelta(hours=2)
     timestamp = old_time.isoformat()
 
-    assert is_data_fresh(timestamp) is False
+    assert is_data_fresh(parse_timestamp(timestamp)) is False
 
 
 def test_is_data_fresh_boundary():
@@ -144,7 +147,7 @@ def test_is_data_fresh_boundary():
     )
     timestamp = boundary_time.isoformat()
 
-    assert is_data_fresh(timestamp) is True
+    assert is_data_fresh(parse_timestamp(timestamp)) is True
 
 
 def test_is_data_fresh_just_over_boundary():
@@ -154,7 +157,7 @@ def test_is_data_fresh_just_over_boundary():
     )
     timestamp = over_boundary.isoformat()
 
-    assert is_data_fresh(timestamp) is False
+    assert is_data_fresh(parse_timestamp(timestamp)) is False
 
 
 def test_is_data_fresh_with_z_suffix():
@@ -162,7 +165,7 @@ def test_is_data_fresh_with_z_suffix():
     now = datetime.now(timezone.utc)
     timestamp = now.isoformat().replace("+00:00", "Z")
 
-    assert is_data_fresh(timestamp) is True
+    assert is_data_fresh(parse_timestamp(timestamp)) is True
 
 
 def test_calculate_average_temperature_single():
@@ -249,7 +252,7 @@ async def test_fetch_temperature_data_partial_failure():
     """Test when some boxes fail but others succeed"""
     fresh_data = get_sample_box_data()
 
-    async def mock_fetch(box_id):
+    async def mock_fetch(box_id, priority="background"):
         if box_id == settings.SENSEBOX_IDS[0]:
             raise OpenSenseMapError("Failed")
         return fresh_data
@@ -328,3 +331,29 @@ def test_get_temperature_status(temperature, expected_status):
     from app.services.opensensemap import get_temperature_status
 
     assert get_temperature_status(temperature) == expected_status
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_keeps_last_fetch_time():
+    """Test an error reading carries the last successful fetch time, not now"""
+    box_id = settings.SENSEBOX_IDS[0]
+    store = AsyncMock()
+
+    with patch("app.services.opensensemap.store_readings", new=store):
+        with patch(
+            "app.services.opensensemap.fetch_box_data",
+            new=AsyncMock(return_value=get_sample_box_data()),
+        ):
+            await fetch_boxes([box_id])
+        last_success = box_scheduler.get(box_id).last_fetched_at - 30
+        box_scheduler.get(box_id).last_fetched_at = last_success
+        with patch(
+            "app.services.opensensemap.fetch_box_data",
+            side_effect=OpenSenseMapError("Failed"),
+        ):
+            await fetch_boxes([box_id])
+
+    (reading,) = store.await_args.args[0]
+    assert reading["status"] == "error"
+    assert reading["fetched_at"] == last_success
+    assert box_scheduler.get(box_id).last_fetched_at == last_success
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.profiler import Sampler, check_debug_token
+
+client = TestClient(app)
+
+TOKEN = "s3cret"
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampler_collapsed_and_speedscope():
+    """Test samples of a busy thread aggregate into both output formats"""
+    sampler = Sampler(thread_id=threading.get_ident(), interval=0.001).start()
+    busy_wait(0.05)
+    sampler.stop()
+
+    assert sampler.sample_count > 0
+    collapsed = sampler.collapsed()
+    assert "busy_wait (test_profiler.py:" in collapsed
+    stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+    profile = sampler.speedscope("test")
+    frames = profile["shared"]["frames"]
+    assert profile["profiles"][0]["type"] == "sampled"
+    assert len(profile["profiles"][0]["samples"]) == len(sampler.stacks)
+    assert all(0 <= i < len(frames) for s in profile["profiles"][0]["samples"] for i in s)
+
+
+def test_check_debug_token():
+    """Test tokens are rejected when debugging is disabled or mismatched"""
+    with patch("app.services.profiler.settings.DEBUG_TOKEN", ""):
+        assert check_debug_token("") is False
+    with patch("app.services.profiler.settings.DEBUG_TOKEN", TOKEN):
+        assert check_debug_token(TOKEN) is True
+        assert check_debug_token("wrong") is False
+
+
+def test_profile_endpoint_hidden_without_token():
+    """Test /debug/profile is 404 unless DEBUG_TOKEN is configured"""
+    with patch("app.routers.debug.settings.DEBUG_TOKEN", ""):
+        assert client.get("/debug/profile").status_code == 404
+
+
+def test_profile_endpoint_requires_auth():
+    """Test /debug/profile rejects a wrong bearer token"""
+    with patch("app.routers.debug.settings.DEBUG_TOKEN", TOKEN):
+        response = client.get(
+            "/debug/profile", headers={"Authorization": "Bearer nope"}
+        )
+
+    assert response.status_code == 401
+
+
+def test_profile_endpoint_returns_speedscope():
+    """Test an authenticated profile returns a speedscope document"""
+    with patch("app.routers.debug.settings.DEBUG_TOKEN", TOKEN):
+        response = client.get(
+            "/debug/profile",
+            params={"seconds": 0.05, "format": "speedscope"},
+            headers={"Authorization": f"Bearer {TOKEN}"},
+        )
+
+    assert response.status_code == 200
+    assert response.json()["$schema"].startswith("https://www.speedscope.app")
+
+
+def test_profile_endpoint_limits_duration():
+    """Test profiles longer than PROFILE_MAX_SECONDS are rejected"""
+    with patch("app.routers.debug.settings.DEBUG_TOKEN", TOKEN):
+        response = client.get(
+            "/debug/profile",
+            params={"seconds": 3600},
+            headers={"Authorization": f"Bearer {TOKEN}"},
+        )
+
+    assert response.status_code == 400
+
+
+def test_request_profiling_header():
+    """Test X-Profile captures a retrievable profile of one request"""
+    cached = json.dumps(
+        {"average_temperature": 20.0, "status": "Good", "unit": "°C", "samples": 1}
+    )
+    with patch("app.services.profiler.settings.DEBUG_TOKEN", TOKEN):
+        with patch("app.routers.temperature._valkey_client", AsyncMock()):
+            with patch(
+                "app.routers.temperature.cache.get_with_ttl",
+                new=AsyncMock(return_value=(cached, 100)),
+            ):
+                plain = client.get("/temperature")
+                profiled = client.get("/temperature", headers={"X-Profile": TOKEN})
+
+        profile_id = profiled.headers["x-profile-id"]
+        fetched = client.get(
+            f"/debug/profile/requests/{profile_id}",
+            headers={"Authorization": f"Bearer {TOKEN}"},
+        )
+
+    assert "x-profile-id" not in plain.headers
+    assert profiled.status_code == 200
+    assert fetched.status_code == 200
@@ -0,0 +1,88 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+import redis.asyncio as redis
+
+from app.services.opensensemap import OpenSenseMapError, fetch_box_data
+from app.services.rate_limit import (
+    KEY,
+    TOKEN_BUCKET_SCRIPT,
+    RateLimitExceeded,
+    TokenBucket,
+    UpstreamLimiter,
+)
+
+
+def test_token_bucket_reserves_tokens_for_higher_priorities():
+    """Test a floor keeps the last tokens for classes with a lower reserve"""
+    bucket = TokenBucket(rate=1.0, burst=4)
+
+    assert bucket.take(floor=2)[0] is True
+    assert bucket.take(floor=2)[0] is True
+    allowed, wait = bucket.take(floor=2)
+    assert allowed is False
+    assert wait > 0
+    assert bucket.take(floor=0)[0] is True
+
+
+@pytest.mark.asyncio
+async def test_probe_denied_without_queueing():
+    """Test probes are denied immediately once their share is used"""
+    limiter = UpstreamLimiter(rate=0.001, burst=4)
+    with patch("app.services.rate_limit._rate_limit_client", None):
+        await limiter.acquire("probe")
+        await limiter.acquire("probe")
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire("probe")
+        await limiter.acquire("user")
+
+
+@pytest.mark.asyncio
+async def test_acquire_queues_until_token_available():
+    """Test callers wait for a refill within their queueing budget"""
+    limiter = UpstreamLimiter(rate=100.0, burst=1)
+    with patch("app.services.rate_limit._rate_limit_client", None):
+        await limiter.acquire("user")
+        await limiter.acquire("user")
+
+    assert limiter.local.tokens < 1
+
+
+@pytest.mark.asyncio
+async def test_shared_bucket_used_when_available():
+    """Test tokens come from the Valkey script when a client is set"""
+    limiter = UpstreamLimiter(rate=1.0, burst=10)
+    script = AsyncMock(return_value=[1, "0"])
+    with patch("app.services.rate_limit._rate_limit_client", MagicMock()):
+        with patch("app.services.rate_limit.cache.script", new=script):
+            await limiter.acquire("background")
+
+    _, source, keys, args = script.await_args.args
+    assert source == TOKEN_BUCKET_SCRIPT
+    assert keys == [KEY]
+    assert args[-1] == 10 * 0.25
+    assert limiter.local.tokens == 10
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_local_bucket_on_valkey_error():
+    """Test a Valkey outage does not block upstream calls"""
+    limiter = UpstreamLimiter(rate=1.0, burst=10, replicas=2)
+    script = AsyncMock(side_effect=redis.ConnectionError("down"))
+    with patch("app.services.rate_limit._rate_limit_client", MagicMock()):
+        with patch("app.services.rate_limit.cache.script", new=script):
+            await limiter.acquire("user")
+
+    assert limiter.local.burst == 5
+    assert limiter.local.tokens < 5
+
+
+@pytest.mark.asyncio
+async def test_fetch_box_data_rate_limited():
+    """Test a denied token surfaces as an OpenSenseMapError"""
+    with patch(
+        "app.services.opensensemap.upstream_limiter.acquire",
+        new=AsyncMock(side_effect=RateLimitExceeded("limited")),
+    ):
+        with pytest.raises(OpenSenseMapError, match="limited"):
+            await fetch_box_data("box")
@@ -0,0 +1,47 @@
+import numpy as np
+
+from app.services.reading_store import ReadingStore
+
+
+def test_set_get_and_overwrite():
+    """Test readings are stored per box and overwritten in place"""
+    store = ReadingStore(capacity=2)
+
+    store.set("a", 20.0, 100.0)
+    store.set("a", 21.5, 160.0)
+
+    assert store.get("a") == (21.5, 160.0)
+    assert store.get("missing") is None
+    assert len(store) == 1
+
+
+def test_grows_and_reuses_slots():
+    """Test capacity doubles when full and removed slots are reused"""
+    store = ReadingStore(capacity=2)
+    for i in range(3):
+        store.set(f"box{i}", float(i), 100.0)
+
+    assert store.capacity == 4
+    assert store.remove("box0") == (0.0, 100.0)
+    assert store.remove("box0") is None
+
+    store.set("box3", 3.0, 100.0)
+    store.set("box4", 4.0, 100.0)
+    assert store.capacity == 4
+    assert sorted(store.box_ids()) == ["box1", "box2", "box3", "box4"]
+    assert sorted(store.live_values().tolist()) == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_remove_older_than_drops_stale_readings():
+    """Test the vectorized cutoff drops exactly the stale boxes"""
+    store = ReadingStore(capacity=8)
+    store.set("old", 10.0, 50.0)
+    store.set("edge", 20.0, 100.0)
+    store.set("new", 30.0, 150.0)
+
+    removed = store.remove_older_than(100.0)
+
+    np.testing.assert_array_equal(removed, [10.0])
+    assert "old" not in store
+    assert store.oldest() == 100.0
+    assert sorted(store.box_ids()) == ["edge", "new"]
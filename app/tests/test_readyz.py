@@ -20,11 +20,11 @@ async def test_readyz_success():
         "app.routers.readyz.check_senseboxes_availability",
         new=AsyncMock(return_value=(3, 3)),
     ):
-        with patch("app.routers.readyz.get_valkey_client") as mock_valkey:
-            mock_client = AsyncMock()
-            mock_client.get.return_value = '{"test": "data"}'
-            mock_client.ttl.return_value = 100
-            mock_valkey.return_value = mock_client
+        with patch("app.routers.readyz.get_valkey_client") as mock_valkey, patch(
+            "app.routers.readyz.get_with_ttl",
+            new=AsyncMock(return_value=('{"test": "data"}', 100)),
+        ):
+            mock_valkey.return_value = AsyncMock()
 
             with patch("app.services.minio_storage._minio_client") as mock_minio:
                 mock_minio.list_buckets.return_value = []
@@ -68,11 +68,12 @@ def test_readyz_cache_expired():
         "app.routers.readyz.check_senseboxes_availability",
         new=AsyncMock(return_value=(3, 3)),
     ):
-        with patch("app.routers.readyz.get_valkey_client") as mock_valkey:
-            mock_client = AsyncMock()
-            mock_client.get.return_value = '{"test": "data"}'
-            mock_client.ttl.return_value = -1
-            mock_valkey.return_value = mock_client
+        with patch("app.routers.readyz.get_valkey_client") as mock_valkey, patch(
+            "app.routers.readyz.get_with_ttl",
+            new=AsyncMock(return_value=('{"test": "data"}', -1)),
+        ):
+            mock_valkey.return_value = AsyncMock()
 
             response = client.get("/readyz")
             assert response.status_code == 503
+            assert "Cache expired (TTL <= 0)" in response.json()["reasons"]
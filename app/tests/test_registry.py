@@ -0,0 +1,151 @@
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.aggregate_state import aggregate_state
+from app.services.registry import (
+    CHANGES_CHANNEL,
+    INITIALIZED_KEY,
+    LOAD_SCRIPT,
+    REGISTRY_KEY,
+    BoxRegistry,
+)
+from app.services.scheduler import box_scheduler
+
+client = TestClient(app)
+
+TOKEN = "adm1n"
+AUTH = {"Authorization": f"Bearer {TOKEN}"}
+BOX_A = "5eba5fbad46fb8001b799786"
+BOX_B = "5c21ff8f919bf8001adf2488"
+NEW_BOX = "0123456789abcdef01234567"
+
+
+def fake_valkey(members=()):
+    valkey = MagicMock()
+    valkey.smembers = AsyncMock(return_value=set(members))
+    valkey.sadd = AsyncMock(return_value=1)
+    valkey.srem = AsyncMock(return_value=1)
+    valkey.publish = AsyncMock(return_value=1)
+    return valkey
+
+
+def test_apply_updates_scheduler_and_state_incrementally():
+    """Test a change touches only the affected box"""
+    registry = BoxRegistry([BOX_A])
+    box_scheduler.add(BOX_A, now=0)
+    aggregate_state.update(BOX_A, 20.0, 1e12)
+
+    assert registry.apply("add", NEW_BOX) is True
+    assert registry.apply("add", NEW_BOX) is False
+    assert box_scheduler.get(NEW_BOX) is not None
+    assert aggregate_state.get(BOX_A) is not None
+
+    assert registry.apply("remove", BOX_A) is True
+    assert box_scheduler.get(BOX_A) is None
+    assert aggregate_state.get(BOX_A) is None
+    assert registry.ids() == [NEW_BOX]
+
+
+def test_reconcile_applies_only_differences():
+    """Test reconciling a full set adds and removes just the changes"""
+    registry = BoxRegistry([BOX_A, BOX_B])
+
+    added, removed = registry.reconcile([BOX_B, NEW_BOX])
+
+    assert added == [NEW_BOX]
+    assert removed == [BOX_A]
+    assert registry.ids() == [BOX_B, NEW_BOX]
+
+
+@pytest.mark.asyncio
+async def test_load_seeds_with_the_local_ids():
+    """Test the shared set is seeded from the local IDs on first use"""
+    registry = BoxRegistry([BOX_A, BOX_B])
+    script = AsyncMock(return_value=[BOX_B, BOX_A])
+    with (
+        patch("app.services.registry._registry_client", fake_valkey()),
+        patch("app.services.registry.cache.script", script),
+    ):
+        await registry.load()
+
+    script.assert_awaited_once()
+    _, source, keys, seed = script.await_args.args
+    assert source == LOAD_SCRIPT
+    assert keys == [REGISTRY_KEY, INITIALIZED_KEY]
+    assert seed == [BOX_A, BOX_B]
+    assert registry.ids() == [BOX_A, BOX_B]
+
+
+@pytest.mark.asyncio
+async def test_load_keeps_an_emptied_registry_empty():
+    """Test an initialized but empty shared set is not seeded again"""
+    registry = BoxRegistry([BOX_A])
+    with (
+        patch("app.services.registry._registry_client", fake_valkey()),
+        patch("app.services.registry.cache.script", AsyncMock(return_value=[])),
+    ):
+        await registry.load()
+
+    assert registry.ids() == []
+
+
+@pytest.mark.asyncio
+async def test_add_persists_and_publishes():
+    """Test a change is written to Valkey and announced to other replicas"""
+    registry = BoxRegistry([BOX_A])
+    valkey = fake_valkey()
+    with patch("app.services.registry._registry_client", valkey):
+        assert await registry.add(NEW_BOX) is True
+
+    valkey.sadd.assert_awaited_once_with(REGISTRY_KEY, NEW_BOX)
+    channel, message = valkey.publish.await_args.args
+    assert channel == CHANGES_CHANNEL
+    assert json.loads(message) == {"op": "add", "box_id": NEW_BOX}
+    assert NEW_BOX in registry
+
+
+def test_handle_message_ignores_malformed_changes():
+    """Test a bad pub/sub payload does not break the listener"""
+    registry = BoxRegistry([BOX_A])
+
+    registry.handle_message("not json")
+    registry.handle_message(json.dumps({"op": "explode", "box_id": BOX_A}))
+    registry.handle_message(json.dumps({"op": "remove", "box_id": BOX_A}))
+
+    assert registry.ids() == []
+
+
+def test_admin_endpoints_hidden_without_token():
+    """Test /admin is 404 unless ADMIN_TOKEN is configured"""
+    with patch("app.services.auth.settings.ADMIN_TOKEN", ""):
+        assert client.get("/admin/boxes", headers=AUTH).status_code == 404
+
+
+def test_admin_add_and_remove_box():
+    """Test boxes are added and removed through the admin API"""
+    with patch("app.services.auth.settings.ADMIN_TOKEN", TOKEN):
+        with patch("app.services.registry._registry_client", None):
+            with patch("app.routers.admin.forget_box", new=AsyncMock()) as forget:
+                assert client.get("/admin/boxes").status_code == 401
+
+                response = client.post("/admin/boxes", json={"box_id": NEW_BOX}, headers=AUTH)
+                assert response.status_code == 201
+                assert response.json()["added"] is True
+                assert NEW_BOX in client.get("/admin/boxes", headers=AUTH).json()["boxes"]
+
+                response = client.delete(f"/admin/boxes/{NEW_BOX}", headers=AUTH)
+                assert response.status_code == 200
+                forget.assert_awaited_once_with(NEW_BOX)
+                assert client.delete(f"/admin/boxes/{NEW_BOX}", headers=AUTH).status_code == 404
+
+
+def test_admin_rejects_invalid_box_id():
+    """Test IDs that are not senseBox ObjectIds are refused"""
+    with patch("app.services.auth.settings.ADMIN_TOKEN", TOKEN):
+        response = client.post("/admin/boxes", json={"box_id": "../etc"}, headers=AUTH)
+
+    assert response.status_code == 422
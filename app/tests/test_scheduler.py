@@ -0,0 +1,153 @@
+import time
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.config.settings import settings
+from app.main import poll_due_boxes
+from app.services.aggregate_state import aggregate_state
+from app.services.scheduler import PollScheduler, box_scheduler
+
+
+def test_new_boxes_are_due_immediately():
+    """Test unknown boxes are polled on the first tick"""
+    scheduler = PollScheduler()
+    scheduler.sync(["a", "b"], now=1000.0)
+
+    assert sorted(scheduler.pop_due(now=1000.0)) == ["a", "b"]
+    assert scheduler.pop_due(now=1000.0) == []
+
+
+def test_schedule_follows_learned_interval():
+    """Test the next poll lands just after the box's next expected measurement"""
+    scheduler = PollScheduler()
+    scheduler.observe("a", 1000.0, now=1005.0)
+    scheduler.observe("a", 1300.0, now=1305.0)
+
+    schedule = scheduler.get("a")
+    assert schedule.interval == 300.0
+    assert schedule.next_poll_at == 1300.0 + 300.0 + settings.POLL_GRACE_SECONDS
+    assert scheduler.pop_due(now=1500.0) == []
+    assert scheduler.pop_due(now=schedule.next_poll_at) == ["a"]
+
+
+def test_idle_box_backs_off_exponentially():
+    """Test boxes without new measurements are polled less and less often"""
+    scheduler = PollScheduler()
+    scheduler.observe("a", 1000.0, now=1000.0)
+
+    delays = []
+    now = 2000.0
+    for _ in range(12):
+        scheduler.observe("a", 1000.0, now=now)
+        delays.append(scheduler.get("a").next_poll_at - now)
+
+    assert delays[0] == settings.MIN_POLL_INTERVAL * 2
+    assert delays[1] == settings.MIN_POLL_INTERVAL * 4
+    assert delays[-1] == settings.MAX_POLL_INTERVAL
+
+
+def test_errors_back_off_and_recover():
+    """Test failed polls back off and a new measurement resets the backoff"""
+    scheduler = PollScheduler()
+    scheduler.observe("a", None, now=1000.0)
+    scheduler.observe("a", None, now=1000.0)
+    assert scheduler.get("a").misses == 2
+
+    scheduler.observe("a", 1000.0, now=1010.0)
+    assert scheduler.get("a").misses == 0
+
+
+def test_sync_drops_removed_boxes():
+    """Test boxes removed from the configuration are no longer polled"""
+    scheduler = PollScheduler()
+    scheduler.sync(["a", "b"], now=1000.0)
+    scheduler.sync(["b"], now=1000.0)
+
+    assert scheduler.pop_due(now=1000.0) == ["b"]
+    assert len(scheduler) == 1
+
+
+def test_seconds_until_due():
+    """Test the poller sleeps until the earliest scheduled box"""
+    scheduler = PollScheduler()
+    assert scheduler.seconds_until_due(now=0.0) == settings.MAX_POLL_INTERVAL
+
+    scheduler.observe("a", 1000.0, now=1000.0)
+    assert scheduler.seconds_until_due(now=1000.0) == (
+        settings.MIN_POLL_INTERVAL + settings.POLL_GRACE_SECONDS
+    )
+
+
+@pytest.mark.asyncio
+async def test_poll_due_boxes_fetches_only_due_boxes():
+    """Test the poller fetches due boxes and publishes the state average"""
+    now = time.time()
+    first, *rest = settings.SENSEBOX_IDS
+    for box_id in rest:
+        box_scheduler.observe(box_id, now)
+    aggregate_state.update(first, 21.0, now)
+
+    fetch = AsyncMock(return_value=[])
+    publish = AsyncMock()
+    with patch("app.main.fetch_boxes", new=fetch):
+        with patch("app.main.publish_temperature", new=publish):
+            fetched = await poll_due_boxes()
+
+    assert fetched == 1
+    fetch.assert_awaited_once_with([first])
+    publish.assert_awaited_once_with(21.0, 1)
+    assert aggregate_state.refreshed_at is not None
+
+
+@pytest.mark.asyncio
+async def test_poll_due_boxes_idle():
+    """Test nothing is fetched while no box is due"""
+    now = time.time()
+    for box_id in settings.SENSEBOX_IDS:
+        box_scheduler.observe(box_id, now)
+
+    fetch = AsyncMock()
+    with patch("app.main.fetch_boxes", new=fetch):
+        assert await poll_due_boxes() == 0
+
+    fetch.assert_not_awaited()
+    assert aggregate_state.refreshed_at is not None
+
+
+@pytest.mark.asyncio
+async def test_unreadable_box_does_not_stop_polling():
+    """Test a box with unparseable data is rescheduled and the others still polled"""
+    bad, *good = settings.SENSEBOX_IDS
+    fresh = datetime.now(timezone.utc).isoformat()
+
+    async def box_data(box_id, priority="background"):
+        created_at = "garbage" if box_id == bad else fresh
+        return {
+            "sensors": [
+                {
+                    "title": settings.TEMPERATURE_PHENOMENON,
+                    "lastMeasurement": {"value": "21.0", "createdAt": created_at},
+                }
+            ]
+        }
+
+    with patch("app.services.opensensemap.fetch_box_data", side_effect=box_data):
+        with patch("app.main.publish_temperature", new=AsyncMock()):
+            assert await poll_due_boxes() == len(settings.SENSEBOX_IDS)
+
+    for box_id in settings.SENSEBOX_IDS:
+        assert box_scheduler.get(box_id).next_poll_at != float("inf")
+    assert all(box_id in aggregate_state for box_id in good)
+
+
+@pytest.mark.asyncio
+async def test_failed_poll_reschedules_due_boxes():
+    """Test due boxes are rescheduled even if the whole fetch raises"""
+    with patch("app.main.fetch_boxes", new=AsyncMock(side_effect=RuntimeError("boom"))):
+        with pytest.raises(RuntimeError):
+            await poll_due_boxes()
+
+    for box_id in settings.SENSEBOX_IDS:
+        assert box_scheduler.get(box_id).next_poll_at != float("inf")
@@ -0,0 +1,138 @@
+import os
+from datetime import date
+
+import numpy as np
+
+from app.services import archive, segment_cache as segments
+from app.services.segment_cache import SegmentCache, segment_cache
+from app.tests.test_archive import FakeMinio, epoch
+
+DAY = date(2026, 3, 1)
+
+
+def archived(client: FakeMinio, day: date, stamps: list[str], values: list[float]) -> None:
+    archive.write_day(
+        client,
+        day,
+        {
+            "timestamp": np.array([epoch(stamp) for stamp in stamps]),
+            "average_temperature": np.array(values),
+            "samples": np.full(len(values), 2, dtype=np.int32),
+        },
+    )
+
+
+def load(cache: SegmentCache, client: FakeMinio, day: date, generation: str) -> dict:
+    return cache.load_day(client, day, generation, archive.day_etags(client, day, day).get(day))
+
+
+def test_hit_is_memory_mapped_and_skips_minio():
+    """Test a cached day is mapped from disk instead of downloaded again"""
+    client = FakeMinio()
+    archived(client, DAY, ["2026-03-01T10:00:00", "2026-03-01T11:00:00"], [20.0, 21.0])
+
+    first = load(segment_cache, client, DAY, "0")
+    second = load(segment_cache, client, DAY, "0")
+
+    assert client.gets == 1
+    assert isinstance(second["average_temperature"], np.memmap)
+    for name in archive.COLUMNS:
+        assert second[name].tolist() == first[name].tolist()
+
+
+def test_new_generation_is_fetched_again():
+    """Test a day rewritten since it was cached is not served from disk"""
+    client = FakeMinio()
+    archived(client, DAY, ["2026-03-01T10:00:00"], [20.0])
+    load(segment_cache, client, DAY, "0")
+    archived(client, DAY, ["2026-03-01T10:00:00"], [25.0])
+
+    assert load(segment_cache, client, DAY, "1")["average_temperature"].tolist() == [25.0]
+    assert load(segment_cache, client, DAY, "1")["average_temperature"].tolist() == [25.0]
+    assert client.gets == 2
+
+
+def test_rewritten_object_is_fetched_again_under_same_generation():
+    """Test a segment is not served once the object's ETag changed"""
+    client = FakeMinio()
+    archived(client, DAY, ["2026-03-01T10:00:00"], [20.0])
+    load(segment_cache, client, DAY, "0")
+    # A Valkey restart resets generations while the archive was rewritten.
+    archived(client, DAY, ["2026-03-01T10:00:00"], [25.0])
+
+    assert load(segment_cache, client, DAY, "0")["average_temperature"].tolist() == [25.0]
+    assert load(segment_cache, client, DAY, "0")["average_temperature"].tolist() == [25.0]
+    assert client.gets == 2
+
+
+def test_corrupt_segment_is_refetched():
+    """Test a segment failing its checksum is dropped and downloaded again"""
+    client = FakeMinio()
+    archived(client, DAY, ["2026-03-01T10:00:00"], [20.0])
+    load(segment_cache, client, DAY, "0")
+    path = os.path.join(segment_cache.directory, "2026-03-01.seg")
+    with open(path, "r+b") as file:
+        file.seek(-1, os.SEEK_END)
+        file.write(b"\xff")
+
+    restarted = SegmentCache(segment_cache.directory, segment_cache.max_bytes)
+    assert load(restarted, client, DAY, "0")["average_temperature"].tolist() == [20.0]
+    assert client.gets == 2
+
+
+def test_least_recently_used_segment_is_evicted(tmp_path):
+    """Test the cache stays under its size bound by evicting the coldest day"""
+    client = FakeMinio()
+    days = [date(2026, 3, n) for n in (1, 2, 3)]
+    for day in days:
+        archived(client, day, [f"{day.isoformat()}T10:00:00"], [20.0])
+    etag = client.etag(archive.archive_name(days[0]))
+    one_segment = len(segments.encode_segment(archive.load_day(client, days[0]), "0", 0, etag))
+    cache = SegmentCache(str(tmp_path / "lru"), 2 * one_segment)
+
+    load(cache, client, days[0], "0")
+    load(cache, client, days[1], "0")
+    load(cache, client, days[0], "0")
+    load(cache, client, days[2], "0")
+
+    assert sorted(os.listdir(cache.directory)) == ["2026-03-01.seg", "2026-03-03.seg"]
+
+
+def test_read_downsampled_merges_windows_across_days():
+    """Test windows spanning several days are combined by sample weight"""
+    client = FakeMinio()
+    archived(client, date(2026, 3, 1), ["2026-03-01T23:00:00"], [20.0])
+    archived(client, date(2026, 3, 2), ["2026-03-02T01:00:00", "2026-03-02T02:00:00"],
+             [23.0, 23.0])
+
+    columns = segments.read_downsampled(
+        client, date(2026, 3, 1), date(2026, 3, 3), 4 * 86400, ["0", "0", "0"]
+    )
+
+    assert columns["average_temperature"].tolist() == [22.0]
+    assert columns["samples"].tolist() == [6]
+
+
+def test_read_downsampled_lists_etags_once_per_query():
+    """Test cached days are validated from one listing instead of a request per day"""
+    client = FakeMinio()
+    days = [date(2026, 3, n) for n in (1, 2, 3)]
+    for day in days:
+        archived(client, day, [f"{day.isoformat()}T10:00:00"], [20.0])
+    segments.read_downsampled(client, days[0], days[-1], 86400, ["0", "0", "0"])
+    client.lists = client.gets = 0
+
+    segments.read_downsampled(client, days[0], days[-1], 86400, ["0", "0", "0"])
+
+    assert (client.lists, client.gets) == (1, 0)
+
+
+def test_day_etags_covers_only_the_range():
+    """Test the listing is narrowed to the range's prefix and days outside it are dropped"""
+    client = FakeMinio()
+    for day in (date(2026, 2, 28), date(2026, 3, 1), date(2026, 3, 4)):
+        archived(client, day, [f"{day.isoformat()}T10:00:00"], [20.0])
+
+    etags = archive.day_etags(client, date(2026, 3, 1), date(2026, 3, 3))
+
+    assert etags == {DAY: client.etag(archive.archive_name(DAY))}
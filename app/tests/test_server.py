@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from app import server
+from app.config import settings
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="ascii")
+
+
+def test_cgroup_cpu_limit_v2_and_v1(tmp_path):
+    """Test CPU quotas are read from cgroup v2, then v1"""
+    write(tmp_path / "v2" / "cpu.max", "150000 100000\n")
+    write(tmp_path / "unlimited" / "cpu.max", "max 100000\n")
+    write(tmp_path / "v1" / "cpu" / "cpu.cfs_quota_us", "50000\n")
+    write(tmp_path / "v1" / "cpu" / "cpu.cfs_period_us", "100000\n")
+    write(tmp_path / "v1-unlimited" / "cpu" / "cpu.cfs_quota_us", "-1\n")
+    write(tmp_path / "v1-unlimited" / "cpu" / "cpu.cfs_period_us", "100000\n")
+
+    assert server.cgroup_cpu_limit(str(tmp_path / "v2")) == 1.5
+    assert server.cgroup_cpu_limit(str(tmp_path / "unlimited")) is None
+    assert server.cgroup_cpu_limit(str(tmp_path / "v1")) == 0.5
+    assert server.cgroup_cpu_limit(str(tmp_path / "v1-unlimited")) is None
+    assert server.cgroup_cpu_limit(str(tmp_path / "missing")) is None
+
+
+def test_auto_workers_follows_quota_and_affinity(tmp_path, monkeypatch):
+    """Test workers are whole CPUs of the quota, capped by affinity, at least one"""
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)))
+    write(tmp_path / "half" / "cpu.max", "50000 100000\n")
+    write(tmp_path / "two" / "cpu.max", "250000 100000\n")
+    write(tmp_path / "many" / "cpu.max", "1600000 100000\n")
+
+    assert server.auto_workers(str(tmp_path / "half")) == 1
+    assert server.auto_workers(str(tmp_path / "two")) == 2
+    assert server.auto_workers(str(tmp_path / "many")) == 8
+    assert server.auto_workers(str(tmp_path / "none")) == 8
+
+
+def test_build_config_applies_profile_then_overrides(monkeypatch):
+    """Test profile values are used and explicit arguments win"""
+    monkeypatch.setattr(server, "auto_workers", lambda: 3)
+    profile = server.load_profile("app.server:PRODUCTION")
+
+    config = server.build_config(profile)
+    assert config["workers"] == 3
+    assert config["timeout_keep_alive"] == 75
+    assert config["loop"] in ("uvloop", "asyncio")
+    assert config["http"] in ("httptools", "h11")
+
+    config = server.build_config(profile, workers=2, host="127.0.0.1", port=9000)
+    assert (config["workers"], config["host"], config["port"]) == (2, "127.0.0.1", 9000)
+    assert server.build_config(server.load_profile("app.server:DEVELOPMENT"), 4)["workers"] == 1
+
+
+def test_load_profile_rejects_non_profiles():
+    """Test a profile spec must name a dict"""
+    with pytest.raises(ValueError):
+        server.load_profile("app.server")
+    with pytest.raises(ValueError):
+        server.load_profile("app.server:main")
+
+
+def test_worker_slots_are_exclusive(tmp_path, monkeypatch):
+    """Test each worker claims its own slot until all are taken"""
+    monkeypatch.setattr(server, "_slot_lock", None)
+    held = []
+    for expected in (0, 1):
+        assert server.claim_worker_slot(2, str(tmp_path)) == expected
+        held.append(server._slot_lock)
+    with pytest.raises(RuntimeError):
+        server.claim_worker_slot(2, str(tmp_path))
+    for lock in held:
+        lock.close()
+
+
+def test_isolate_worker_state(monkeypatch):
+    """Test slot 0 keeps its paths, others get their own, and budgets are shared"""
+    for name, value in {
+        "SPOOL_DIR": "/tmp/spool",
+        "SNAPSHOT_PATH": "/tmp/state.npz",
+        "SEGMENT_CACHE_DIR": "/tmp/segments",
+        "SPOOL_MAX_BYTES": 1000,
+        "SEGMENT_CACHE_MAX_BYTES": 1000,
+        "UPSTREAM_REPLICAS": 2,
+        "WORKER_SLOT": 0,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+
+    server.isolate_worker_state(1, 4)
+
+    assert settings.SPOOL_DIR == "/tmp/spool-1"
+    assert settings.SNAPSHOT_PATH == "/tmp/state-1.npz"
+    assert settings.SEGMENT_CACHE_DIR == "/tmp/segments-1"
+    assert settings.SPOOL_MAX_BYTES == 250
+    assert settings.SEGMENT_CACHE_MAX_BYTES == 250
+    assert settings.UPSTREAM_REPLICAS == 8
+    assert settings.WORKER_SLOT == 1
+    assert server._with_slot("/tmp/state.npz", 0) == "/tmp/state.npz"
@@ -0,0 +1,94 @@
+import time
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from app.services import snapshot
+from app.services.aggregate_state import aggregate_state
+from app.services.registry import box_registry
+from app.services.scheduler import box_scheduler
+
+BOX_A, BOX_B = box_registry.ids()[:2]
+
+
+def populate(now):
+    aggregate_state.update(BOX_A, 20.0, now - 60, now=now)
+    aggregate_state.update(BOX_B, 24.0, now - 30, now=now)
+    aggregate_state.mark_refreshed(now - 10)
+    box_scheduler.observe(BOX_A, now - 360, now=now - 300)
+    box_scheduler.observe(BOX_A, now - 60, now=now)
+
+
+def test_snapshot_round_trip():
+    """Test readings, refresh time and learned schedules survive a restart"""
+    now = time.time()
+    populate(now)
+    payload = snapshot.encode_snapshot(snapshot.capture(now))
+    aggregate_state.clear()
+    box_scheduler.clear()
+
+    restored = snapshot.restore_snapshot(payload, now=now + 5)
+
+    assert restored["readings"] == 2
+    assert restored["age"] == pytest.approx(15)
+    assert aggregate_state.get(BOX_A) == (20.0, now - 60)
+    assert aggregate_state.refreshed_at == now - 10
+    assert box_scheduler.get(BOX_A).interval == pytest.approx(300)
+    assert box_scheduler.get(BOX_A).next_poll_at > now + 5
+
+
+def test_restore_skips_expired_and_unregistered_boxes():
+    """Test only fresh readings of still-registered boxes are restored"""
+    now = time.time()
+    populate(now)
+    aggregate_state.update("retired", 30.0, now, now=now)
+    payload = snapshot.encode_snapshot(snapshot.capture(now))
+    aggregate_state.clear()
+
+    with patch("app.services.aggregate_state.settings.MAX_DATA_AGE_SECONDS", 45):
+        restored = snapshot.restore_snapshot(payload, now=now)
+
+    assert restored["readings"] == 1
+    assert aggregate_state.get(BOX_B) is not None
+    assert "retired" not in aggregate_state
+
+
+def test_restore_rejects_unknown_version():
+    """Test snapshots written by an incompatible version are refused"""
+    columns = snapshot.capture()
+    columns["version"] = np.int32(99)
+
+    with pytest.raises(ValueError):
+        snapshot.restore_snapshot(snapshot.encode_snapshot(columns))
+
+
+def test_save_writes_local_file_atomically():
+    """Test the local snapshot is written and read back"""
+    now = time.time()
+    populate(now)
+
+    size = snapshot.save(snapshot.capture(now), client=None)
+
+    assert snapshot.read_local() is not None
+    assert len(snapshot.read_local()) == size
+
+
+@pytest.mark.asyncio
+async def test_restore_state_serves_snapshot_with_age():
+    """Test a restored aggregate is published, marked with its age"""
+    from app.main import restore_state
+
+    now = time.time()
+    populate(now)
+    snapshot.save(snapshot.capture(now), client=None)
+    aggregate_state.clear()
+
+    publish = AsyncMock()
+    with patch("app.main.cached_temperature", new=AsyncMock(return_value=None)):
+        with patch("app.main.publish_temperature", new=publish):
+            assert await restore_state() is True
+
+    average, samples = publish.await_args.args
+    assert (average, samples) == (22.0, 2)
+    assert publish.await_args.kwargs["age"] >= 10
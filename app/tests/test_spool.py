@@ -0,0 +1,65 @@
+import pytest
+
+from app.services.spool import Spool
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return Spool(tmp_path / "spool", max_bytes=4096, fsync_interval=0)
+
+
+def test_append_and_drain_in_order(spool):
+    """Test spooled records are replayed oldest first and then removed"""
+    spool.append("temperature/a.json", {"average_temperature": 20.0})
+    spool.append("temperature/b.json", {"average_temperature": 21.0})
+    uploaded = []
+
+    assert spool.drain(lambda name, data: uploaded.append((name, data))) == 2
+    assert uploaded == [
+        ("temperature/a.json", {"average_temperature": 20.0}),
+        ("temperature/b.json", {"average_temperature": 21.0}),
+    ]
+    assert spool.pending_bytes() == 0
+
+
+def test_failed_drain_keeps_records(spool):
+    """Test records survive a failed upload and are replayed next time"""
+    spool.append("temperature/a.json", {"v": 1})
+
+    def fail(name, data):
+        raise ConnectionError("minio down")
+
+    with pytest.raises(ConnectionError):
+        spool.drain(fail)
+    spool.append("temperature/b.json", {"v": 2})
+    assert spool.pending_bytes() > 0
+
+    uploaded = []
+    assert spool.drain(lambda name, data: uploaded.append(name)) == 2
+    assert uploaded == ["temperature/a.json", "temperature/b.json"]
+
+
+def test_size_cap_drops_new_records(tmp_path):
+    """Test appends beyond max_bytes are rejected"""
+    spool = Spool(tmp_path, max_bytes=100, fsync_interval=0)
+
+    assert spool.append("temperature/a.json", {"v": 1}) is True
+    assert spool.append("temperature/b.json", {"v": "x" * 100}) is False
+
+
+def test_survives_restart_and_torn_write(spool):
+    """Test a new Spool instance replays leftovers and skips a torn line"""
+    spool.append("temperature/a.json", {"v": 1})
+    spool.flush()
+    with open(spool.directory / "current.log", "ab") as file:
+        file.write(b'{"object_name": "temperature/b.js')
+
+    restarted = Spool(spool.directory, max_bytes=4096)
+    uploaded = []
+    assert restarted.drain(lambda name, data: uploaded.append(name)) == 1
+    assert uploaded == ["temperature/a.json"]
+
+
+def test_drain_without_directory(tmp_path):
+    """Test draining a spool that never received writes"""
+    assert Spool(tmp_path / "missing", max_bytes=10).drain(lambda *a: None) == 0
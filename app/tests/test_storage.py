@@ -1,22 +1,29 @@
+import asyncio
 import pytest
+import time
 from unittest.mock import patch, AsyncMock
 from fastapi.testclient import TestClient
 from app.main import app
+from app.routers.storage import manual_store
 
 client = TestClient(app)
 
+CURRENT = {"average_temperature": 21.0, "status": "Good", "unit": "°C", "samples": 2}
+
+
+@pytest.fixture(autouse=True)
+def no_previous_store():
+    """Start every test without a remembered archive write"""
+    with patch("app.services.minio_storage._last_stored", None):
+        yield
+
 
 @pytest.mark.asyncio
 async def test_manual_store_success():
     """Test /store endpoint successfully stores data"""
-    mock_temp_data = [
-        {"value": 20.0, "timestamp": "2026-02-11T10:00:00Z"},
-        {"value": 22.0, "timestamp": "2026-02-11T10:05:00Z"},
-    ]
-
     with patch(
-        "app.routers.storage.fetch_temperature_data",
-        new=AsyncMock(return_value=mock_temp_data),
+        "app.routers.storage.current_temperature",
+        new=AsyncMock(return_value=CURRENT),
     ):
         with patch(
             "app.routers.storage.store_temperature_data",
@@ -34,11 +41,9 @@ async def test_manual_store_success():
 @pytest.mark.asyncio
 async def test_manual_store_failure():
     """Test /store endpoint when storage fails"""
-    mock_temp_data = [{"value": 20.0, "timestamp": "2026-02-11T10:00:00Z"}]
-
     with patch(
-        "app.routers.storage.fetch_temperature_data",
-        new=AsyncMock(return_value=mock_temp_data),
+        "app.routers.storage.current_temperature",
+        new=AsyncMock(return_value=CURRENT),
     ):
         with patch(
             "app.routers.storage.store_temperature_data",
@@ -48,3 +53,62 @@ async def test_manual_store_failure():
 
             assert response.status_code in [500, 503]
             assert "detail" in response.json()
+
+
+@pytest.mark.asyncio
+async def test_manual_store_respects_min_interval():
+    """Test a recent write is returned instead of writing again"""
+    last = {
+        "object_name": "temperature/2026-01-01T00:00:00.json",
+        "data": {"average_temperature": 20.0, "status": "Good", "samples": 1},
+        "stored_at": time.time(),
+    }
+    store = AsyncMock(return_value=True)
+    with patch("app.services.minio_storage._last_stored", last):
+        with patch("app.routers.storage.store_temperature_data", new=store):
+            result = await manual_store()
+
+    assert result["deduplicated"] is True
+    assert result["object_name"] == last["object_name"]
+    store.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_manual_store_skips_unchanged_aggregate():
+    """Test an unchanged aggregate is not written twice"""
+    last = {
+        "object_name": "temperature/2026-01-01T00:00:00.json",
+        "data": {"average_temperature": 21.0, "status": "Good", "samples": 2},
+        "stored_at": time.time() - 3600,
+    }
+    store = AsyncMock(return_value=True)
+    with patch("app.services.minio_storage._last_stored", last):
+        with patch(
+            "app.routers.storage.current_temperature",
+            new=AsyncMock(return_value=CURRENT),
+        ):
+            with patch("app.routers.storage.store_temperature_data", new=store):
+                result = await manual_store()
+
+    assert result["deduplicated"] is True
+    store.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_manual_store_coalesces_concurrent_calls():
+    """Test concurrent calls produce a single archive write"""
+    client_mock = AsyncMock()
+
+    async def put(*args, **kwargs):
+        await asyncio.sleep(0.01)
+
+    with patch("app.services.minio_storage._minio_client", client_mock):
+        with patch("app.services.minio_storage.asyncio.to_thread", new=put):
+            with patch(
+                "app.routers.storage.current_temperature",
+                new=AsyncMock(return_value=CURRENT),
+            ):
+                results = await asyncio.gather(*(manual_store() for _ in range(5)))
+
+    assert [r["deduplicated"] for r in results].count(False) == 1
+    assert len({r["object_name"] for r in results}) == 1
@@ -1,11 +1,19 @@
+import asyncio
+import json
+import time
 import pytest
 from unittest.mock import patch, AsyncMock
 from datetime import datetime, timezone, timedelta
 from fastapi.testclient import TestClient
 from app.main import app
+from app.routers.temperature import refresh_temperature
+from app.config.settings import settings
+from app.services.aggregate_state import aggregate_state
+from app.services.http_cache import make_etag
 from app.services.opensensemap import (
     extract_temperature_value,
     is_data_fresh,
+    parse_timestamp,
     calculate_average_temperature,
     fetch_temperature_data,
     OpenSenseMapError,
@@ -15,6 +23,20 @@ from app.services.opensensemap import (
 client = TestClient(app)
 
 
+def fetches(*values: float, delay: float = 0.0) -> AsyncMock:
+    """Stand-in for fetch_temperature_data that feeds the aggregate state"""
+
+    async def fetch(priority="background"):
+        await asyncio.sleep(delay)
+        now = time.time()
+        for n, value in enumerate(values):
+            aggregate_state.update(f"box{n}", value, now, now=now)
+        aggregate_state.mark_refreshed(now)
+        return [{"value": value, "timestamp": "2024-01-01T00:00:00Z"} for value in values]
+
+    return AsyncMock(side_effect=fetch)
+
+
 SAMPLE_BOX_DATA = {
     "sensors": [
         {
@@ -47,14 +69,14 @@ def test_is_data_fresh():
     """Test data freshness check with recent timestamp."""
     now = datetime.now(timezone.utc)
     timestamp = now.isoformat()
-    assert is_data_fresh(timestamp) is True
+    assert is_data_fresh(parse_timestamp(timestamp)) is True
 
 
 def test_is_data_old():
     """Test data freshness check with old timestamp."""
     old_time = datetime.now(timezone.utc) - timedelta(hours=2)
     timestamp = old_time.isoformat()
-    assert is_data_fresh(timestamp) is False
+    assert is_data_fresh(parse_timestamp(timestamp)) is False
 
 
 def test_calculate_average_temperature():
@@ -112,14 +134,7 @@ async def test_fetch_temperature_data_no_fresh_data():
 
 def test_temperature_endpoint_success():
     """Test /temperature endpoint returns 200 with correct data."""
-    mock_data = [
-        {"value": 20.0, "timestamp": "2024-01-01T00:00:00Z"},
-        {"value": 22.0, "timestamp": "2024-01-01T00:00:00Z"},
-    ]
-    with patch(
-        "app.routers.temperature.fetch_temperature_data",
-        new=AsyncMock(return_value=mock_data),
-    ):
+    with patch("app.routers.temperature.fetch_temperature_data", new=fetches(20.0, 22.0)):
         response = client.get("/temperature")
         assert response.status_code == 200
         data = response.json()
@@ -128,6 +143,7 @@ def test_temperature_endpoint_success():
         assert "samples" in data
         assert data["unit"] == "°C"
         assert data["samples"] == 2
+        assert data["average_temperature"] == 21.0
 
 
 def test_temperature_endpoint_opensensemap_error():
@@ -139,3 +155,71 @@ def test_temperature_endpoint_opensensemap_error():
         response = client.get("/temperature")
         assert response.status_code == 503
         assert "detail" in response.json()
+
+
+def test_temperature_endpoint_cache_headers():
+    """Test /temperature sends validators and TTL-aligned Cache-Control"""
+    with patch("app.routers.temperature.fetch_temperature_data", new=fetches(20.0)):
+        response = client.get("/temperature")
+
+    assert response.headers["etag"].startswith('W/"')
+    assert "last-modified" in response.headers
+    assert response.headers["cache-control"] == (
+        f"public, max-age={settings.CACHE_TTL}, "
+        f"stale-while-revalidate={settings.CACHE_TTL}"
+    )
+
+
+def test_temperature_endpoint_not_modified():
+    """Test a matching If-None-Match is answered with 304 and no body"""
+    with patch("app.routers.temperature.fetch_temperature_data", new=fetches(20.0)):
+        etag = client.get("/temperature").headers["etag"]
+        response = client.get("/temperature", headers={"If-None-Match": etag})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_temperature_endpoint_cache_hit_age():
+    """Test cached responses advertise only their remaining freshness"""
+    cached = json.dumps(
+        {"average_temperature": 20.0, "status": "Good", "unit": "°C", "samples": 1}
+    )
+    valkey = AsyncMock()
+    with patch("app.routers.temperature._valkey_client", valkey):
+        with patch(
+            "app.routers.temperature.cache.get_with_ttl",
+            new=AsyncMock(return_value=(cached, settings.CACHE_TTL - 100)),
+        ):
+            response = client.get("/temperature")
+
+    assert response.status_code == 200
+    assert f"max-age={settings.CACHE_TTL - 100}" in response.headers["cache-control"]
+    assert response.headers["etag"] == make_etag(cached)
+
+
+@pytest.mark.asyncio
+async def test_refresh_temperature_coalesces_refetches():
+    """Test concurrent cold refreshes share one upstream fetch"""
+    fetch = fetches(20.0, delay=0.01)
+    with patch("app.routers.temperature.fetch_temperature_data", new=fetch):
+        results = await asyncio.gather(
+            *(refresh_temperature(use_state=False) for _ in range(5))
+        )
+
+    assert fetch.await_count == 1
+    assert all(result == results[0] for result in results)
+
+
+@pytest.mark.asyncio
+async def test_refresh_includes_pushed_boxes():
+    """Test a refetch publishes the same aggregate as the ingest path"""
+    aggregate_state.update("pushed", 30.0, time.time())
+
+    with patch("app.routers.temperature.fetch_temperature_data", new=fetches(20.0)):
+        with patch("app.routers.temperature._valkey_client", None):
+            result = await refresh_temperature(use_state=False)
+
+    assert result["average_temperature"] == 25.0
+    assert result["samples"] == 2
@@ -0,0 +1,153 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import cache
+from app.services.tracing import (
+    FileExporter,
+    InMemoryExporter,
+    get_exporter,
+    parse_traceparent,
+    set_exporter,
+    start_span,
+)
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def exporter():
+    """Record every span in memory"""
+    previous = get_exporter()
+    exporter = InMemoryExporter()
+    set_exporter(exporter)
+    with patch("app.services.tracing.settings.TRACE_SAMPLE_RATE", 1.0):
+        yield exporter
+    set_exporter(previous)
+
+
+def test_child_spans_share_trace(exporter):
+    """Test nested spans form one trace with parent links"""
+    with start_span("root") as root:
+        with start_span("child", box_id="a"):
+            pass
+
+    child, parent = exporter.spans
+    assert parent.name == "root" and parent.parent_id is None
+    assert child.trace_id == root.trace_id
+    assert child.parent_id == root.span_id
+    assert child.attributes == {"box_id": "a"}
+
+
+def test_exceptions_are_recorded(exporter):
+    """Test a failing block marks its span as an error"""
+    with pytest.raises(ValueError):
+        with start_span("failing"):
+            raise ValueError("boom")
+
+    assert exporter.spans[0].status == "error"
+    assert exporter.spans[0].attributes["exception.message"] == "boom"
+
+
+def test_unsampled_traces_record_nothing(exporter):
+    """Test the root sampling decision applies to the whole trace"""
+    with patch("app.services.tracing.settings.TRACE_SAMPLE_RATE", 0.0):
+        with start_span("root") as root:
+            with start_span("child"):
+                pass
+
+    assert root.sampled is False
+    assert not exporter.spans
+
+
+def test_parse_traceparent():
+    """Test W3C traceparent parsing"""
+    parent = parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+
+    assert parent.trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert parent.span_id == "00f067aa0ba902b7"
+    assert parent.sampled is True
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent("00-" + "0" * 32 + "-00f067aa0ba902b7-01") is None
+
+
+@pytest.mark.asyncio
+async def test_background_tasks_inherit_context(exporter):
+    """Test tasks created inside a span continue its trace"""
+
+    async def background():
+        with start_span("background"):
+            await asyncio.sleep(0)
+
+    with start_span("request") as root:
+        await asyncio.create_task(background())
+
+    assert exporter.spans[0].name == "background"
+    assert exporter.spans[0].parent_id == root.span_id
+
+
+@pytest.mark.asyncio
+async def test_valkey_commands_are_traced(exporter):
+    """Test cache helpers emit a span per command"""
+    valkey = AsyncMock()
+    valkey.get.return_value = "x"
+
+    with start_span("root"):
+        await cache.get(valkey, "key")
+
+    assert [span.name for span in exporter.spans] == ["valkey get", "root"]
+
+
+def test_request_spans_continue_incoming_trace(exporter):
+    """Test the HTTP root span joins an incoming traceparent"""
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    response = client.get(
+        "/version", headers={"traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}
+    )
+
+    assert response.headers["traceparent"].split("-")[1] == trace_id
+    root = exporter.spans[-1]
+    assert root.name == "GET /version"
+    assert root.parent_id == "00f067aa0ba902b7"
+    assert root.attributes["http.status_code"] == 200
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    """Test spans are appended to the trace file"""
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(str(path))
+    previous = get_exporter()
+    set_exporter(exporter)
+    try:
+        with patch("app.services.tracing.settings.TRACE_SAMPLE_RATE", 1.0):
+            with start_span("root"):
+                pass
+    finally:
+        set_exporter(previous)
+
+    exporter.flush()
+    assert '"name": "root"' in path.read_text()
+    exporter.close()
+
+
+def test_file_exporter_does_not_write_on_calling_thread(tmp_path):
+    """Test export only queues the span and the writer thread appends it"""
+    path = tmp_path / "traces.jsonl"
+    exporter = FileExporter(str(path))
+    previous = get_exporter()
+    set_exporter(exporter)
+    try:
+        with patch("app.services.tracing.settings.TRACE_SAMPLE_RATE", 1.0):
+            with patch("builtins.open", side_effect=AssertionError("opened on caller")):
+                for name in ("first", "second"):
+                    with start_span(name):
+                        pass
+    finally:
+        set_exporter(previous)
+
+    exporter.close()
+    lines = path.read_text().splitlines()
+    assert ['"first"' in lines[0], '"second"' in lines[1]] == [True, True]
@@ -0,0 +1,40 @@
+"""Benchmark temperature aggregation at 10k-100k samples per call.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_aggregation.py
+"""
+
+import random
+import timeit
+
+from app.services.aggregation import aggregate, summarize, to_array
+
+SIZES = (10_000, 50_000, 100_000)
+REPEAT = 20
+
+
+def python_mean(temperature_data):
+    total = sum(item["value"] for item in temperature_data)
+    return total / len(temperature_data)
+
+
+def best_of(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT)) * 1000
+
+
+def main():
+    print(f"{'samples':>8} {'sum()':>10} {'to_array':>10} {'mean':>10} {'summary':>10}")
+    for size in SIZES:
+        data = [{"value": random.gauss(22.0, 3.0)} for _ in range(size)]
+        values = to_array(data)
+        print(
+            f"{size:>8} "
+            f"{best_of(lambda: python_mean(data)):>9.2f}ms "
+            f"{best_of(lambda: to_array(data)):>9.2f}ms "
+            f"{best_of(lambda: aggregate(values, 'mean')):>9.2f}ms "
+            f"{best_of(lambda: summarize(values, reject_outliers=True)):>9.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Measure Valkey memory per box for the bucketed binary reading cache.
+
+Requires a running Valkey (VALKEY_HOST/VALKEY_PORT). Compares the bucketed
+hash layout against one JSON string key per box.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_box_cache.py
+"""
+
+import asyncio
+import json
+import time
+
+from app.config import settings
+from app.services import box_cache
+from app.services.cache import create_valkey_client
+
+BOXES = (1_000, 10_000, 100_000)
+
+
+async def used_memory(client):
+    info = await client.info("memory")
+    return info["used_memory"]
+
+
+async def flush(client):
+    keys = [key async for key in client.scan_iter(match="hivebox:*")]
+    if keys:
+        await client.delete(*keys)
+
+
+async def main():
+    client = create_valkey_client(decode_responses=False)
+    box_cache.set_box_cache_client(client)
+    now = time.time()
+
+    print(f"{'boxes':>8} {'hash bytes/box':>15} {'json bytes/box':>15}")
+    for count in BOXES:
+        readings = [
+            {"box_id": f"{i:024x}", "value": 21.5, "measured_at": now}
+            for i in range(count)
+        ]
+
+        await flush(client)
+        baseline = await used_memory(client)
+        await box_cache.store_readings(readings)
+        hashed = (await used_memory(client) - baseline) / count
+
+        await flush(client)
+        baseline = await used_memory(client)
+        async with client.pipeline(transaction=False) as pipe:
+            for reading in readings:
+                pipe.set(
+                    f"hivebox:json:{reading['box_id']}",
+                    json.dumps(
+                        {
+                            "value": reading["value"],
+                            "timestamp": "2026-01-01T00:00:00.000Z",
+                            "fetched_at": now,
+                            "status": "ok",
+                        }
+                    ),
+                    ex=settings.MAX_DATA_AGE_SECONDS,
+                )
+            await pipe.execute()
+        as_json = (await used_memory(client) - baseline) / count
+
+        print(f"{count:>8} {hashed:>15.1f} {as_json:>15.1f}")
+
+    await flush(client)
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""Benchmark /ingest payload decoding and validation throughput.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_ingest.py
+"""
+
+import json
+import random
+import time
+import timeit
+
+from app.services.aggregate_state import aggregate_state
+from app.services.ingest import BINARY_CONTENT_TYPE, encode_binary, ingest_payload
+
+READINGS = 50_000
+REPEAT = 5
+
+
+def make_readings():
+    now = time.time()
+    return [
+        (f"{i:024x}", now - random.uniform(0, 600), random.gauss(22.0, 3.0))
+        for i in range(READINGS)
+    ]
+
+
+def rate(body, content_type):
+    def run():
+        aggregate_state.clear()
+        ingest_payload(body, content_type)
+
+    best = min(timeit.repeat(run, number=1, repeat=REPEAT))
+    return READINGS / best
+
+
+def main():
+    readings = make_readings()
+    ndjson = "\n".join(
+        json.dumps({"box_id": b, "timestamp": ts, "value": v}) for b, ts, v in readings
+    ).encode("utf-8")
+    binary = encode_binary(readings)
+
+    print(f"{READINGS} readings per batch")
+    print(f"ndjson: {len(ndjson):>9} bytes {rate(ndjson, 'application/x-ndjson'):>10.0f}/s")
+    print(f"binary: {len(binary):>9} bytes {rate(binary, BINARY_CONTENT_TYPE):>10.0f}/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare per-box dicts with the column-backed ReadingStore at 10k-100k boxes.
+
+Reports resident memory added by each layout and the time of one freshness
+scan: is_data_fresh() over ISO timestamps for the dicts, one vectorized
+cutoff for the store.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_reading_store.py
+"""
+
+import gc
+import os
+import random
+import time
+import timeit
+from datetime import datetime, timezone
+
+from app.services.opensensemap import is_data_fresh
+from app.services.reading_store import ReadingStore
+
+SIZES = (10_000, 100_000)
+REPEAT = 5
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss() -> int:
+    """Current resident set size in bytes"""
+    gc.collect()
+    with open("/proc/self/statm", encoding="ascii") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+
+def best_of(func):
+    return min(timeit.repeat(func, number=1, repeat=REPEAT)) * 1000
+
+
+def build_dicts(box_ids, values, stamps):
+    return {
+        box_id: {
+            "value": value,
+            "timestamp": datetime.fromtimestamp(stamp, tz=timezone.utc).isoformat(),
+        }
+        for box_id, value, stamp in zip(box_ids, values, stamps)
+    }
+
+
+def build_store(box_ids, values, stamps):
+    store = ReadingStore()
+    for box_id, value, stamp in zip(box_ids, values, stamps):
+        store.set(box_id, value, stamp)
+    return store
+
+
+def main():
+    now = time.time()
+    print(
+        f"{'boxes':>8} {'dict B/box':>11} {'store B/box':>12} "
+        f"{'dict scan':>10} {'store scan':>11}"
+    )
+    for size in SIZES:
+        box_ids = [f"{i:024x}" for i in range(size)]
+        values = [random.gauss(22.0, 3.0) for _ in range(size)]
+        stamps = [now - random.uniform(0, 7200) for _ in range(size)]
+
+        baseline = rss()
+        dicts = build_dicts(box_ids, values, stamps)
+        dict_bytes = (rss() - baseline) / size
+        dict_scan = best_of(
+            lambda: [b for b, item in dicts.items() if is_data_fresh(item["timestamp"])]
+        )
+        del dicts
+
+        baseline = rss()
+        store = build_store(box_ids, values, stamps)
+        store_bytes = (rss() - baseline) / size
+        cutoff = now - 3600
+        store_scan = best_of(lambda: store.live & (store.measured_at >= cutoff))
+        del store
+
+        print(
+            f"{size:>8} {dict_bytes:>11.0f} {store_bytes:>12.0f} "
+            f"{dict_scan:>9.2f}ms {store_scan:>10.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compare the plain uvicorn launch with the app.server entry point.
+
+Starts each launch command on a free port, waits until /version answers,
+then drives it with CONNECTIONS keep-alive clients for DURATION seconds
+and reports throughput and latency percentiles. A second run opens a new
+connection per request, which is what the backlog and keep-alive settings
+affect. The load generator runs on the same machine, so absolute numbers
+understate the server; compare the rows.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_server.py [--path /version]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+LAUNCHERS = {
+    "uvicorn app.main:app": [sys.executable, "-m", "uvicorn", "app.main:app"],
+    "app.server": [sys.executable, "-m", "app.server"],
+}
+CONNECTIONS = 32
+DURATION = 10.0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start(command: list[str], port: int) -> subprocess.Popen:
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    return subprocess.Popen(
+        [*command, "--host", "127.0.0.1", "--port", str(port)],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+
+async def drive(url: str, keep_alive: bool) -> list[float]:
+    """Latencies of every request completed within DURATION"""
+    latencies: list[float] = []
+    deadline = time.monotonic() + DURATION
+    limits = httpx.Limits(max_keepalive_connections=CONNECTIONS if keep_alive else 0)
+
+    async with httpx.AsyncClient(limits=limits, timeout=10.0) as client:
+
+        async def worker():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                response = await client.get(url)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(CONNECTIONS)))
+    return latencies
+
+
+def report(name: str, mode: str, latencies: list[float]) -> None:
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:<22} {mode:<11} {len(latencies) / DURATION:>9.0f} "
+        f"{quantiles[49] * 1000:>8.2f} {quantiles[98] * 1000:>8.2f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--path", default="/version")
+    args = parser.parse_args()
+
+    print(f"{'launch':<22} {'mode':<11} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, command in LAUNCHERS.items():
+        port = free_port()
+        server = start(command, port)
+        url = f"http://127.0.0.1:{port}{args.path}"
+        try:
+            wait_ready(url)
+            for mode, keep_alive in (("keep-alive", True), ("new conn", False)):
+                report(name, mode, asyncio.run(drive(url, keep_alive)))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()